@@ -81,6 +81,7 @@ async def create_personnel_category(
         )
         row = cursor.fetchone()
         conn.close()
+        personnel_service.refresh_categories()
         return {
             "id": row["id"],
             "name": row["name"],
@@ -148,6 +149,7 @@ async def update_personnel_category(
         )
         row = cursor.fetchone()
         conn.close()
+        personnel_service.refresh_categories()
         return {
             "id": row["id"],
             "name": row["name"],
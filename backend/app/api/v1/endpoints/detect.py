@@ -1,14 +1,28 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from typing import Optional
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, WebSocket
+from typing import Optional, Dict, Any, List, Tuple
+import json
 import logging
 import asyncio
+import time
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 
-from app.core.models import DetectResponse, FaceBox, PersonInfo, FaceResult
+import numpy as np
+
+from app.core.config import settings
+
+from app.core.resources import ExecutionResources
+from app.core.models import (
+    DetectResponse, FaceBox, PersonInfo, FaceResult, Candidate, BatchDetectItem, BatchDetectResponse
+)
 from app.services.detection import DetectionService
 from app.services.recognition import RecognitionService
 from app.services.personnel import PersonnelService
-from app.utils.image import decode_image_from_bytes, validate_image
+from app.services.batching import RecognitionBatcher
+from app.services.cache import LRUCache, content_key
+from app.services.stream import FaceTracker
+from app.utils.image import decode_image_rgb, validate_image
+from app.utils.upload import UploadError, read_image_upload, size_limit_message
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -16,24 +30,187 @@ router = APIRouter()
 detection_service: Optional[DetectionService] = None
 recognition_service: Optional[RecognitionService] = None
 personnel_service: Optional[PersonnelService] = None
+recognition_batcher: Optional[RecognitionBatcher] = None
 _executor: Optional[ThreadPoolExecutor] = None
+_recognition_executor: Optional[ThreadPoolExecutor] = None
+result_cache: Optional[LRUCache] = None
+
+# 检测结果缓存条目的估算大小（字节）：固定开销 + 每个人脸 + 每个候选
+_CACHE_ENTRY_BYTES = 256
+_CACHE_FACE_BYTES = 256
+_CACHE_CANDIDATE_BYTES = 128
 
 
-def init_services(detection: DetectionService, recognition: RecognitionService, personnel: PersonnelService):
-    global detection_service, recognition_service, personnel_service, _executor
+def init_services(
+    detection: DetectionService,
+    recognition: RecognitionService,
+    personnel: PersonnelService,
+    batcher: Optional[RecognitionBatcher] = None,
+    resources: Optional[ExecutionResources] = None,
+    cache: Optional[LRUCache] = None,
+):
+    global detection_service, recognition_service, personnel_service, recognition_batcher
+    global _executor, _recognition_executor, result_cache
     detection_service = detection
     recognition_service = recognition
     personnel_service = personnel
+    recognition_batcher = batcher
+    result_cache = cache
+
+    # 解码与检测、识别分别使用按各自线程预算配置的线程池
+    resources = resources or ExecutionResources.plan()
+    _executor = resources.detection.create_executor()
+    _recognition_executor = resources.recognition.create_executor()
+    logger.debug(
+        f"线程池执行器已初始化，检测线程数: {resources.detection.workers}, 识别线程数: {resources.recognition.workers}"
+    )
+
+
+def _to_person_info(personnel_data: Dict[str, Any]) -> PersonInfo:
+    return PersonInfo(
+        name=personnel_data.get("name", ""),
+        id_number=personnel_data.get("id_number"),
+        phone=personnel_data.get("phone"),
+        address=personnel_data.get("address"),
+        gender=personnel_data.get("gender"),
+        category=personnel_data.get("category"),
+        status=personnel_data.get("status"),
+        photo_path=personnel_data.get("photo_path"),
+        created_at=personnel_data.get("created_at"),
+        updated_at=personnel_data.get("updated_at"),
+    )
 
-    import os
 
-    max_workers = min(os.cpu_count() or 4, 8)
-    _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="face_detect")
-    logger.debug(f"线程池执行器已初始化，工作线程数: {max_workers}")
+def _resolve_personnel(face_ids: List[str]) -> Dict[str, PersonInfo]:
+    """所有 face_id 去重后一次批量查询人员信息，返回 face_id -> PersonInfo"""
+    try:
+        personnel = personnel_service.get_personnel_by_face_ids(face_ids)
+    except Exception as e:
+        logger.error(f"查询人员信息失败: {e}", exc_info=True)
+        return {}
+    return {face_id: _to_person_info(data) for face_id, data in personnel.items()}
+
+
+async def _match_faces(faces: List[Dict[str, Any]], k: int, batched: bool = True) -> List[List[Tuple[str, float]]]:
+    """
+    所有人脸一次批量识别（一次前向 + 一次相似度矩阵乘法），返回每个人脸的 top-k 候选
+    
+    优先使用检测阶段已对齐的人脸张量，避免识别时再跑一遍 MTCNN。
+    batched=True 时交给批处理调度器，与其他并发请求的人脸合并为一次前向。
+    """
+    face_inputs = [
+        face["face_tensor"] if face.get("face_tensor") is not None else face["face_img"] for face in faces
+    ]
+    try:
+        if recognition_batcher and batched:
+            return await recognition_batcher.match_batch(face_inputs, k)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(_recognition_executor, recognition_service.match_batch, face_inputs, k)
+    except Exception as e:
+        logger.error(f"人脸识别过程出错: {e}", exc_info=True)
+        return [[] for _ in faces]
+
+
+async def _lookup_personnel(
+    recognition_results: List[Optional[Tuple[str, float]]],
+    candidate_lists: List[List[Tuple[str, float]]],
+    top_k: Optional[int],
+) -> Dict[str, PersonInfo]:
+    """识别成功的人脸与所有候选的人员信息一次性批量查询"""
+    face_ids = [r[0] for r in recognition_results if r]
+    if top_k:
+        face_ids += [face_id for c in candidate_lists for face_id, _ in c]
+    if not face_ids:
+        return {}
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(_executor, _resolve_personnel, face_ids)
+
+
+def _build_face_results(
+    faces: List[Dict[str, Any]],
+    recognition_results: List[Optional[Tuple[str, float]]],
+    candidate_lists: List[List[Tuple[str, float]]],
+    person_infos: Dict[str, PersonInfo],
+    top_k: Optional[int],
+    log_results: bool = True,
+) -> List[FaceResult]:
+    """组装每个人脸的检测与识别结果"""
+    face_results = []
+    for face, recognition_result, candidates in zip(faces, recognition_results, candidate_lists):
+        face_box = FaceBox(x=face["x"], y=face["y"], w=face["w"], h=face["h"], confidence=face.get("confidence"))
+
+        person_info = None
+        recognition_confidence = None
+
+        if recognition_result:
+            face_id, recognition_confidence = recognition_result
+            person_info = person_infos.get(face_id)
+            if log_results:
+                logger.info(f"识别成功: {face_id} (置信度: {recognition_confidence:.3f})")
+                if person_info:
+                    logger.debug(f"获取人员信息: {person_info.name}")
+                else:
+                    logger.warning(f"未找到人员信息: face_id={face_id}")
+        elif log_results:
+            logger.info(f"人脸未识别成功 (检测到人脸但未匹配到已知人员)")
+
+        face_results.append(
+            FaceResult(
+                face_box=face_box,
+                person_info=person_info,
+                recognition_confidence=recognition_confidence,
+                candidates=[
+                    Candidate(face_id=face_id, similarity=similarity, person_info=person_infos.get(face_id))
+                    for face_id, similarity in candidates
+                ]
+                if top_k
+                else None,
+            )
+        )
+    return face_results
+
+
+def _cache_result(
+    key: Tuple[str, int],
+    generation: int,
+    faces: List[Dict[str, Any]],
+    candidate_lists: List[List[Tuple[str, float]]],
+) -> None:
+    """缓存检测框与候选（只保留数值，不持有图像），条目记录计算前读取的人脸库版本号"""
+    boxes = [{k: face.get(k) for k in ("x", "y", "w", "h", "confidence")} for face in faces]
+    nbytes = (
+        _CACHE_ENTRY_BYTES
+        + _CACHE_FACE_BYTES * len(boxes)
+        + _CACHE_CANDIDATE_BYTES * sum(len(c) for c in candidate_lists)
+    )
+    result_cache.put(key, (boxes, candidate_lists), nbytes, generation)
+
+
+async def _respond(
+    faces: List[Dict[str, Any]],
+    candidate_lists: List[List[Tuple[str, float]]],
+    top_k: Optional[int],
+    filename: Optional[str],
+) -> DetectResponse:
+    """由检测框与候选组装响应（人员信息实时查询）"""
+    recognition_results = [recognition_service.best_match(c) for c in candidate_lists]
+    person_infos = await _lookup_personnel(recognition_results, candidate_lists, top_k)
+    face_results = _build_face_results(faces, recognition_results, candidate_lists, person_infos, top_k)
+
+    # 统计识别结果
+    recognized_count = sum(1 for fr in face_results if fr.recognition_confidence is not None)
+    logger.info(f"处理完成: {filename}, 检测到{len(faces)}个人脸, 识别成功{recognized_count}个")
+
+    return DetectResponse(detected=bool(face_results), faces=face_results)
 
 
 @router.post("/detect", response_model=DetectResponse, summary="人脸检测")
-async def detect_face(file: UploadFile = File(..., description="图片文件")):
+async def detect_face(
+    file: UploadFile = File(..., description="图片文件"),
+    top_k: Optional[int] = Query(
+        None, ge=1, le=20, description="返回每个人脸相似度最高的 top_k 个候选（不受识别阈值限制），不传则不返回候选"
+    ),
+):
     """上传图片，返回人脸检测结果和人员信息"""
     logger.info(f"收到检测请求: 文件名={file.filename}, 类型={file.content_type}")
 
@@ -41,21 +218,28 @@ async def detect_face(file: UploadFile = File(..., description="图片文件")):
         raise HTTPException(status_code=500, detail="服务未初始化")
 
     try:
-        contents = await file.read()
-
-        from app.core.config import settings
-
-        if len(contents) > settings.MAX_UPLOAD_SIZE:
-            logger.warning(f"文件大小超限: {file.filename}, 大小={len(contents)}字节")
-            raise HTTPException(status_code=400, detail=f"文件大小超过限制（最大{settings.MAX_UPLOAD_SIZE}字节）")
+        # 先校验扩展名与文件头，再按块读取，超过大小上限立即中止
+        try:
+            contents = await read_image_upload(file, settings.MAX_UPLOAD_SIZE)
+        except UploadError as e:
+            logger.warning(f"上传文件被拒绝: {file.filename}, {e}")
+            raise HTTPException(status_code=400, detail=str(e))
 
-        file_ext = file.filename.split(".")[-1].lower() if file.filename else ""
-        if file_ext not in ["jpg", "jpeg", "png", "bmp"]:
-            logger.warning(f"不支持的文件格式: {file.filename}, 扩展名={file_ext}")
-            raise HTTPException(status_code=400, detail="不支持的文件格式，请上传jpg、png或bmp格式的图片")
+        # 重复提交的相同内容直接复用检测与识别结果（人脸库版本变化后失效）
+        cache_key = None
+        generation = 0
+        if result_cache is not None:
+            cache_key = (content_key(contents), top_k or 1)
+            generation = recognition_service.gallery_generation
+            cached = result_cache.get(cache_key, generation)
+            if cached is not None:
+                boxes, candidate_lists = cached
+                logger.info(f"命中检测结果缓存: {file.filename}")
+                return await _respond(boxes, candidate_lists, top_k, file.filename)
 
         loop = asyncio.get_event_loop()
-        image = await loop.run_in_executor(_executor, decode_image_from_bytes, contents)
+        # 按原分辨率直接解码为 RGB（整个请求只有这一份图像缓冲区），检测时另行缩小，裁剪对齐在原图上进行
+        image = await loop.run_in_executor(_executor, decode_image_rgb, contents)
         if image is None:
             logger.warning(f"无法解码图像文件: {file.filename}")
             raise HTTPException(status_code=400, detail="无法解码图像文件，请确保文件格式正确")
@@ -73,6 +257,8 @@ async def detect_face(file: UploadFile = File(..., description="图片文件")):
 
         if not faces:
             logger.info(f"未检测到人脸: {file.filename}")
+            if cache_key is not None:
+                _cache_result(cache_key, generation, [], [])
             return DetectResponse(detected=False, faces=[])
 
         # 按检测置信度降序排列
@@ -80,67 +266,312 @@ async def detect_face(file: UploadFile = File(..., description="图片文件")):
 
         logger.info(f"检测到 {len(faces)} 个人脸: {file.filename}")
 
-        # 处理每个人脸，进行识别
-        face_results = []
-        for face in faces:
-            face_box = FaceBox(x=face["x"], y=face["y"], w=face["w"], h=face["h"], confidence=face.get("confidence"))
+        candidate_lists = await _match_faces(faces, top_k or 1)
+        if cache_key is not None:
+            _cache_result(cache_key, generation, faces, candidate_lists)
+        return await _respond(faces, candidate_lists, top_k, file.filename)
 
-            face_img = face["face_img"]
-            recognition_result = None
-            person_info = None
-            recognition_confidence = None
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"处理请求时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"处理图像时出现错误: {str(e)}")
 
-            try:
-                recognition_result = await loop.run_in_executor(_executor, recognition_service.recognize, face_img)
-            except Exception as e:
-                logger.error(f"人脸识别过程出错: {e}", exc_info=True)
-                recognition_result = None
 
-            if recognition_result:
-                try:
-                    face_id, confidence = recognition_result
-                    recognition_confidence = confidence
-                    logger.info(f"识别成功: {face_id} (置信度: {confidence:.3f})")
-
-                    try:
-                        personnel_data = await loop.run_in_executor(
-                            _executor, personnel_service.get_personnel_by_face_id, face_id
-                        )
-                        if personnel_data:
-                            person_info = PersonInfo(
-                                name=personnel_data.get("name", ""),
-                                id_number=personnel_data.get("id_number"),
-                                phone=personnel_data.get("phone"),
-                                address=personnel_data.get("address"),
-                                gender=personnel_data.get("gender"),
-                                category=personnel_data.get("category"),
-                                status=personnel_data.get("status"),
-                                photo_path=personnel_data.get("photo_path"),
-                                created_at=personnel_data.get("created_at"),
-                                updated_at=personnel_data.get("updated_at"),
-                            )
-                            logger.debug(f"获取人员信息: {person_info.name}")
-                        else:
-                            logger.warning(f"未找到人员信息: face_id={face_id}")
-                    except Exception as e:
-                        logger.error(f"查询人员信息失败: {e}", exc_info=True)
-                except Exception as e:
-                    logger.error(f"处理识别结果失败: {e}", exc_info=True)
-            else:
-                logger.info(f"人脸未识别成功 (检测到人脸但未匹配到已知人员)")
-
-            face_results.append(
-                FaceResult(face_box=face_box, person_info=person_info, recognition_confidence=recognition_confidence)
-            )
+async def _read_and_decode(file: UploadFile) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """读取并解码一张上传图片，返回 (RGB 图像, 错误信息)"""
+    try:
+        contents = await read_image_upload(file, settings.MAX_UPLOAD_SIZE)
+    except UploadError as e:
+        return None, str(e)
+    loop = asyncio.get_event_loop()
+    image = await loop.run_in_executor(_executor, decode_image_rgb, contents)
+    if image is None:
+        return None, "无法解码图像文件，请确保文件格式正确"
+    if not validate_image(image):
+        return None, "图像格式无效，请确保图像尺寸足够大（至少20x20像素）"
+    return image, None
 
-        # 统计识别结果
-        recognized_count = sum(1 for fr in face_results if fr.recognition_confidence is not None)
-        logger.info(f"处理完成: {file.filename}, 检测到{len(faces)}个人脸, 识别成功{recognized_count}个")
 
-        return DetectResponse(detected=True, faces=face_results)
+@router.post("/detect/batch", response_model=BatchDetectResponse, summary="批量人脸检测")
+async def detect_faces_batch(
+    files: List[UploadFile] = File(..., description="图片文件（可多张）"),
+    top_k: Optional[int] = Query(
+        None, ge=1, le=20, description="返回每个人脸相似度最高的 top_k 个候选（不受识别阈值限制），不传则不返回候选"
+    ),
+):
+    """
+    一次上传多张图片，返回与上传顺序一一对应的检测结果
+
+    各图片并行解码，同尺寸的图片合并为一个 batch 检测，所有图片的人脸一次前向提取特征、
+    一次批量查询人员信息。单张图片无效时该项返回 error，不影响其他图片。
+    """
+    if not detection_service or not recognition_service or not personnel_service:
+        raise HTTPException(status_code=500, detail="服务未初始化")
+    if _executor is None:
+        raise HTTPException(status_code=500, detail="线程池执行器未初始化")
+    if len(files) > settings.DETECT_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400, detail=f"图片数量超过限制（最多{settings.DETECT_BATCH_MAX_IMAGES}张）"
+        )
+
+    try:
+        decoded = await asyncio.gather(*(_read_and_decode(f) for f in files))
+        valid = [i for i, (image, error) in enumerate(decoded) if error is None]
+
+        loop = asyncio.get_event_loop()
+        detections = await loop.run_in_executor(
+            _executor, detection_service.detect_faces_batch, [decoded[i][0] for i in valid]
+        )
+        faces_per_image: Dict[int, List[Dict[str, Any]]] = {}
+        for i, faces in zip(valid, detections):
+            faces.sort(key=lambda f: f.get("confidence", 0.0), reverse=True)
+            faces_per_image[i] = faces
+
+        # 所有图片的人脸合并为一次前向（已是大批量，不再经过批处理调度器）
+        all_faces = [face for i in valid for face in faces_per_image[i]]
+        candidate_lists = await _match_faces(all_faces, top_k or 1, batched=False) if all_faces else []
+        recognition_results = [recognition_service.best_match(c) for c in candidate_lists]
+        person_infos = await _lookup_personnel(recognition_results, candidate_lists, top_k)
+
+        results = []
+        offset = 0
+        for i, (file, (_, error)) in enumerate(zip(files, decoded)):
+            if error is not None:
+                logger.warning(f"批量检测跳过图片: {file.filename}, {error}")
+                results.append(BatchDetectItem(index=i, filename=file.filename, error=error))
+                continue
+            faces = faces_per_image[i]
+            end = offset + len(faces)
+            face_results = _build_face_results(
+                faces, recognition_results[offset:end], candidate_lists[offset:end], person_infos, top_k
+            )
+            offset = end
+            results.append(
+                BatchDetectItem(
+                    index=i,
+                    filename=file.filename,
+                    result=DetectResponse(detected=bool(face_results), faces=face_results),
+                )
+            )
+
+        logger.info(f"批量检测完成: {len(files)} 张图片, 检测到 {len(all_faces)} 个人脸")
+        return BatchDetectResponse(results=results)
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"处理请求时出错: {e}", exc_info=True)
+        logger.error(f"处理批量请求时出错: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"处理图像时出现错误: {str(e)}")
+
+
+# WebSocket 会话缓存的人员信息上限（超出时淘汰最久未出现在轨迹中的人员）
+WS_PERSON_CACHE_SIZE = 1024
+# 可协商的检测分辨率下限
+WS_MIN_MAX_SIDE = 160
+
+
+class _DetectSession:
+    """
+    单个 WebSocket 检测连接的状态
+
+    - 最新帧槽位：只保留最近收到的一帧，推理跟不上时旧帧直接丢弃
+    - 人脸跟踪：同一轨迹只在出现时识别一次、之后每隔 recognition_interval 帧复核，其余帧复用识别结果
+    - 协商参数：检测分辨率、top_k、复核间隔
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.max_side = settings.WS_DETECTION_MAX_SIDE
+        self.top_k: Optional[int] = None
+        self.recognition_interval = settings.STREAM_RECOGNITION_INTERVAL
+        self.tracker = FaceTracker()
+        # 按最近出现在轨迹中的顺序排列，最久未出现的在前
+        self.person_infos: "OrderedDict[str, PersonInfo]" = OrderedDict()
+        self.latest: Optional[Tuple[int, bytes]] = None
+        self.frame_ready = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "type": "config",
+            "max_side": self.max_side,
+            "top_k": self.top_k,
+            "recognition_interval": self.recognition_interval,
+        }
+
+    def remember_personnel(self, person_infos: Dict[str, PersonInfo]) -> None:
+        """
+        缓存新查询到的人员信息，并把当前轨迹引用的人员移到最近使用的一端
+
+        超过 WS_PERSON_CACHE_SIZE 时从最久未出现的一端淘汰，当前轨迹引用的人员不会被淘汰。
+        """
+        self.person_infos.update(person_infos)
+        # 按轨迹顺序收集（dict 去重且保持顺序），移动顺序稳定
+        active: Dict[str, None] = {}
+        for track in self.tracker.tracks:
+            if track.identity:
+                active[track.identity[0]] = None
+            active.update((face_id, None) for face_id, _ in track.candidates)
+        for face_id in active:
+            if face_id in self.person_infos:
+                self.person_infos.move_to_end(face_id)
+        while len(self.person_infos) > WS_PERSON_CACHE_SIZE:
+            oldest = next(iter(self.person_infos))
+            if oldest in active:
+                break
+            del self.person_infos[oldest]
+
+    def configure(self, options: Dict[str, Any]) -> None:
+        """按客户端请求协商参数，超出范围的取值被截断"""
+        upper = settings.DETECTION_MAX_SIDE if settings.DETECTION_MAX_SIDE > 0 else 4096
+        if options.get("max_side") is not None:
+            self.max_side = min(max(int(options["max_side"]), WS_MIN_MAX_SIDE), max(upper, WS_MIN_MAX_SIDE))
+        if "top_k" in options:
+            self.top_k = min(max(int(options["top_k"]), 1), 20) if options["top_k"] else None
+        if options.get("recognition_interval") is not None:
+            self.recognition_interval = max(int(options["recognition_interval"]), 1)
+
+
+async def _receive_frames(session: _DetectSession) -> None:
+    """接收客户端消息：二进制消息为图像帧（放入最新帧槽位），文本消息为 JSON 参数协商"""
+    try:
+        while True:
+            message = await session.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("bytes")
+            if data is not None:
+                session.received += 1
+                if len(data) > settings.MAX_UPLOAD_SIZE:
+                    await session.send({
+                        "type": "error", "frame": session.received, "detail": size_limit_message(settings.MAX_UPLOAD_SIZE)
+                    })
+                    continue
+                if session.latest is not None:
+                    session.dropped += 1
+                session.latest = (session.received, data)
+                session.frame_ready.set()
+                continue
+            text = message.get("text")
+            if text is not None:
+                try:
+                    session.configure(json.loads(text))
+                    await session.send(session.config())
+                except (ValueError, TypeError, AttributeError):
+                    await session.send({"type": "error", "detail": "无效的参数消息，应为 JSON 对象"})
+    finally:
+        session.closed = True
+        session.frame_ready.set()
+
+
+async def _detect_frame(session: _DetectSession, frame_index: int, data: bytes) -> Dict[str, Any]:
+    """检测一帧并与已有轨迹关联，只对新轨迹和到期复核的轨迹做识别"""
+    started = time.perf_counter()
+    loop = asyncio.get_event_loop()
+    # 按原分辨率解码（不使用 IMREAD_REDUCED_*），识别用的对齐人脸取自原图，见 decode_image_rgb
+    image = await loop.run_in_executor(_executor, decode_image_rgb, data)
+    if image is None or not validate_image(image):
+        return {"type": "error", "frame": frame_index, "detail": "无法解码图像帧或图像尺寸过小"}
+
+    faces = await loop.run_in_executor(_executor, detection_service.detect_faces, image, session.max_side)
+    del image
+    tracks = session.tracker.update(faces, frame_index)
+
+    pending = [t for t in tracks if t.needs_recognition(frame_index, session.recognition_interval)]
+    person_infos: Dict[str, PersonInfo] = {}
+    if pending:
+        candidate_lists = await _match_faces([t.face for t in pending], session.top_k or 1)
+        for track, candidates in zip(pending, candidate_lists):
+            track.candidates = candidates
+            track.identity = recognition_service.best_match(candidates)
+            track.verified_frame = frame_index
+
+        # 人员信息按 face_id 缓存在会话中，只查询新出现的人员
+        identities = [t.identity for t in pending if t.identity and t.identity[0] not in session.person_infos]
+        candidates_to_lookup = [
+            [c for c in t.candidates if c[0] not in session.person_infos] for t in pending
+        ]
+        person_infos = await _lookup_personnel(identities, candidates_to_lookup, session.top_k)
+    session.remember_personnel(person_infos)
+
+    face_results = _build_face_results(
+        [t.face for t in tracks],
+        [t.identity for t in tracks],
+        [t.candidates for t in tracks],
+        session.person_infos,
+        session.top_k,
+        log_results=False,
+    )
+    session.tracker.release_images()
+    return {
+        "type": "result",
+        "frame": frame_index,
+        "detected": bool(face_results),
+        "faces": [
+            {"track_id": track.track_id, **result.model_dump()} for track, result in zip(tracks, face_results)
+        ],
+        "recognized_tracks": [t.track_id for t in pending],
+        "dropped": session.dropped,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+@router.websocket("/ws/detect")
+async def detect_websocket(websocket: WebSocket):
+    """
+    WebSocket 人脸检测
+
+    客户端以二进制消息发送图像帧（JPEG/PNG），服务端对每个处理的帧返回
+    {"type": "result", "frame": 帧序号, "faces": [{"track_id", "face_box", "person_info", ...}], "dropped": 丢弃帧数}；
+    推理跟不上时只处理最新的一帧。文本消息 {"max_side", "top_k", "recognition_interval"} 用于协商参数，
+    服务端回复 {"type": "config", ...} 告知实际生效的取值。
+    处理帧时出现服务端错误，先发送 {"type": "error", "frame", "detail"}，再以 1011 关闭连接。
+    """
+    await websocket.accept()
+    if not detection_service or not recognition_service or not personnel_service or _executor is None:
+        await websocket.send_json({"type": "error", "detail": "服务未初始化"})
+        await websocket.close(code=1011)
+        return
+
+    session = _DetectSession(websocket)
+    await session.send(session.config())
+    receiver = asyncio.create_task(_receive_frames(session))
+    logger.info(f"WebSocket 检测连接建立: {websocket.client}")
+    processed = 0
+    try:
+        while True:
+            await session.frame_ready.wait()
+            session.frame_ready.clear()
+            if session.closed:
+                break
+            if session.latest is None:
+                continue
+            frame_index, data = session.latest
+            session.latest = None
+            try:
+                result = await _detect_frame(session, frame_index, data)
+            except Exception as e:
+                # 检测或识别失败时告知客户端并关闭连接（1011：服务端内部错误）
+                logger.error(f"WebSocket 检测帧 {frame_index} 处理失败: {e}", exc_info=True)
+                await session.send({"type": "error", "frame": frame_index, "detail": f"检测失败: {str(e)}"})
+                await websocket.close(code=1011)
+                break
+            processed += 1
+            await session.send(result)
+    except Exception as e:
+        if not session.closed:
+            logger.error(f"WebSocket 检测出错: {e}", exc_info=True)
+    finally:
+        receiver.cancel()
+        logger.info(
+            f"WebSocket 检测连接关闭: {websocket.client}, 收到 {session.received} 帧, "
+            f"处理 {processed} 帧, 丢弃 {session.dropped} 帧"
+        )
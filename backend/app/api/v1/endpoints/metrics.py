@@ -0,0 +1,76 @@
+"""
+运行指标 API 端点
+"""
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+import logging
+
+from app.core.resources import ExecutionResources
+from app.services.recognition import RecognitionService
+from app.services.batching import RecognitionBatcher
+from app.services.cache import EmbeddingCache, LRUCache
+from app.services.personnel import PersonnelService
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+execution_resources: Optional[ExecutionResources] = None
+recognition_service: Optional[RecognitionService] = None
+recognition_batcher: Optional[RecognitionBatcher] = None
+result_cache: Optional[LRUCache] = None
+embedding_cache: Optional[EmbeddingCache] = None
+personnel_service: Optional[PersonnelService] = None
+
+
+def init_services(
+    resources: ExecutionResources,
+    recognition: RecognitionService,
+    batcher: Optional[RecognitionBatcher] = None,
+    detect_cache: Optional[LRUCache] = None,
+    face_cache: Optional[EmbeddingCache] = None,
+    personnel: Optional[PersonnelService] = None,
+):
+    """初始化服务实例"""
+    global execution_resources, recognition_service, recognition_batcher, result_cache, embedding_cache
+    global personnel_service
+    personnel_service = personnel
+    execution_resources = resources
+    recognition_service = recognition
+    recognition_batcher = batcher
+    result_cache = detect_cache
+    embedding_cache = face_cache
+
+
+@router.get("/metrics", summary="获取运行指标")
+async def get_metrics():
+    """
+    获取当前 worker 进程的运行指标：执行资源划分、人脸库规模与版本、识别批处理统计、结果缓存与人员信息缓存命中率、数据库连接池
+    """
+    if not execution_resources or not recognition_service:
+        raise HTTPException(status_code=500, detail="服务未初始化")
+
+    batching = None
+    if recognition_batcher:
+        batches, items = recognition_batcher.batches, recognition_batcher.items
+        batching = {
+            "workers": recognition_batcher.workers,
+            "batches": batches,
+            "items": items,
+            "avg_batch_size": round(items / batches, 2) if batches else 0.0,
+        }
+
+    return {
+        "resources": execution_resources.to_dict(),
+        "gallery": {
+            "size": recognition_service.gallery_size,
+            "generation": recognition_service.gallery_generation,
+        },
+        "batching": batching,
+        "cache": {
+            "detect": result_cache.stats() if result_cache else None,
+            "embedding": embedding_cache.stats() if embedding_cache else None,
+            "personnel": personnel_service.cache.stats() if personnel_service and personnel_service.cache else None,
+        },
+        "database": personnel_service.pool.stats() if personnel_service else None,
+    }
@@ -3,16 +3,24 @@
 """
 from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Form
 from typing import Optional, List
+import asyncio
 import logging
+import os
+import tempfile
 from pathlib import Path
-import cv2
-from PIL import Image as PILImage
 
-from app.services.personnel import PersonnelService
+from app.services.personnel import (
+    SEARCH_RANK_MAX_ROWS,
+    PersonnelService,
+    decode_list_cursor,
+    encode_list_cursor,
+)
 from app.services.recognition import RecognitionService
 from app.services.detection import DetectionService
+from app.services.enrollment import BulkEnrollmentService
 from app.core.config import settings
-from app.utils.image import decode_image_from_bytes, validate_image
+from app.utils.image import decode_image_rgb, validate_image
+from app.utils.upload import UploadError, read_image_upload, size_limit_message
 
 logger = logging.getLogger(__name__)
 
@@ -22,18 +30,45 @@ router = APIRouter()
 personnel_service: Optional[PersonnelService] = None
 recognition_service: Optional[RecognitionService] = None
 detection_service: Optional[DetectionService] = None
+enrollment_service: Optional[BulkEnrollmentService] = None
 
 
 def init_services(
     personnel: PersonnelService,
     recognition: RecognitionService,
-    detection: Optional[DetectionService] = None
+    detection: Optional[DetectionService] = None,
+    enrollment: Optional[BulkEnrollmentService] = None,
 ):
     """初始化服务实例"""
-    global personnel_service, recognition_service, detection_service
+    global personnel_service, recognition_service, detection_service, enrollment_service
     personnel_service = personnel
     recognition_service = recognition
     detection_service = detection
+    enrollment_service = enrollment
+
+
+LIST_COLUMNS = """
+    p.id, p.face_id, p.name, p.id_number, p.phone, p.address, p.gender,
+    p.status, p.photo_path, p.created_at, p.updated_at,
+    c.name AS category
+"""
+
+
+def _list_item(row) -> dict:
+    return {
+        "id": row["id"],
+        "face_id": row["face_id"],
+        "name": row["name"],
+        "id_number": row["id_number"],
+        "phone": row["phone"],
+        "address": row["address"],
+        "gender": row["gender"],
+        "category": row["category"],
+        "status": row["status"],
+        "photo_path": row["photo_path"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
 
 
 @router.get("/personnel", summary="获取人员列表")
@@ -41,7 +76,10 @@ async def get_personnel_list(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(10, ge=1, le=100, description="每页数量"),
     name: Optional[str] = Query(None, description="姓名搜索"),
-    status: Optional[str] = Query("active", description="状态筛选")
+    q: Optional[str] = Query(None, description="在姓名、身份证号、电话中检索，结果按相关度排序"),
+    status: Optional[str] = Query("active", description="状态筛选"),
+    cursor: Optional[str] = Query(None, description="游标分页：空字符串取第一页，之后传入上次返回的 next_cursor / prev_cursor"),
+    with_total: bool = Query(False, description="游标分页时是否返回总数（短时间缓存）"),
 ):
     """
     获取人员列表
@@ -49,67 +87,84 @@ async def get_personnel_list(
     - **page**: 页码，从1开始
     - **page_size**: 每页数量，最大100
     - **name**: 姓名搜索关键词
+    - **q**: 姓名/身份证号/电话检索关键词（匹配结果不多时按相关度排序）
     - **status**: 状态筛选（active/inactive）
+    - **cursor**: 传入时使用游标分页（page 参数不再生效），按录入时间倒序，任意深度翻页的代价与第一页相同
+    - **with_total**: 游标分页时是否返回总数
+    
+    关键词不少于 3 个字符时使用全文索引做子串匹配；更短时逐行做子串匹配（匹配范围相同，结果按录入时间倒序）。
+    游标分页下检索结果统一按录入时间倒序。
     """
     if not personnel_service:
         raise HTTPException(status_code=500, detail="服务未初始化")
     
+    list_cursor = None
+    if cursor:
+        try:
+            list_cursor = decode_list_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         conn = personnel_service._get_connection()
         if not conn:
             raise HTTPException(status_code=500, detail="数据库连接失败")
         
-        cursor = conn.cursor()
-        
-        # 构建查询条件
-        where_clauses = []
-        params = []
-        
-        if name:
-            where_clauses.append("name LIKE ?")
-            params.append(f"%{name}%")
+        db_cursor = conn.cursor()
+        
+        # 构建查询条件：全文索引匹配（personnel_fts）+ 人员表上的 LIKE 条件（短关键词）
+        search = personnel_service.build_search(q=q, name=name)
+        where_clauses = list(search.where)
+        params = list(search.params)
+        from_sql = "personnel_info p"
+        order_sql = "p.created_at DESC, p.id DESC"
+        if search.match:
+            from_sql = "personnel_fts JOIN personnel_info p ON p.id = personnel_fts.rowid"
+            where_clauses.insert(0, "personnel_fts MATCH ?")
+            params.insert(0, search.match)
+            # 全文索引按 rowid（即录入顺序）输出，倒序读取即最新录入在前，无需排序全部匹配行
+            order_sql = "personnel_fts.rowid DESC"
         
         # 不再需要 status 筛选，因为使用硬删除，所有记录都是 active 状态
         # 保留 status 参数以兼容旧版本，但实际不筛选
         
         where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
         
-        # 获取总数
-        count_sql = f"SELECT COUNT(*) FROM personnel_info WHERE {where_sql}"
-        cursor.execute(count_sql, params)
-        total = cursor.fetchone()[0]
+        # 总数（只有全文检索条件时直接在索引上计数，不逐行联表）
+        if search.match and len(where_clauses) == 1:
+            count_sql = "SELECT COUNT(*) FROM personnel_fts WHERE personnel_fts MATCH ?"
+        else:
+            count_sql = f"SELECT COUNT(*) FROM {from_sql} WHERE {where_sql}"
+        
+        if cursor is not None:
+            result = _get_personnel_page_by_cursor(
+                db_cursor, from_sql, where_clauses, params, page_size, list_cursor
+            )
+            result["total"] = (
+                personnel_service.count_personnel(db_cursor, count_sql, params) if with_total else None
+            )
+            conn.close()
+            return result
+        
+        db_cursor.execute(count_sql, params)
+        total = db_cursor.fetchone()[0]
+        
+        if search.match and q and not q.strip().isdigit() and total <= SEARCH_RANK_MAX_ROWS:
+            # 匹配行数不多时按 bm25 相关度排序（rank 越小越相关）；纯数字的号码片段相关度没有区分意义，不排序
+            order_sql = "personnel_fts.rank, p.created_at DESC"
         
         # 获取分页数据（join 类别表返回类别名称，响应格式不变）
         offset = (page - 1) * page_size
         query_sql = f"""
-            SELECT p.id, p.face_id, p.name, p.id_number, p.phone, p.address, p.gender,
-                   p.status, p.photo_path, p.created_at, p.updated_at,
-                   c.name AS category
-            FROM personnel_info p
+            SELECT {LIST_COLUMNS}
+            FROM {from_sql}
             LEFT JOIN personnel_categories c ON p.category_id = c.id
             WHERE {where_sql}
-            ORDER BY p.created_at DESC
+            ORDER BY {order_sql}
             LIMIT ? OFFSET ?
         """
-        cursor.execute(query_sql, params + [page_size, offset])
-        rows = cursor.fetchall()
-        
-        items = []
-        for row in rows:
-            items.append({
-                "id": row["id"],
-                "face_id": row["face_id"],
-                "name": row["name"],
-                "id_number": row["id_number"],
-                "phone": row["phone"],
-                "address": row["address"],
-                "gender": row["gender"],
-                "category": row["category"],
-                "status": row["status"],
-                "photo_path": row["photo_path"],
-                "created_at": row["created_at"],
-                "updated_at": row["updated_at"],
-            })
+        db_cursor.execute(query_sql, params + [page_size, offset])
+        items = [_list_item(row) for row in db_cursor.fetchall()]
         
         conn.close()
         
@@ -120,11 +175,82 @@ async def get_personnel_list(
             "page_size": page_size,
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取人员列表失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"获取人员列表失败: {str(e)}")
 
 
+def _get_personnel_page_by_cursor(
+    db_cursor, from_sql: str, where_clauses: List[str], params: list, page_size: int, list_cursor
+) -> dict:
+    """
+    游标（keyset）分页：以上一页边界行的 (created_at, id) 为起点，沿 idx_created_at_id 读取 page_size + 1 行，
+    不使用 OFFSET，翻到任意深度都只读取一页数据。多读的一行用于判断该方向上是否还有数据。
+    """
+    backward = list_cursor is not None and list_cursor.direction == "prev"
+    # 向前翻页时按正序读取紧邻游标的一页，再反转为倒序返回
+    order_sql = "p.created_at, p.id" if backward else "p.created_at DESC, p.id DESC"
+    if list_cursor is None:
+        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+        query_sql = f"""
+            SELECT {LIST_COLUMNS}
+            FROM {from_sql}
+            LEFT JOIN personnel_categories c ON p.category_id = c.id
+            WHERE {where_sql}
+            ORDER BY {order_sql}
+            LIMIT ?
+        """
+        query_params = params + [page_size + 1]
+    else:
+        # (created_at, id) 行值比较只能按 created_at 定位索引，同一时刻录入的行（批量导入）需要逐行跳过；
+        # 拆成“同一 created_at 中 id 之后的行”与“更早 created_at 的行”两段，每段都直接定位到起点
+        op = ">" if backward else "<"
+        branches = [
+            (f"p.created_at = ? AND p.id {op} ?", [list_cursor.created_at, list_cursor.id]),
+            (f"p.created_at {op} ?", [list_cursor.created_at]),
+        ]
+        selects = []
+        query_params = []
+        for condition, values in branches:
+            where_sql = " AND ".join(where_clauses + [condition])
+            selects.append(f"""
+                SELECT * FROM (
+                    SELECT {LIST_COLUMNS}
+                    FROM {from_sql}
+                    LEFT JOIN personnel_categories c ON p.category_id = c.id
+                    WHERE {where_sql}
+                    ORDER BY {order_sql}
+                    LIMIT ?
+                )
+            """)
+            query_params += params + values + [page_size + 1]
+        query_sql = " UNION ALL ".join(selects) + f" ORDER BY {order_sql.replace('p.', '')} LIMIT ?"
+        query_params.append(page_size + 1)
+    db_cursor.execute(query_sql, query_params)
+    rows = db_cursor.fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backward:
+        rows.reverse()
+    
+    # 向后翻页：有多读的一行即有下一页，带了游标即有上一页；向前翻页相反
+    has_next = (not backward and has_more) or backward
+    has_prev = (backward and has_more) or (not backward and list_cursor is not None)
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_list_cursor(rows[-1]["created_at"], rows[-1]["id"], "next")
+    if rows and has_prev:
+        prev_cursor = encode_list_cursor(rows[0]["created_at"], rows[0]["id"], "prev")
+    return {
+        "items": [_list_item(row) for row in rows],
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    }
+
+
 @router.get("/personnel/{personnel_id}", summary="获取人员详情")
 async def get_personnel(personnel_id: int):
     """获取人员详情"""
@@ -194,6 +320,78 @@ def _validate_category_id(conn, category_id: Optional[int]) -> None:
         raise HTTPException(status_code=400, detail=f"人员类别 id={category_id} 不存在")
 
 
+def _discard_face(face_id: str, photo_path: Optional[str]) -> None:
+    """撤销一次人脸录入：从人脸库移除特征并删除照片"""
+    recognition_service.remove_face(face_id)
+    if photo_path:
+        try:
+            (settings.FACES_DIR / photo_path).unlink()
+        except OSError:
+            pass
+
+
+def _insert_personnel(face_id, name, id_number, phone, address, gender, category_id, photo_path):
+    """写入人员记录，返回 (personnel_id, category_name)"""
+    conn = personnel_service._get_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="数据库连接失败")
+    
+    category_id_parsed = _parse_category_id(category_id)
+    cursor = conn.cursor()
+    _validate_category_id(conn, category_id_parsed)
+    
+    # 检查身份证号是否已存在（如果提供了身份证号）
+    if id_number:
+        cursor.execute(
+            "SELECT id FROM personnel_info WHERE id_number = ?",
+            (id_number,)
+        )
+        existing = cursor.fetchone()
+        if existing:
+            conn.close()
+            raise HTTPException(
+                status_code=400,
+                detail=f"身份证号 {id_number} 已被使用，请检查是否已存在该人员"
+            )
+    
+    category_name = None
+    try:
+        cursor.execute(
+            """INSERT INTO personnel_info (face_id, name, id_number, phone, address, gender, category_id, photo_path, status)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'active')""",
+            (face_id, name, id_number or None, phone or None, address or None, gender or None, category_id_parsed, photo_path)
+        )
+        conn.commit()
+        personnel_id = cursor.lastrowid
+        if category_id_parsed:
+            cursor.execute("SELECT name FROM personnel_categories WHERE id = ?", (category_id_parsed,))
+            r = cursor.fetchone()
+            if r:
+                category_name = r["name"]
+    except Exception as db_error:
+        conn.rollback()
+        conn.close()
+        # 如果是唯一约束错误，提供更友好的错误信息
+        if "UNIQUE constraint" in str(db_error):
+            if "id_number" in str(db_error):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"身份证号 {id_number} 已被使用，请检查是否已存在该人员"
+                )
+            elif "face_id" in str(db_error):
+                raise HTTPException(
+                    status_code=500,
+                    detail="人脸ID冲突，请重试"
+                )
+        raise
+    finally:
+        conn.close()
+    
+    personnel_service.invalidate_counts()
+    personnel_service.refresh_personnel([face_id])
+    return personnel_id, category_name
+
+
 @router.post("/personnel", summary="创建人员")
 async def create_personnel(
     name: str = Form(..., description="姓名"),
@@ -210,14 +408,12 @@ async def create_personnel(
     
     try:
         # 读取并验证图片
-        contents = await photo.read()
-        if len(contents) > settings.MAX_UPLOAD_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"文件大小超过限制（最大{settings.MAX_UPLOAD_SIZE}字节）"
-            )
+        try:
+            contents = await read_image_upload(photo, settings.MAX_UPLOAD_SIZE)
+        except UploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        image = decode_image_from_bytes(contents)
+        image = decode_image_rgb(contents)
         if image is None:
             raise HTTPException(status_code=400, detail="无法解码图像文件")
         
@@ -237,81 +433,20 @@ async def create_personnel(
         if not largest_face:
             raise HTTPException(status_code=400, detail="无法提取人脸")
         
-        # 提取人脸特征并保存（使用裁剪后的人脸用于特征提取）
-        face_img = largest_face['face_img']
-        face_id = recognition_service.add_face(face_img)
-        
+        # 一次前向提取特征，保存原图并加入人脸库
+        face_id = recognition_service.enroll(image, largest_face)
         if not face_id:
             raise HTTPException(status_code=500, detail="保存人脸特征失败")
-        
-        # 保存原图文件（不是裁剪后的人脸）
-        faces_dir = settings.FACES_DIR
         photo_path = f"{face_id}.jpg"
-        photo_file_path = faces_dir / photo_path
-        
-        # 保存原图，而不是裁剪后的人脸
-        pil_image = PILImage.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        pil_image.save(photo_file_path, "JPEG")
-        
-        # 重新加载该人脸到数据库（因为文件被原图覆盖了，需要从原图中重新提取特征）
-        # 注意：add_face 已经将特征添加到内存了，但为了确保一致性，我们从保存的原图中重新加载
-        recognition_service.reload_face(face_id, photo_file_path)
         
-        # 保存到数据库
-        conn = personnel_service._get_connection()
-        if not conn:
-            raise HTTPException(status_code=500, detail="数据库连接失败")
-        
-        category_id_parsed = _parse_category_id(category_id)
-        cursor = conn.cursor()
-        _validate_category_id(conn, category_id_parsed)
-        
-        # 检查身份证号是否已存在（如果提供了身份证号）
-        if id_number:
-            cursor.execute(
-                "SELECT id FROM personnel_info WHERE id_number = ?",
-                (id_number,)
-            )
-            existing = cursor.fetchone()
-            if existing:
-                conn.close()
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"身份证号 {id_number} 已被使用，请检查是否已存在该人员"
-                )
-        
-        category_name = None
+        # 保存到数据库（失败时撤销本次录入的人脸）
         try:
-            cursor.execute(
-                """INSERT INTO personnel_info (face_id, name, id_number, phone, address, gender, category_id, photo_path, status)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'active')""",
-                (face_id, name, id_number or None, phone or None, address or None, gender or None, category_id_parsed, photo_path)
+            personnel_id, category_name = _insert_personnel(
+                face_id, name, id_number, phone, address, gender, category_id, photo_path
             )
-            conn.commit()
-            personnel_id = cursor.lastrowid
-            if category_id_parsed:
-                cursor.execute("SELECT name FROM personnel_categories WHERE id = ?", (category_id_parsed,))
-                r = cursor.fetchone()
-                if r:
-                    category_name = r["name"]
-        except Exception as db_error:
-            conn.rollback()
-            conn.close()
-            # 如果是唯一约束错误，提供更友好的错误信息
-            if "UNIQUE constraint" in str(db_error):
-                if "id_number" in str(db_error):
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"身份证号 {id_number} 已被使用，请检查是否已存在该人员"
-                    )
-                elif "face_id" in str(db_error):
-                    raise HTTPException(
-                        status_code=500,
-                        detail="人脸ID冲突，请重试"
-                    )
+        except BaseException:
+            _discard_face(face_id, photo_path)
             raise
-        finally:
-            conn.close()
         
         # 返回创建的人员信息（响应格式不变：含 category 名称）
         return {
@@ -336,6 +471,65 @@ async def create_personnel(
         raise HTTPException(status_code=500, detail=f"创建人员失败: {str(e)}")
 
 
+@router.post("/personnel/import", summary="批量导入人员")
+async def import_personnel(
+    archive: UploadFile = File(..., description="照片 ZIP 包（可内含 manifest.csv）"),
+    manifest: Optional[UploadFile] = File(None, description="CSV 清单，不传则读取 ZIP 包内的 manifest.csv"),
+    job_id: Optional[str] = Form(None, description="导入任务ID，相同ID重复提交时跳过已完成的行；默认取清单内容哈希"),
+    batch_size: Optional[int] = Form(None, description="每批处理行数"),
+):
+    """
+    批量导入人员
+    
+    CSV 清单列：photo（ZIP 内照片路径，必填）, name（必填）, id_number, phone, address, gender,
+    category（类别名称）或 category_id。返回逐行的导入报告。
+    """
+    if not enrollment_service:
+        raise HTTPException(status_code=500, detail="服务未初始化")
+    
+    tmp_path = None
+    try:
+        # ZIP 包按块落盘到临时文件，超过上限立即中止
+        if archive.size is not None and archive.size > settings.MAX_BULK_UPLOAD_SIZE:
+            raise HTTPException(status_code=400, detail=size_limit_message(settings.MAX_BULK_UPLOAD_SIZE))
+        fd, tmp_path = tempfile.mkstemp(suffix=".zip")
+        size = 0
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = await archive.read(1024 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.MAX_BULK_UPLOAD_SIZE:
+                    raise HTTPException(status_code=400, detail=size_limit_message(settings.MAX_BULK_UPLOAD_SIZE))
+                tmp.write(chunk)
+        
+        loop = asyncio.get_event_loop()
+        if manifest:
+            manifest_text = (await manifest.read()).decode("utf-8-sig")
+        else:
+            try:
+                manifest_text = await loop.run_in_executor(None, enrollment_service.read_manifest, tmp_path)
+            except Exception:
+                raise HTTPException(status_code=400, detail="未提供 CSV 清单，且 ZIP 包内没有 manifest.csv")
+        
+        return await loop.run_in_executor(
+            None, enrollment_service.import_personnel, tmp_path, manifest_text, job_id, batch_size
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量导入人员失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"批量导入人员失败: {str(e)}")
+    finally:
+        if tmp_path:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
 @router.put("/personnel/{personnel_id}", summary="更新人员")
 async def update_personnel(
     personnel_id: int,
@@ -413,16 +607,15 @@ async def update_personnel(
             update_values.append(category_id_parsed)
         
         # 如果上传了新照片，需要重新提取特征
+        new_face_id = None
         if photo:
-            contents = await photo.read()
-            if len(contents) > settings.MAX_UPLOAD_SIZE:
+            try:
+                contents = await read_image_upload(photo, settings.MAX_UPLOAD_SIZE)
+            except UploadError as e:
                 conn.close()
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"文件大小超过限制（最大{settings.MAX_UPLOAD_SIZE}字节）"
-                )
+                raise HTTPException(status_code=400, detail=str(e))
             
-            image = decode_image_from_bytes(contents)
+            image = decode_image_rgb(contents)
             if image is None:
                 conn.close()
                 raise HTTPException(status_code=400, detail="无法解码图像文件")
@@ -446,30 +639,12 @@ async def update_personnel(
                 conn.close()
                 raise HTTPException(status_code=400, detail="无法提取人脸")
             
-            # 删除旧的人脸特征和图片
-            recognition_service.remove_face(old_face_id)
-            if old_photo_path:
-                old_photo_file = settings.FACES_DIR / old_photo_path
-                if old_photo_file.exists():
-                    old_photo_file.unlink()
-            
-            # 提取新的人脸特征（使用裁剪后的人脸用于特征提取）
-            face_img = largest_face['face_img']
-            new_face_id = recognition_service.add_face(face_img)
-            
+            # 一次前向提取新的人脸特征，保存原图并加入人脸库；旧人脸在写库成功后再移除
+            new_face_id = recognition_service.enroll(image, largest_face)
             if not new_face_id:
                 conn.close()
                 raise HTTPException(status_code=500, detail="保存人脸特征失败")
-            
-            # 保存原图（不是裁剪后的人脸）
             photo_path = f"{new_face_id}.jpg"
-            photo_file_path = settings.FACES_DIR / photo_path
-            
-            pil_image = PILImage.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            pil_image.save(photo_file_path, "JPEG")
-            
-            # 重新加载该人脸到数据库（因为文件被原图覆盖了，需要从原图中重新提取特征）
-            recognition_service.reload_face(new_face_id, photo_file_path)
             
             update_fields.append("face_id = ?")
             update_values.append(new_face_id)
@@ -490,6 +665,8 @@ async def update_personnel(
         except Exception as db_error:
             conn.rollback()
             conn.close()
+            if new_face_id:
+                _discard_face(new_face_id, photo_path)
             # 如果是唯一约束错误，提供更友好的错误信息
             if "UNIQUE constraint" in str(db_error):
                 if "id_number" in str(db_error):
@@ -501,6 +678,13 @@ async def update_personnel(
         finally:
             conn.close()
         
+        personnel_service.invalidate_counts()
+        # 新照片已生效，移除旧的人脸特征和图片
+        if new_face_id:
+            personnel_service.evict_personnel(old_face_id)
+            _discard_face(old_face_id, old_photo_path)
+        personnel_service.refresh_personnel([new_face_id or old_face_id])
+        
         # 返回更新后的人员信息
         return await get_personnel(personnel_id)
         
@@ -557,6 +741,8 @@ async def delete_personnel(personnel_id: int):
         cursor.execute("DELETE FROM personnel_info WHERE id = ?", (personnel_id,))
         conn.commit()
         conn.close()
+        personnel_service.invalidate_counts()
+        personnel_service.evict_personnel(face_id)
         
         logger.info(f"成功删除人员 ID: {personnel_id}, face_id: {face_id}")
         return {"message": "删除成功"}
@@ -0,0 +1,98 @@
+"""
+视频流处理 API 端点
+
+视频流状态只保存在处理它的进程内，多 worker 模式（API_WORKERS > 1）下不启用，接口返回 503。
+"""
+from fastapi import APIRouter, HTTPException, Form, Query
+from typing import Optional
+import logging
+
+from app.services.stream import StreamManager
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+stream_manager: Optional[StreamManager] = None
+# 视频流处理未启用的原因（多 worker 模式）
+disabled_reason: Optional[str] = None
+
+
+def init_services(manager: Optional[StreamManager], reason: Optional[str] = None):
+    """初始化服务实例；manager 为 None 时 reason 为视频流处理未启用的原因"""
+    global stream_manager, disabled_reason
+    stream_manager = manager
+    disabled_reason = reason
+
+
+def _get_manager() -> StreamManager:
+    if disabled_reason:
+        raise HTTPException(status_code=503, detail=disabled_reason)
+    if not stream_manager:
+        raise HTTPException(status_code=500, detail="服务未初始化")
+    return stream_manager
+
+
+@router.post("/streams", summary="启动视频流处理")
+async def start_stream(
+    source: str = Form(
+        ..., description="视频源：STREAM_ALLOWED_HOSTS 中主机的 RTSP/RTMP/HTTP 地址，或 STREAM_SOURCE_DIR 下的视频文件名"
+    ),
+    recognition_interval: Optional[int] = Form(None, ge=1, description="同一人脸轨迹的复核间隔（帧），默认取配置"),
+    max_stride: Optional[int] = Form(None, ge=1, le=300, description="静止画面的最大抽帧间隔（帧），默认取配置"),
+):
+    """
+    启动一路视频流：自适应抽帧检测人脸并跟踪，每条人脸轨迹只识别一次并定期复核，
+    识别结果通过 GET /streams/{stream_id}/events 获取
+    """
+    manager = _get_manager()
+    try:
+        processor = manager.start(source, recognition_interval, max_stride)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    logger.info(f"启动视频流: {processor.stream_id}, 视频源={source}")
+    return processor.stats()
+
+
+@router.get("/streams", summary="获取视频流列表")
+async def list_streams():
+    """获取所有视频流的状态与统计"""
+    manager = _get_manager()
+    return [processor.stats() for processor in manager.list()]
+
+
+@router.get("/streams/{stream_id}", summary="获取视频流状态")
+async def get_stream(stream_id: str):
+    """获取视频流的状态与统计（读取/处理帧数、识别次数、当前抽帧间隔等）"""
+    manager = _get_manager()
+    processor = manager.get(stream_id)
+    if not processor:
+        raise HTTPException(status_code=404, detail="视频流不存在")
+    return processor.stats()
+
+
+@router.get("/streams/{stream_id}/events", summary="获取视频流识别事件")
+async def get_stream_events(
+    stream_id: str,
+    since: int = Query(0, ge=0, description="只返回序号大于 since 的事件（上次获取的最后一个事件序号）"),
+):
+    """
+    获取识别事件：人脸轨迹首次识别（recognized）或复核时身份变化（identity_changed）
+    """
+    manager = _get_manager()
+    processor = manager.get(stream_id)
+    if not processor:
+        raise HTTPException(status_code=404, detail="视频流不存在")
+    return {"status": processor.status, "events": processor.events(since)}
+
+
+@router.delete("/streams/{stream_id}", summary="停止视频流处理")
+async def stop_stream(stream_id: str):
+    """停止并移除视频流"""
+    manager = _get_manager()
+    if not manager.remove(stream_id):
+        raise HTTPException(status_code=404, detail="视频流不存在")
+    logger.info(f"停止视频流: {stream_id}")
+    return {"message": "视频流已停止"}
@@ -1,7 +1,7 @@
 """
 应用核心配置
 """
-from config.settings import settings
+from config.settings import RUN_ID_ENV, WORKERS_ENV, settings
 
-__all__ = ["settings"]
+__all__ = ["RUN_ID_ENV", "WORKERS_ENV", "settings"]
 
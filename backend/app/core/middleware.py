@@ -0,0 +1,100 @@
+"""
+请求体大小限制中间件
+
+按路径限制上传请求体大小：Content-Length 超限的请求在读取请求体之前直接拒绝；
+分块传输或未声明长度的请求在接收过程中累计字节数，超限立即中止，
+不会等到表单解析把整个文件缓存下来。
+"""
+import re
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.upload import size_limit_message
+
+# 表单中除文件外其他字段与 multipart 分隔符的余量
+FORM_OVERHEAD = 64 * 1024
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """
+    按路径限制请求体大小，超限返回 400（与接口自身的大小校验一致）
+
+    Args:
+        limits: [(请求方法, 路径正则, 文件大小上限)]，按顺序匹配第一条
+        overhead: 请求体相对文件大小上限的余量
+    """
+
+    def __init__(self, app: ASGIApp, limits: Iterable[Tuple[str, str, int]], overhead: int = FORM_OVERHEAD):
+        self.app = app
+        self.limits: List[Tuple[str, Pattern, int]] = [
+            (method.upper(), re.compile(pattern), limit) for method, pattern, limit in limits
+        ]
+        self.overhead = overhead
+
+    def _limit_for(self, scope: Scope) -> Optional[int]:
+        for method, pattern, limit in self.limits:
+            if scope["method"] == method and pattern.match(scope["path"]):
+                return limit
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limit = self._limit_for(scope)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        max_body = limit + self.overhead
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    if int(value) > max_body:
+                        await self._reject(scope, receive, send, limit)
+                        return
+                except ValueError:
+                    pass
+                break
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            # 超限后接口自身产生的错误响应（如表单解析失败）被替换为统一的超限响应
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(scope, receive, send, limit)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, limit: int) -> None:
+        response = JSONResponse({"detail": size_limit_message(limit)}, status_code=400)
+        await response(scope, receive, send)
@@ -28,11 +28,21 @@ class PersonInfo(BaseModel):
     updated_at: Optional[str] = Field(None, description="更新时间")
 
 
+class Candidate(BaseModel):
+    """识别候选人员"""
+    face_id: str = Field(..., description="人脸ID")
+    similarity: float = Field(..., description="与人脸库中该人脸的余弦相似度")
+    person_info: Optional[PersonInfo] = Field(None, description="人员信息，人脸库中有但无人员记录时为null")
+
+
 class FaceResult(BaseModel):
     """单个人脸检测和识别结果"""
     face_box: FaceBox = Field(..., description="人脸位置框")
     person_info: Optional[PersonInfo] = Field(None, description="人员信息，未识别到人员时为null")
     recognition_confidence: Optional[float] = Field(None, description="识别置信度，未识别时为null")
+    candidates: Optional[List[Candidate]] = Field(
+        None, description="相似度最高的 top_k 个候选（不受识别阈值限制），仅在请求 top_k 时返回"
+    )
 
 
 class DetectResponse(BaseModel):
@@ -41,6 +51,19 @@ class DetectResponse(BaseModel):
     faces: List[FaceResult] = Field(default_factory=list, description="检测到的人脸列表，按检测置信度降序排列")
 
 
+class BatchDetectItem(BaseModel):
+    """批量检测中单张图片的结果"""
+    index: int = Field(..., description="图片在上传列表中的序号（从0开始）")
+    filename: Optional[str] = Field(None, description="文件名")
+    result: Optional[DetectResponse] = Field(None, description="检测结果，图片无效时为null")
+    error: Optional[str] = Field(None, description="错误信息，图片有效时为null")
+
+
+class BatchDetectResponse(BaseModel):
+    """批量人脸检测响应"""
+    results: List[BatchDetectItem] = Field(default_factory=list, description="与上传顺序一一对应的检测结果")
+
+
 class ErrorResponse(BaseModel):
     """错误响应"""
     error: str = Field(..., description="错误代码")
@@ -0,0 +1,206 @@
+"""
+执行资源配置
+
+按服务（人脸检测 / 人脸识别）划分 CPU 资源，避免各线程池与 torch/OpenMP 线程相互超额订阅：
+    - 本进程可用的 CPU 核：进程亲和性（可由 CPU_AFFINITY 限定），多 worker 时按 worker 数均分
+    - 检测与识别各自分得一部分核（DETECTION_CPU_SHARE），每个服务：
+        workers             并发执行的调用数（线程池线程数 / 模型副本数）
+        threads_per_worker  每个调用的 torch 计算线程数（= 分得核数 / workers）
+        cpus                CPU_PINNING 开启时绑定的核
+    - torch 的计算线程数与亲和性按线程生效，在各服务线程池的线程启动时设置
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DETECTION = "detection"
+RECOGNITION = "recognition"
+
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """解析 CPU 列表，如 "0-7,16,18-19" """
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus: List[int]) -> str:
+    """将 CPU 列表格式化为区间形式，如 [0,1,2,5] -> "0-2,5" """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{a}-{b}" if a != b else str(a) for a, b in ranges)
+
+
+def available_cpus() -> List[int]:
+    """当前进程可用的 CPU 核"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class ServiceResources:
+    """单个服务的线程预算"""
+
+    def __init__(self, name: str, cpus: List[int], workers: int, threads_per_worker: int, pinned: bool):
+        self.name = name
+        self.cpus = cpus
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.pinned = pinned
+
+    def configure_thread(self) -> None:
+        """在服务线程内调用：设置该线程的 torch 计算线程数与 CPU 亲和性"""
+        import torch
+
+        torch.set_num_threads(self.threads_per_worker)
+        if self.pinned and self.cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                # pid=0 只作用于调用线程，之后由该线程创建的 OpenMP 线程继承亲和性
+                os.sched_setaffinity(0, self.cpus)
+            except OSError as e:
+                logger.warning(f"设置 {self.name} 线程 CPU 亲和性失败: {e}")
+
+    def create_executor(self) -> ThreadPoolExecutor:
+        """创建按本服务预算配置的线程池"""
+        return ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix=f"{self.name}_worker",
+            initializer=self.configure_thread,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "cpus": format_cpu_list(self.cpus),
+            "cores": len(self.cpus),
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "pinned": self.pinned,
+        }
+
+
+class ExecutionResources:
+    """进程级的执行资源规划"""
+
+    def __init__(
+        self,
+        cpus: List[int],
+        detection: ServiceResources,
+        recognition: ServiceResources,
+        interop_threads: int,
+        process_workers: int,
+    ):
+        self.cpus = cpus
+        self.detection = detection
+        self.recognition = recognition
+        self.interop_threads = interop_threads
+        self.process_workers = process_workers
+
+    @classmethod
+    def plan(
+        cls,
+        cpus: Optional[List[int]] = None,
+        detection_share: Optional[float] = None,
+        detection_workers: Optional[int] = None,
+        recognition_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        pinned: Optional[bool] = None,
+    ) -> "ExecutionResources":
+        """根据配置（参数优先）计算各服务的线程预算"""
+        cpus = cpus if cpus is not None else available_cpus()
+        if settings.CPU_AFFINITY:
+            allowed = set(parse_cpu_list(settings.CPU_AFFINITY))
+            cpus = [c for c in cpus if c in allowed] or cpus
+        process_workers = max(1, process_workers if process_workers is not None else settings.PROCESS_WORKERS)
+        pinned = settings.CPU_PINNING if pinned is None else pinned
+
+        # 多 worker：每个进程只使用 1/N 的核（worker 之间不绑核，只限制线程数）
+        budget = len(cpus)
+        if process_workers > 1:
+            budget = settings.TORCH_THREADS_PER_WORKER or max(1, len(cpus) // process_workers)
+            pinned = False
+        budget = max(1, min(budget, len(cpus)))
+        cpus = cpus[:budget]
+
+        share = settings.DETECTION_CPU_SHARE if detection_share is None else detection_share
+        if budget >= 2:
+            det_cores = min(budget - 1, max(1, round(budget * share)))
+            det_cpus, rec_cpus = cpus[:det_cores], cpus[det_cores:]
+        else:
+            # 只有一个核时两个服务共用
+            det_cpus = rec_cpus = cpus
+
+        det_workers = detection_workers or settings.DETECTION_WORKERS or min(len(det_cpus), 8)
+        rec_workers = recognition_workers or settings.RECOGNITION_MODEL_REPLICAS
+        det_workers, rec_workers = max(1, det_workers), max(1, rec_workers)
+
+        return cls(
+            cpus=cpus,
+            detection=ServiceResources(
+                DETECTION, det_cpus, det_workers, max(1, len(det_cpus) // det_workers), pinned
+            ),
+            recognition=ServiceResources(
+                RECOGNITION, rec_cpus, rec_workers, max(1, len(rec_cpus) // rec_workers), pinned
+            ),
+            interop_threads=max(1, settings.TORCH_INTEROP_THREADS),
+            process_workers=process_workers,
+        )
+
+    def apply_process(self) -> None:
+        """进程级设置：inter-op 线程数与主线程的计算线程数（启动阶段加载人脸库时使用全部预算）"""
+        import cv2
+        import torch
+
+        # OpenCV 的并行由各服务线程池提供，不再为每次调用另起一组线程
+        cv2.setNumThreads(1)
+
+        try:
+            torch.set_num_interop_threads(self.interop_threads)
+        except RuntimeError as e:
+            # inter-op 线程池已启动后不能再修改
+            logger.debug(f"无法设置 inter-op 线程数: {e}")
+        torch.set_num_threads(len(self.cpus))
+
+    def for_service(self, service: str) -> ServiceResources:
+        return self.detection if service == DETECTION else self.recognition
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "process_workers": self.process_workers,
+            "cpus": format_cpu_list(self.cpus),
+            "interop_threads": self.interop_threads,
+            DETECTION: self.detection.to_dict(),
+            RECOGNITION: self.recognition.to_dict(),
+        }
+
+    def log_summary(self) -> None:
+        det, rec = self.detection, self.recognition
+        logger.info(
+            f"🧵 执行资源: 进程 {os.getpid()} 使用 {len(self.cpus)} 核 ({format_cpu_list(self.cpus)}), "
+            f"inter-op 线程 {self.interop_threads}"
+        )
+        logger.info(
+            f"   检测: {len(det.cpus)} 核, {det.workers} 个并发 x {det.threads_per_worker} 线程"
+            f"{' (绑核 ' + format_cpu_list(det.cpus) + ')' if det.pinned else ''}"
+        )
+        logger.info(
+            f"   识别: {len(rec.cpus)} 核, {rec.workers} 个并发 x {rec.threads_per_worker} 线程"
+            f"{' (绑核 ' + format_cpu_list(rec.cpus) + ')' if rec.pinned else ''}"
+        )
@@ -0,0 +1,151 @@
+"""
+识别模型的跨请求动态批处理调度器
+
+并发请求提交的人脸统一进入队列，由后台线程按「最大批大小」或「最大等待时间」
+凑成一个 batch，调用 RecognitionService.match_batch 做一次前向，再把候选结果分发回各请求的 future。
+多个后台线程（通常与模型副本数相同）并行处理，一个批次在前向时下一个批次可以同时凑批。
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.services.recognition import RecognitionService
+
+logger = logging.getLogger(__name__)
+
+# 停止信号
+_STOP = object()
+
+
+class RecognitionBatcher:
+    """跨请求的人脸识别微批调度器"""
+
+    def __init__(
+        self,
+        recognition: RecognitionService,
+        max_batch_size: int,
+        max_wait_ms: float,
+        workers: int = 1,
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        self.recognition = recognition
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.workers = max(1, workers)
+        # 后台线程启动时调用（设置线程的计算线程数与 CPU 亲和性）
+        self.initializer = initializer
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        # 统计信息：已处理的批次数与人脸数
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        """启动后台调度线程"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"recognition_batcher_{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(
+            f"识别批处理调度器已启动 (最大批大小: {self.max_batch_size}, "
+            f"最大等待: {self.max_wait * 1000:.1f}ms, 线程数: {self.workers})"
+        )
+
+    def stop(self):
+        """停止后台调度线程，队列中尚未处理的请求会先处理完"""
+        if not self._threads:
+            return
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, faces: List[Any], k: int = 1) -> List[Future]:
+        """提交一组人脸，返回与之一一对应的 future，结果为 top-k 候选列表"""
+        futures = []
+        for face in faces:
+            future: Future = Future()
+            self._queue.put((face, k, future))
+            futures.append(future)
+        return futures
+
+    async def match_batch(self, faces: List[Any], k: int = 1) -> List[List[Tuple[str, float]]]:
+        """异步接口：提交人脸并等待全部 top-k 候选结果"""
+        if not faces:
+            return []
+        futures = self.submit(faces, k)
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))
+
+    async def recognize_batch(self, faces: List[Any]) -> List[Optional[Tuple[str, float]]]:
+        """异步接口：提交人脸并等待全部识别结果（超过阈值的最佳匹配或 None）"""
+        candidates = await self.match_batch(faces)
+        return [self.recognition.best_match(c) for c in candidates]
+
+    def _process(self, batch: List[Any]) -> None:
+        """对一个 batch 做一次检索，按各请求的 k 截断后分发结果"""
+        k = max(item_k for _, item_k, _ in batch)
+        try:
+            results = self.recognition.match_batch([face for face, _, _ in batch], k=k)
+        except Exception as e:
+            logger.error(f"批量识别失败: {e}", exc_info=True)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, item_k, future), hits in zip(batch, results):
+            future.set_result(hits[:item_k])
+
+    def _collect(self, first: Any) -> Tuple[List[Any], bool]:
+        """以 first 开始凑一个 batch，直到达到最大批大小或等待超时"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        if self.initializer is not None:
+            self.initializer()
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+            # 已被取消的请求不再参与计算
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self._process(batch)
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+
+        # 处理停止信号之后仍留在队列中的请求；遇到其他线程的停止信号时放回队列
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(item)
+                break
+            if item[2].set_running_or_notify_cancel():
+                remaining.append(item)
+        if remaining:
+            self._process(remaining)
@@ -0,0 +1,149 @@
+"""
+识别结果缓存
+
+客户端经常重复提交相同或近似的图片（重试、重复帧、缩略图），每次都要重新跑 MTCNN 与 InceptionResnetV1。
+这里提供两级缓存：
+    - 检测结果缓存：以上传内容的 blake2b 哈希为键，缓存检测框与 top-k 候选（不含人员信息，人员信息每次实时查询）。
+      候选结果依赖人脸库，条目记录写入时的人脸库版本号，版本变化（录入/删除）后自动失效。
+    - 特征缓存：以对齐后 160x160 人脸的感知哈希（dHash）为键缓存特征向量。重新编码、缩放过的同一张图片
+      对齐后的人脸哈希相同，可以跳过特征提取前向。特征只依赖模型，不随人脸库版本失效。
+
+两者都是按字节数限制容量的 LRU 缓存，条目超过 TTL 后失效，并统计命中率。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+
+import cv2
+import numpy as np
+import torch
+
+# dHash 的边长：对齐人脸缩小为 (N+1)xN 灰度图，比较相邻像素得到 N*N 位哈希
+FACE_HASH_SIZE = 16
+
+
+class _Entry(NamedTuple):
+    value: Any
+    nbytes: int
+    expires_at: float
+    generation: Optional[int]
+
+
+class LRUCache:
+    """
+    线程安全的 LRU + TTL 缓存，按条目字节数限制总容量
+
+    Args:
+        max_bytes: 缓存条目的总字节数上限
+        ttl: 条目有效期（秒），0 表示不过期
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = 0):
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = max(0.0, ttl)
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, generation: Optional[int] = None) -> Optional[Any]:
+        """
+        读取缓存，未命中、已过期或人脸库版本与写入时不同的条目返回 None
+
+        Args:
+            generation: 当前人脸库版本号，为 None 时不校验
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expired = self.ttl and entry.expires_at < time.monotonic()
+                stale = generation is not None and entry.generation != generation
+                if expired or stale:
+                    self._discard(key)
+                    self.invalidations += 1
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: Hashable, value: Any, nbytes: int, generation: Optional[int] = None) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目；单个条目超过总容量时不缓存"""
+        if nbytes > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = _Entry(value, nbytes, expires_at, generation)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def content_key(data) -> str:
+    """上传内容的哈希（blake2b，128 位）"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def face_hash(face: torch.Tensor) -> bytes:
+    """
+    对齐人脸的感知哈希（dHash）
+
+    对齐人脸张量 [3, 160, 160]（post_process 后取值约在 [-1, 1]）转为灰度并缩小到
+    (FACE_HASH_SIZE+1) x FACE_HASH_SIZE，比较水平相邻像素的明暗得到 FACE_HASH_SIZE² 位哈希。
+    """
+    gray = face.detach().float().mean(dim=0).cpu().numpy()
+    small = cv2.resize(gray, (FACE_HASH_SIZE + 1, FACE_HASH_SIZE), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1]).tobytes()
+
+
+class EmbeddingCache:
+    """对齐人脸感知哈希 -> 特征向量"""
+
+    def __init__(self, max_bytes: int, ttl: float = 0):
+        self._cache = LRUCache(max_bytes, ttl)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        return self._cache.get(key)
+
+    def put(self, key: bytes, vec: np.ndarray) -> None:
+        self._cache.put(key, vec, vec.nbytes + len(key))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
@@ -0,0 +1,146 @@
+"""
+SQLite 连接池
+
+连接在进程内复用，不再为每次查询新建连接：
+    - 连接创建时统一设置 WAL 日志模式与 synchronous / cache_size / mmap_size 等 pragma，
+      WAL 模式下写事务不阻塞并发的读
+    - 每个连接保留 sqlite3 自带的语句缓存（cached_statements），连接复用后同一 SQL 不再重复编译
+    - 借出的连接包装为 PooledConnection，调用方式与 sqlite3.Connection 相同，
+      close() 回滚未提交的事务后将连接归还连接池，而不是真正关闭
+
+连接池为空时临时新建连接，归还时连接池已满则直接关闭，借出数量不设上限。
+"""
+import logging
+import queue
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 每个连接缓存的已编译语句数量
+STATEMENT_CACHE_SIZE = 256
+
+
+class PooledConnection:
+    """连接池借出的连接，close() 将连接归还连接池"""
+
+    def __init__(self, pool: "ConnectionPool", conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn: Optional[sqlite3.Connection] = conn
+
+    def __getattr__(self, name: str) -> Any:
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def __enter__(self) -> "PooledConnection":
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> Optional[bool]:
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __del__(self):
+        # 调用方忘记 close 时（如异常路径）由垃圾回收归还连接
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    SQLite 连接池
+
+    Args:
+        db_path: 数据库文件路径
+        size: 连接池保留的空闲连接数上限
+        pragmas: 每个新连接执行的 PRAGMA，如 {"synchronous": "NORMAL"}（journal_mode 单独设置为 WAL）
+        timeout: 等待其他连接释放写锁的超时（秒）
+    """
+
+    def __init__(self, db_path: str, size: int = 8, pragmas: Optional[Dict[str, Any]] = None, timeout: float = 5.0):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.pragmas = dict(pragmas or {})
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._wal_checked = False
+        self._closed = False
+        # 统计信息
+        self.created = 0
+        self.reused = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # 连接会在线程池的不同线程间借用，由连接池保证同一时刻只有一个使用者
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        # journal_mode 持久化在数据库文件中，只需设置一次
+        with self._lock:
+            check_wal = not self._wal_checked
+            self._wal_checked = True
+        if check_wal:
+            mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            if str(mode).lower() != "wal":
+                logger.warning(f"数据库无法切换为 WAL 模式，当前日志模式: {mode}")
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def connection(self) -> PooledConnection:
+        """借出一个连接（空闲连接不足时新建），用完调用 close() 归还"""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.reused += 1
+        except queue.Empty:
+            conn = self._connect()
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """归还连接：未提交的事务回滚（与关闭连接的语义一致），连接池已满或已关闭时直接关闭"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        if self._closed:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self) -> None:
+        """关闭全部空闲连接，之后归还的连接直接关闭"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "created": self.created,
+            "reused": self.reused,
+        }
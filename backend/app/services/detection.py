@@ -1,20 +1,38 @@
+import copy
+import queue
+from contextlib import contextmanager
 import torch
 import cv2
 import numpy as np
-from typing import List, Dict, Optional, Any
-from PIL import Image
-from threading import Lock
+from typing import Iterator, List, Dict, Optional, Any
 from facenet_pytorch import MTCNN
+from facenet_pytorch.models.utils.detect_face import detect_face
 from app.core.config import settings
+from app.services.recognition import FACE_IMAGE_SIZE, FACE_MARGIN
+
+# P-Net 的检测窗口：检测图上能检出的最小人脸（像素）
+PNET_WINDOW = 12
+# 缩小检测时图像金字塔缩放步长的上限（越接近 1 层数越多）
+MAX_PYRAMID_FACTOR = 0.85
 
 
 class DetectionService:
-    def __init__(self):
+    """
+    人脸检测服务
+    
+    并发模型：replicas 个 MTCNN 副本组成的池，每次检测借用一个副本，最多 replicas 个检测并行
+    （与检测线程池的并发数一致，每个并发按线程预算使用各自的 torch 计算线程）。
+    """
+    
+    def __init__(self, replicas: int = 1):
         self.device = torch.device(settings.DEVICE)
         self.threshold = settings.FACE_DETECTION_THRESHOLD
+        self.max_side = settings.DETECTION_MAX_SIDE
+        self.min_face_size = settings.DETECTION_MIN_FACE_SIZE
+        self.replicas = max(1, replicas)
         self.mtcnn = None
         self._initialized = False
-        self._lock = Lock()
+        self._replicas: "queue.Queue[MTCNN]" = queue.Queue()
     
     def initialize(self):
         if self._initialized:
@@ -71,13 +89,19 @@ class DetectionService:
             elif self.device.type == 'cpu':
                 logger.info("使用 CPU 设备")
             
+            # keep_all=True：extract 时为每个检测框都输出对齐后的人脸张量
             self.mtcnn = MTCNN(
-                image_size=160,
-                margin=20,
+                image_size=FACE_IMAGE_SIZE,
+                margin=FACE_MARGIN,
+                min_face_size=self.min_face_size,
                 device=mtcnn_device,  # 使用 mtcnn_device（MUSA 时使用 CPU）
-                post_process=True
+                post_process=True,
+                keep_all=True
             ).eval()
-            logger.info(f"检测模型已初始化 (MTCNN设备: {mtcnn_device}, 原始设备: {device_str})")
+            self._create_replicas(self.replicas, mtcnn_device)
+            logger.info(
+                f"检测模型已初始化 (MTCNN设备: {mtcnn_device}, 原始设备: {device_str}, 模型副本: {self.replicas})"
+            )
             self._initialized = True
         except Exception as e:
             import logging
@@ -85,40 +109,44 @@ class DetectionService:
             logger.error(f"检测服务初始化失败: {e}", exc_info=True)
             raise
     
-    def detect_faces(self, image: np.ndarray) -> List[Dict[str, Any]]:
-        """检测图像中的人脸位置"""
+    def _create_replicas(self, count: int, device: torch.device):
+        """
+        创建检测模型副本池
+        
+        CPU 上推理只读权重，各副本共享同一份模块即可并行；
+        GPU 等加速设备上每个副本独立拷贝一份权重，避免多个前向争用同一份模块。
+        """
+        for i in range(count):
+            self._replicas.put(self.mtcnn if i == 0 or device.type == 'cpu' else copy.deepcopy(self.mtcnn))
+    
+    @contextmanager
+    def _replica(self) -> Iterator[MTCNN]:
+        """借用一个检测模型副本，池中没有空闲副本时等待"""
+        mtcnn = self._replicas.get()
+        try:
+            yield mtcnn
+        finally:
+            self._replicas.put(mtcnn)
+    
+    def detect_faces(self, image: np.ndarray, max_side: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        检测图像中的人脸位置
+        
+        整个流程只使用传入的一份 RGB 图像：检测以张量视图传给 P/R/O-Net，人脸裁剪图（face_img）是原图的视图，
+        MTCNN 在同一次检测中对齐好的人脸张量（face_tensor，[3, 160, 160]）也直接从原图裁剪缩放，
+        识别服务可直接使用，无需再次检测。
+        
+        Args:
+            image: RGB 图像（如 decode_image_rgb 的解码结果）
+            max_side: 检测图长边上限，默认取 DETECTION_MAX_SIDE
+        """
         if not self._initialized:
             return []
         
         try:
-            frame_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            pil_frame = Image.fromarray(frame_rgb)
-            
-            with self._lock:
-                boxes, probs = self.mtcnn.detect(pil_frame)
-            
-            faces = []
-            if boxes is not None and probs is not None:
-                for box, prob in zip(boxes, probs):
-                    if prob > self.threshold:
-                        x, y, w, h = box.astype(int)
-                        x = max(0, x)
-                        y = max(0, y)
-                        w = min(w, image.shape[1] - x)
-                        h = min(h, image.shape[0] - y)
-                        face_img = image[y:y+h, x:x+w].copy()
-                        
-                        if face_img.size > 0 and face_img.shape[0] > 20 and face_img.shape[1] > 20:
-                            faces.append({
-                                "x": int(x),
-                                "y": int(y),
-                                "w": int(w),
-                                "h": int(h),
-                                "confidence": float(prob),
-                                "face_img": face_img
-                            })
-            
-            return faces
+            frame, scale, min_size, factor = self._prepare_frame(image, max_side)
+            detected = self._run_detector(frame[None], min_size, factor)[0]
+            return self._collect_faces(image, frame, detected)
             
         except Exception as e:
             import logging
@@ -126,6 +154,120 @@ class DetectionService:
             logger.error(f"人脸检测失败: {e}", exc_info=True)
             return []
     
+    def detect_faces_batch(self, images: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """
+        批量检测多张 RGB 图像中的人脸，返回与输入一一对应的人脸列表
+        
+        检测图尺寸相同的图像（如同一路摄像头的多帧）堆叠为一个 batch，一次运行 P/R/O-Net；
+        检测失败的图像返回空列表。
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in images]
+        if not self._initialized:
+            return results
+        
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        groups: Dict[tuple, List[int]] = {}
+        prepared = []
+        for i, image in enumerate(images):
+            try:
+                frame, scale, min_size, factor = self._prepare_frame(image)
+            except Exception as e:
+                logger.error(f"人脸检测失败: {e}", exc_info=True)
+                prepared.append(None)
+                continue
+            prepared.append(frame)
+            groups.setdefault((frame.shape, min_size, factor), []).append(i)
+        
+        for (_, min_size, factor), indices in groups.items():
+            try:
+                frames = [prepared[i] for i in indices]
+                batch = frames[0][None] if len(frames) == 1 else np.stack(frames)
+                for i, detected in zip(indices, self._run_detector(batch, min_size, factor)):
+                    results[i] = self._collect_faces(images[i], prepared[i], detected)
+            except Exception as e:
+                logger.error(f"批量人脸检测失败: {e}", exc_info=True)
+        return results
+    
+    def _detection_scale(self, height: int, width: int, max_side: Optional[int] = None) -> float:
+        """检测图相对原图的缩放比例（只缩小不放大）"""
+        max_side = self.max_side if max_side is None else max_side
+        longest = max(height, width)
+        if max_side <= 0 or longest <= max_side:
+            return 1.0
+        return max_side / longest
+    
+    def _prepare_frame(self, image: np.ndarray, max_side: Optional[int] = None):
+        """
+        准备检测图，返回 (检测图, 缩放比例, 最小人脸尺寸, 金字塔缩放步长)
+        
+        大图先缩小到长边 max_side 再检测：最小人脸尺寸按缩放比例换算到检测图（不低于 P-Net 窗口），
+        检测图较小、金字塔层数减少，缩放步长相应加密以保持召回。对齐裁剪仍在原图上进行。
+        """
+        height, width = image.shape[:2]
+        scale = self._detection_scale(height, width, max_side)
+        frame, factor = image, self.mtcnn.factor
+        if scale < 1.0:
+            frame = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+            factor = min(MAX_PYRAMID_FACTOR, factor ** scale)
+        min_size = max(PNET_WINDOW, self.min_face_size * scale)
+        # 以张量视图传给检测网络，只读数组需要先拷贝
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        return frame, scale, min_size, factor
+    
+    def _run_detector(self, frames: np.ndarray, min_size: float, factor: float) -> List[np.ndarray]:
+        """对一组同尺寸检测图 [N, H, W, 3] 运行 P/R/O-Net，返回每张图的检测结果 [M, 5]（检测图坐标 + 置信度）"""
+        # 以张量视图传入（detect_face 对 ndarray 输入会整批拷贝一份）
+        with self._replica() as mtcnn, torch.no_grad():
+            batch_boxes, _ = detect_face(
+                torch.from_numpy(frames), min_size,
+                mtcnn.pnet, mtcnn.rnet, mtcnn.onet,
+                mtcnn.thresholds, factor, mtcnn.device
+            )
+        return [np.asarray(boxes, dtype=np.float32).reshape(-1, 5) for boxes in batch_boxes]
+    
+    def _collect_faces(self, image: np.ndarray, frame: np.ndarray, detected: np.ndarray) -> List[Dict[str, Any]]:
+        """将检测结果映射回原图坐标，按阈值筛选，裁剪人脸视图并在原图上对齐"""
+        if len(detected) == 0:
+            return []
+        boxes, probs = detected[:, :4], detected[:, 4]
+        if frame.shape[:2] != image.shape[:2]:
+            boxes[:, [0, 2]] *= image.shape[1] / frame.shape[1]
+            boxes[:, [1, 3]] *= image.shape[0] / frame.shape[0]
+        
+        faces = []
+        kept_boxes = []
+        for box, prob in zip(boxes, probs):
+            if prob > self.threshold:
+                x, y, w, h = box.astype(int)
+                x = max(0, x)
+                y = max(0, y)
+                w = min(w, image.shape[1] - x)
+                h = min(h, image.shape[0] - y)
+                face_img = image[y:y+h, x:x+w]
+                
+                if face_img.size > 0 and face_img.shape[0] > 20 and face_img.shape[1] > 20:
+                    faces.append({
+                        "x": int(x),
+                        "y": int(y),
+                        "w": int(w),
+                        "h": int(h),
+                        "confidence": float(prob),
+                        "face_img": face_img
+                    })
+                    kept_boxes.append(box)
+        
+        if kept_boxes:
+            # 基于已有检测框直接裁剪对齐，不再重复运行 P/R/O-Net
+            face_tensors = self.mtcnn.extract(image, np.stack(kept_boxes), None)
+            for face, face_tensor in zip(faces, face_tensors):
+                face["face_tensor"] = face_tensor
+        
+        return faces
+    
     def get_largest_face(self, faces: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """获取最大的人脸"""
         if not faces:
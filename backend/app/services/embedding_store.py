@@ -0,0 +1,324 @@
+"""
+人脸特征持久化存储
+
+人脸库特征以 float32 矩阵文件（.npy）+ face_id 索引（index.json）的形式保存在磁盘上。
+启动时对矩阵做内存映射，按照片文件的 mtime/size（必要时 sha1）校验每条记录，
+只对新增或变更的照片重新提取特征，避免每次启动都对整个人脸库跑 MTCNN + InceptionResnetV1。
+检测不到人脸的照片也记录在索引中（no_face），照片未变更时不再重复检测。
+
+矩阵文件名带写入代号（embeddings-<generation>.npy），索引记录当前代号：每次写入先完整写出新的矩阵文件，
+再原子替换索引，索引替换是唯一的提交点。任意时刻崩溃，索引引用的都是与之匹配的矩阵，
+不会出现行数相同但行与 face_id 错位的情况。
+"""
+import hashlib
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 存储格式版本，格式不兼容变更时递增
+STORE_FORMAT_VERSION = 2
+
+MATRIX_FILE_PREFIX = "embeddings"
+INDEX_FILE = "index.json"
+
+FACE_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def file_sha1(path: Path, chunk_size: int = 1 << 20) -> str:
+    """计算文件 sha1"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class EmbeddingStore:
+    """人脸特征持久化存储（矩阵文件 + 索引文件）"""
+
+    def __init__(self, store_dir: Path, faces_dir: Path, fingerprint: Dict[str, Any]):
+        self.store_dir = Path(store_dir)
+        self.faces_dir = Path(faces_dir)
+        self.fingerprint = fingerprint
+        self.index_path = self.store_dir / INDEX_FILE
+        # face_id -> {"file", "mtime_ns", "size", "sha1"}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # 检测不到人脸的照片：face_id -> {"file", "mtime_ns", "size", "sha1"}
+        self._no_face: Dict[str, Dict[str, Any]] = {}
+        # face_id -> 特征向量（来自内存映射的行或运行时新增的向量）
+        self._vectors: Dict[str, np.ndarray] = {}
+        # 当前内存映射的特征矩阵，行顺序与 _entries 一致（未修改时直接返回给调用方）
+        self._matrix: Optional[np.ndarray] = None
+        self._dim: Optional[int] = None
+        self._dirty = False
+
+    def _load(self) -> None:
+        """加载索引并内存映射特征矩阵，版本或指纹不匹配时丢弃旧存储"""
+        self._entries.clear()
+        self._no_face.clear()
+        self._vectors.clear()
+        self._matrix = None
+        if not self.index_path.exists():
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except Exception as e:
+            logger.warning(f"特征索引读取失败，将重建: {e}")
+            return
+
+        if index.get("format_version") != STORE_FORMAT_VERSION:
+            logger.info("特征存储格式版本变更，将重建")
+            return
+        if index.get("fingerprint") != self.fingerprint:
+            logger.info("模型或预处理配置变更，特征存储将重建")
+            return
+
+        matrix_file = index.get("matrix")
+        if not matrix_file or Path(matrix_file).name != matrix_file:
+            logger.warning("特征索引缺少矩阵文件，将重建")
+            return
+        try:
+            matrix = np.load(self.store_dir / matrix_file, mmap_mode="r")
+        except Exception as e:
+            logger.warning(f"特征矩阵读取失败，将重建: {e}")
+            return
+
+        entries = index.get("entries", [])
+        if matrix.ndim != 2 or matrix.dtype != np.float32 or matrix.shape[0] != len(entries):
+            logger.warning("特征矩阵与索引不一致，将重建")
+            return
+
+        self._matrix = matrix
+        self._dim = int(matrix.shape[1])
+        for row, entry in enumerate(entries):
+            face_id = entry.pop("face_id")
+            self._entries[face_id] = entry
+            self._vectors[face_id] = matrix[row]
+        for entry in index.get("no_face", []):
+            self._no_face[entry.pop("face_id")] = entry
+
+    def sync(
+        self, embed_fn: Callable[[Path], Optional[np.ndarray]]
+    ) -> Tuple[List[str], List[str], Optional[np.ndarray]]:
+        """
+        将存储与人脸图片目录同步
+
+        未变更的照片直接复用存储中的特征；新增或变更的照片调用 embed_fn 重新提取；
+        已删除的照片从存储中移除。
+
+        Returns:
+            (face_id 列表, 照片路径列表, 特征矩阵[N, D])，人脸库为空时矩阵为 None
+        """
+        self._load()
+        faces_dir = self.faces_dir
+        seen = set()
+        reused = embedded = no_face = 0
+
+        for name in sorted(os.listdir(faces_dir)):
+            if not name.lower().endswith(FACE_IMAGE_EXTENSIONS):
+                continue
+            path = faces_dir / name
+            face_id = path.stem
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            seen.add(face_id)
+
+            entry = self._entries.get(face_id)
+            if entry is not None and self._unchanged(entry, path, st):
+                reused += 1
+                continue
+            entry = self._no_face.get(face_id)
+            if entry is not None and self._unchanged(entry, path, st):
+                no_face += 1
+                continue
+
+            try:
+                vec = embed_fn(path)
+            except Exception as e:
+                # 提取出错（可能是暂时性的）不记录为无人脸，下次启动重试
+                logger.debug(f"跳过 {name}: {e}")
+                self.discard(face_id)
+                continue
+            if vec is None:
+                self.mark_no_face(face_id, path, stat=st)
+                no_face += 1
+                continue
+            self.put(face_id, path, vec, stat=st)
+            embedded += 1
+
+        for face_id in list(self._entries) + list(self._no_face):
+            if face_id not in seen:
+                self.discard(face_id)
+
+        logger.info(f"特征存储同步完成: 复用 {reused} 个, 重新提取 {embedded} 个, 无人脸 {no_face} 个")
+        if self._dirty:
+            self.flush()
+        return self.snapshot()
+
+    def _unchanged(self, entry: Dict[str, Any], path: Path, st: os.stat_result) -> bool:
+        """照片与记录时相同（文件名、大小、mtime 一致，或 mtime 变化但内容哈希一致）"""
+        if entry["file"] != path.name or entry["size"] != st.st_size:
+            return False
+        if entry["mtime_ns"] == st.st_mtime_ns:
+            return True
+        # mtime 变化但大小相同：比对内容哈希，避免 touch/拷贝导致的无谓重算
+        try:
+            if entry.get("sha1") and file_sha1(path) == entry["sha1"]:
+                entry["mtime_ns"] = st.st_mtime_ns
+                self._dirty = True
+                return True
+        except OSError:
+            pass
+        return False
+
+    @staticmethod
+    def _file_entry(path: Path, st: os.stat_result) -> Dict[str, Any]:
+        return {
+            "file": path.name,
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "sha1": file_sha1(path),
+        }
+
+    def snapshot(self) -> Tuple[List[str], List[str], Optional[np.ndarray]]:
+        """返回当前存储内容 (face_id 列表, 照片路径列表, 特征矩阵)"""
+        face_ids = list(self._entries)
+        paths = [str(self.faces_dir / e["file"]) for e in self._entries.values()]
+        if not face_ids:
+            return [], [], None
+        if not self._dirty and self._matrix is not None:
+            return face_ids, paths, self._matrix
+        matrix = np.stack([self._vectors[fid] for fid in face_ids]).astype(np.float32, copy=False)
+        return face_ids, paths, matrix
+
+    def put(self, face_id: str, path: Path, vec: np.ndarray, stat: Optional[os.stat_result] = None) -> None:
+        """记录（新增或覆盖）一个人脸特征"""
+        path = Path(path)
+        st = stat or path.stat()
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        if self._dim is None:
+            self._dim = int(vec.shape[0])
+        self._entries[face_id] = self._file_entry(path, st)
+        self._no_face.pop(face_id, None)
+        self._vectors[face_id] = vec
+        self._dirty = True
+
+    def mark_no_face(self, face_id: str, path: Path, stat: Optional[os.stat_result] = None) -> None:
+        """记录一张检测不到人脸的照片（照片变更前不再重复检测）"""
+        path = Path(path)
+        st = stat or path.stat()
+        if self._entries.pop(face_id, None) is not None:
+            self._vectors.pop(face_id, None)
+        self._no_face[face_id] = self._file_entry(path, st)
+        self._dirty = True
+
+    def discard(self, face_id: str) -> None:
+        """移除一个人脸特征（或无人脸记录）"""
+        if self._entries.pop(face_id, None) is not None:
+            self._vectors.pop(face_id, None)
+            self._dirty = True
+        if self._no_face.pop(face_id, None) is not None:
+            self._dirty = True
+
+    def reconcile(self, face_ids: List[str], paths: List[Path], matrix: Optional[np.ndarray]) -> None:
+        """以给定的人脸库内容为准更新存储：新增或变更的特征写入，不在其中的移除，并写回磁盘"""
+        self._load()
+        live = set(face_ids)
+        for face_id, path, vec in zip(face_ids, paths, matrix if matrix is not None else []):
+            current = self._vectors.get(face_id)
+            if current is not None and np.allclose(current, vec, atol=1e-5):
+                continue
+            try:
+                self.put(face_id, path, vec)
+            except OSError:
+                # 照片已被删除
+                continue
+        for face_id in list(self._entries):
+            if face_id not in live:
+                self.discard(face_id)
+        # 无人脸记录不在人脸库中，照片仍存在时保留
+        for face_id, entry in list(self._no_face.items()):
+            if not (self.faces_dir / entry["file"]).exists():
+                self.discard(face_id)
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        将当前内容写回磁盘
+
+        先写出新代号的矩阵文件并落盘，再原子替换索引（提交点），最后删除不再引用的旧矩阵文件。
+        """
+        if not self._dirty:
+            return
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        face_ids = list(self._entries)
+        dim = self._dim or 0
+
+        generation = uuid.uuid4().hex
+        matrix_file = f"{MATRIX_FILE_PREFIX}-{generation}.npy"
+        matrix_path = self.store_dir / matrix_file
+        tmp_index = self.index_path.with_name(INDEX_FILE + ".tmp")
+        try:
+            matrix = np.zeros((len(face_ids), dim), dtype=np.float32)
+            for row, face_id in enumerate(face_ids):
+                matrix[row] = self._vectors[face_id]
+            with open(matrix_path, "wb") as f:
+                np.save(f, matrix)
+                f.flush()
+                os.fsync(f.fileno())
+            del matrix
+
+            index = {
+                "format_version": STORE_FORMAT_VERSION,
+                "fingerprint": self.fingerprint,
+                "generation": generation,
+                "matrix": matrix_file,
+                "dim": dim,
+                "entries": [{"face_id": fid, **self._entries[fid]} for fid in face_ids],
+                "no_face": [{"face_id": fid, **entry} for fid, entry in self._no_face.items()],
+            }
+            with open(tmp_index, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(tmp_index, self.index_path)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"特征存储写入失败: {e}", exc_info=True)
+            for tmp in (matrix_path, tmp_index):
+                try:
+                    tmp.unlink()
+                except OSError:
+                    pass
+            return
+
+        # 写回后重新映射，释放旧映射与运行时新增向量占用的内存，再删除旧矩阵文件
+        self._load()
+        self._remove_stale_matrices(matrix_file)
+        logger.debug(f"特征存储已写入: {len(face_ids)} 条")
+
+    def _remove_stale_matrices(self, current: str) -> None:
+        """删除索引不再引用的矩阵文件（旧代号或写入中途崩溃留下的文件）"""
+        for path in self.store_dir.glob(f"{MATRIX_FILE_PREFIX}*.npy"):
+            if path.name == current:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                # Windows 下仍被内存映射的文件无法删除，下次写入时再清理
+                pass
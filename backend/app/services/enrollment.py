@@ -0,0 +1,439 @@
+"""
+批量人员导入服务
+
+输入为照片目录或 ZIP 包，外加 CSV 清单（manifest），清单列：
+    photo（必填，相对目录/ZIP 的照片路径）, name（必填）, id_number, phone, address, gender,
+    category（类别名称，不存在时自动创建）或 category_id
+
+流程：
+    1. 进程池并行解码照片并检测人脸（每个进程在 CPU 上加载一份 MTCNN），
+       只将 JPEG 编码后的照片与对齐后的人脸（[3, 160, 160]）传回主进程
+    2. 照片写入该任务的暂存目录，整批人脸一次前向提取特征
+    3. 整批人员记录在一个 SQLite 事务中写入，同时写入导入日志
+    4. 提交后照片从暂存目录移入人脸库目录（{face_id}.jpg），整批特征一次性加入人脸库
+
+每行的处理结果记录在报告中；导入日志按 (job_id, 照片路径) 记录已完成的行，
+中断后以同一 job_id 重新导入会跳过已完成的行（断点续传）。
+人脸库只加载人脸库目录下的照片，中断时未提交的照片留在暂存目录中，不会成为人脸库中没有人员记录的人脸；
+重新导入时已提交的照片移入人脸库目录，未提交的删除。
+"""
+import csv
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import sqlite3
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+from app.core.config import settings
+from app.services.detection import DetectionService
+from app.services.personnel import PersonnelService
+from app.services.recognition import RecognitionService
+from app.utils.archive import PhotoSource, decode_photo, write_photo
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.csv"
+VALID_GENDERS = {"male", "female", "other", ""}
+# 人脸库目录下的暂存目录（按 job_id 分子目录），人脸库加载时不读取
+STAGING_DIR_NAME = ".import-staging"
+
+# 解码进程内的检测服务与照片读取器（由 _init_worker 创建）
+_worker_detection: Optional[DetectionService] = None
+_worker_source: Optional[PhotoSource] = None
+
+
+def _init_worker(source: str, threads: int = 1) -> None:
+    """
+    解码进程初始化：打开照片目录/ZIP 包，在 CPU 上加载 MTCNN（只加载检测模型，不加载特征提取网络）
+
+    进程池随导入任务创建与关闭，ZIP 包在进程退出时随之关闭。
+    """
+    global _worker_detection, _worker_source
+    torch.set_num_threads(max(1, threads))
+    _worker_source = PhotoSource(source)
+    _worker_detection = DetectionService()
+    _worker_detection.device = torch.device("cpu")
+    _worker_detection.initialize()
+
+
+def _prepare_photo(member: str) -> Tuple[Optional[bytes], Optional[np.ndarray], Optional[str]]:
+    """
+    解码进程中执行：解码照片、检测最大人脸并对齐
+
+    Returns:
+        (JPEG 字节, 对齐后的人脸 [3, 160, 160], 错误信息)，成功时错误信息为 None
+    """
+    image, data, error = decode_photo(_worker_source, member)
+    if error:
+        return None, None, error
+    largest = _worker_detection.get_largest_face(_worker_detection.detect_faces(image))
+    if not largest or largest.get("face_tensor") is None:
+        return None, None, "图片中未检测到人脸"
+    return data, largest["face_tensor"].numpy(), None
+
+
+def _job_id_for(manifest_text: str) -> str:
+    """未指定 job_id 时，以清单内容的哈希作为任务标识"""
+    return hashlib.sha1(manifest_text.encode("utf-8")).hexdigest()[:16]
+
+
+class BulkEnrollmentService:
+    """批量人员导入服务"""
+
+    def __init__(
+        self,
+        personnel: PersonnelService,
+        recognition: RecognitionService,
+        detection: DetectionService,
+    ):
+        self.personnel = personnel
+        self.recognition = recognition
+        self.detection = detection
+
+    def read_manifest(self, source: str, manifest_path: Optional[str] = None) -> str:
+        """读取 CSV 清单：优先使用指定文件，否则读取目录/ZIP 中的 manifest.csv"""
+        if manifest_path:
+            data = Path(manifest_path).read_bytes()
+        else:
+            with PhotoSource(source) as photos:
+                data = photos.read(MANIFEST_NAME, settings.MAX_UPLOAD_SIZE)
+        return data.decode("utf-8-sig")
+
+    def import_personnel(
+        self,
+        source: str,
+        manifest_text: str,
+        job_id: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        执行批量导入
+
+        Args:
+            source: 照片目录或 ZIP 包路径
+            manifest_text: CSV 清单内容
+            job_id: 任务标识，用于断点续传；默认取清单内容哈希
+            batch_size: 每批处理（一次前向 + 一个事务）的行数
+            workers: 解码与人脸检测进程数
+
+        Returns:
+            导入报告：{"job_id", "total", "created", "skipped", "failed", "rows": [...]}
+        """
+        job_id = job_id or _job_id_for(manifest_text)
+        batch_size = max(1, batch_size or settings.BULK_IMPORT_BATCH_SIZE)
+        workers = max(1, workers or settings.BULK_IMPORT_WORKERS)
+        self._recover_staged_photos(job_id)
+
+        report_rows: List[Dict[str, Any]] = []
+        rows = self._parse_manifest(manifest_text, report_rows)
+        done = self._completed_rows(job_id)
+
+        pending = []
+        for row in rows:
+            if row["photo"] in done:
+                report_rows.append({"row": row["row"], "photo": row["photo"], "status": "skipped"})
+            else:
+                pending.append(row)
+
+        category_ids = self._resolve_categories(pending, report_rows)
+        pending = [row for row in pending if row.get("error") is None]
+
+        logger.info(f"开始批量导入: job_id={job_id}, 待处理 {len(pending)} 行, 跳过 {len(rows) - len(pending)} 行")
+        # 使用 spawn 启动解码进程，避免 fork 已加载模型与线程池的进程；每个进程单线程运行 MTCNN
+        if pending:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(source, 1),
+            ) as pool:
+                for start in range(0, len(pending), batch_size):
+                    batch = pending[start:start + batch_size]
+                    report_rows.extend(self._import_batch(pool, job_id, batch, category_ids))
+                    logger.info(f"批量导入进度: {min(start + batch_size, len(pending))}/{len(pending)}")
+        self._remove_staging_dir(job_id)
+
+        report_rows.sort(key=lambda r: r["row"])
+        return {
+            "job_id": job_id,
+            "total": len(report_rows),
+            "created": sum(1 for r in report_rows if r["status"] == "created"),
+            "skipped": sum(1 for r in report_rows if r["status"] == "skipped"),
+            "failed": sum(1 for r in report_rows if r["status"] == "error"),
+            "rows": report_rows,
+        }
+
+    def _parse_manifest(self, manifest_text: str, report_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """解析并校验清单，非法行直接记入报告"""
+        rows = []
+        seen = set()
+        reader = csv.DictReader(io.StringIO(manifest_text))
+        # 数据行从第 2 行开始（第 1 行为表头）
+        for line_no, record in enumerate(reader, start=2):
+            record = {(k or "").strip(): (v or "").strip() for k, v in record.items()}
+            photo = record.get("photo", "")
+            error = None
+            if not photo:
+                error = "缺少 photo 列"
+            elif photo in seen:
+                error = "照片在清单中重复"
+            elif not record.get("name"):
+                error = "缺少姓名"
+            elif record.get("gender", "") not in VALID_GENDERS:
+                error = f"性别取值无效: {record.get('gender')}"
+            if error:
+                report_rows.append({"row": line_no, "photo": photo, "status": "error", "error": error})
+                continue
+            seen.add(photo)
+            record["row"] = line_no
+            rows.append(record)
+        return rows
+
+    def _completed_rows(self, job_id: str) -> set:
+        conn = self.personnel._get_connection()
+        if not conn:
+            raise RuntimeError("数据库连接失败")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT row_key FROM personnel_import_rows WHERE job_id = ?", (job_id,))
+            return {r["row_key"] for r in cursor.fetchall()}
+        finally:
+            conn.close()
+
+    def _resolve_categories(self, rows: List[Dict[str, Any]], report_rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """将清单中的类别名称映射为 category_id，不存在的类别自动创建"""
+        names = {row["category"] for row in rows if row.get("category")}
+        conn = self.personnel._get_connection()
+        if not conn:
+            raise RuntimeError("数据库连接失败")
+        try:
+            cursor = conn.cursor()
+            for name in names:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO personnel_categories (name, sort_order) VALUES (?, 0)", (name,)
+                )
+            conn.commit()
+            cursor.execute("SELECT id, name FROM personnel_categories")
+            category_rows = cursor.fetchall()
+        finally:
+            conn.close()
+        self.personnel.refresh_categories()
+        by_name = {r["name"]: r["id"] for r in category_rows}
+        valid_ids = set(by_name.values())
+
+        for row in rows:
+            raw_id = row.get("category_id")
+            if raw_id:
+                try:
+                    row["category_id"] = int(raw_id)
+                except ValueError:
+                    row["category_id"] = None
+                if row["category_id"] not in valid_ids:
+                    row["error"] = f"人员类别 id={raw_id} 不存在"
+                    report_rows.append({"row": row["row"], "photo": row["photo"], "status": "error", "error": row["error"]})
+        return by_name
+
+    def _import_batch(
+        self,
+        pool: ProcessPoolExecutor,
+        job_id: str,
+        batch: List[Dict[str, Any]],
+        category_ids: Dict[str, int],
+    ) -> List[Dict[str, Any]]:
+        """处理一批：并行解码与检测 -> 照片暂存 -> 一次前向 -> 一个事务写库 -> 照片移入人脸库 -> 一次性加入人脸库"""
+        results: List[Dict[str, Any]] = []
+        staging = self._staging_dir(job_id)
+        staging.mkdir(parents=True, exist_ok=True)
+        for row in batch:
+            row["face_id"] = str(uuid.uuid4())
+
+        def fail(row: Dict[str, Any], error: str):
+            results.append({"row": row["row"], "photo": row["photo"], "status": "error", "error": error})
+            self._remove_file(staging / f"{row['face_id']}.jpg")
+
+        # 1. 解码进程并行解码 + 检测，照片写入暂存目录
+        face_rows, face_inputs = [], []
+        for row, (data, face, error) in zip(batch, pool.map(_prepare_photo, [row["photo"] for row in batch], chunksize=8)):
+            if error:
+                fail(row, error)
+                continue
+            try:
+                write_photo(staging / f"{row['face_id']}.jpg", data)
+            except OSError as e:
+                fail(row, f"保存照片失败: {e}")
+                continue
+            face_rows.append(row)
+            face_inputs.append(torch.from_numpy(face))
+
+        # 2. 整批一次前向提取特征
+        embedded_rows, vecs = [], []
+        for row, vec in zip(face_rows, self.recognition.embed_faces(face_inputs)):
+            if vec is None:
+                fail(row, "无法提取人脸特征")
+                continue
+            embedded_rows.append(row)
+            vecs.append(vec)
+
+        # 3. 一个事务写入人员记录与导入日志，单行失败回滚到该行的保存点
+        inserted = self._insert_rows(job_id, embedded_rows, category_ids, results, fail)
+
+        # 4. 提交后照片移入人脸库目录，写库成功的人脸一次性加入人脸库，人员记录写入人员信息缓存
+        if inserted:
+            self.personnel.invalidate_counts()
+            index = {row["face_id"]: vec for row, vec in zip(embedded_rows, vecs)}
+            face_ids = self._publish_photos(staging, [row["face_id"] for row in inserted])
+            self.personnel.refresh_personnel([row["face_id"] for row in inserted])
+            if face_ids:
+                self.recognition.register_faces(
+                    face_ids,
+                    np.stack([index[face_id] for face_id in face_ids]),
+                    [settings.FACES_DIR / f"{face_id}.jpg" for face_id in face_ids],
+                )
+        return results
+
+    def _insert_rows(self, job_id, rows, category_ids, results, fail) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        conn = self.personnel._get_connection()
+        if not conn:
+            for row in rows:
+                fail(row, "数据库连接失败")
+            return []
+
+        inserted = []
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            for row in rows:
+                category_id = row.get("category_id") or category_ids.get(row.get("category", ""))
+                cursor.execute("SAVEPOINT import_row")
+                try:
+                    cursor.execute(
+                        """INSERT INTO personnel_info (face_id, name, id_number, phone, address, gender, category_id, photo_path, status)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'active')""",
+                        (
+                            row["face_id"],
+                            row["name"],
+                            row.get("id_number") or None,
+                            row.get("phone") or None,
+                            row.get("address") or None,
+                            row.get("gender") or None,
+                            category_id,
+                            f"{row['face_id']}.jpg",
+                        ),
+                    )
+                    personnel_id = cursor.lastrowid
+                    cursor.execute(
+                        "INSERT INTO personnel_import_rows (job_id, row_key, personnel_id, face_id) VALUES (?, ?, ?, ?)",
+                        (job_id, row["photo"], personnel_id, row["face_id"]),
+                    )
+                    cursor.execute("RELEASE SAVEPOINT import_row")
+                except sqlite3.IntegrityError as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                    cursor.execute("RELEASE SAVEPOINT import_row")
+                    if "id_number" in str(e):
+                        fail(row, f"身份证号 {row.get('id_number')} 已被使用")
+                    else:
+                        fail(row, f"写入数据库失败: {e}")
+                    continue
+                inserted.append(row)
+                results.append({
+                    "row": row["row"],
+                    "photo": row["photo"],
+                    "status": "created",
+                    "personnel_id": personnel_id,
+                    "face_id": row["face_id"],
+                })
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"批量写入人员记录失败: {e}", exc_info=True)
+            results[:] = [r for r in results if r["status"] != "created"]
+            for row in inserted:
+                fail(row, f"写入数据库失败: {e}")
+            return []
+        finally:
+            conn.close()
+        return inserted
+
+    # ---------- 照片暂存 ----------
+
+    @staticmethod
+    def _staging_dir(job_id: str) -> Path:
+        return settings.FACES_DIR / STAGING_DIR_NAME / job_id
+
+    @staticmethod
+    def _publish_photos(staging: Path, face_ids: List[str]) -> List[str]:
+        """已提交的照片从暂存目录移入人脸库目录，返回移动成功的 face_id"""
+        published = []
+        for face_id in face_ids:
+            try:
+                os.replace(staging / f"{face_id}.jpg", settings.FACES_DIR / f"{face_id}.jpg")
+            except OSError as e:
+                logger.error(f"照片移入人脸库失败（重新导入时重试）: {face_id}: {e}", exc_info=True)
+                continue
+            published.append(face_id)
+        return published
+
+    def _recover_staged_photos(self, job_id: str) -> None:
+        """
+        处理上次中断留下的暂存照片：人员记录已提交的移入人脸库目录并加入人脸库，未提交的删除
+        """
+        staging = self._staging_dir(job_id)
+        if not staging.is_dir():
+            return
+        staged = {path.stem: path for path in staging.iterdir() if path.suffix == ".jpg"}
+        committed = set(self.personnel.get_personnel_by_face_ids(list(staged))) if staged else set()
+        for path in staging.iterdir():
+            if path.suffix != ".jpg" or path.stem not in committed:
+                self._remove_file(path)
+        recovered = self._publish_photos(staging, sorted(committed))
+        if recovered:
+            self._register_photos(recovered)
+            logger.info(f"已恢复上次中断时已写库的 {len(recovered)} 张照片")
+
+    def _register_photos(self, face_ids: List[str]) -> None:
+        """从人脸库目录中的照片提取特征并加入人脸库"""
+        registered, faces = [], []
+        for face_id in face_ids:
+            image = cv2.imread(str(settings.FACES_DIR / f"{face_id}.jpg"), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+            largest = self.detection.get_largest_face(self.detection.detect_faces(image))
+            if largest and largest.get("face_tensor") is not None:
+                registered.append(face_id)
+                faces.append(largest["face_tensor"])
+        pairs = [(face_id, vec) for face_id, vec in zip(registered, self.recognition.embed_faces(faces)) if vec is not None]
+        if pairs:
+            self.recognition.register_faces(
+                [face_id for face_id, _ in pairs],
+                np.stack([vec for _, vec in pairs]),
+                [settings.FACES_DIR / f"{face_id}.jpg" for face_id, _ in pairs],
+            )
+
+    def _remove_staging_dir(self, job_id: str) -> None:
+        """导入完成后删除空的暂存目录"""
+        staging = self._staging_dir(job_id)
+        for directory in (staging, staging.parent):
+            try:
+                directory.rmdir()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _remove_file(path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,389 @@
+"""
+人脸库检索索引
+
+提供可插拔的人脸库索引后端，统一接口：
+    - add(face_ids, vecs)      增量添加（face_id 已存在时覆盖）
+    - remove(face_id)          增量删除
+    - search(queries, k)       返回每个查询的 top-k (face_id, 相似度)
+
+后端：
+    - ExactIndex：预先 L2 归一化的向量，一次矩阵乘法得到余弦相似度，精确检索
+    - IVFIndex：纯 NumPy 的倒排索引（球面 k-means 粗量化），通过 nprobe 在召回率与延迟之间权衡
+
+并发模型（单写多读，RCU/seqlock 风格）：
+    - 写操作之间由写锁串行化；检索不加锁
+    - 追加写先写入数据、最后发布行数，读者看到的总是已写完的前缀，无需重试
+    - 原地修改（覆盖、删除时的行移动、簇重新划分）前将版本号置为奇数，结束后恢复为偶数；
+      读者检索前后版本号不一致（或为奇数）时重试，多次失败后退化为持写锁读取
+    - generation 在每次写操作后递增，供缓存等按人脸库版本失效
+"""
+import logging
+import threading
+from abc import ABC, abstractmethod
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SearchResult = List[Tuple[str, float]]
+T = TypeVar("T")
+
+# 乐观读的最大尝试次数，超过后持写锁读取
+MAX_OPTIMISTIC_READS = 8
+
+
+def l2_normalize(vecs: np.ndarray) -> np.ndarray:
+    """按行 L2 归一化，返回 float32 数组"""
+    vecs = np.asarray(vecs, dtype=np.float32)
+    if vecs.ndim == 1:
+        vecs = vecs[None, :]
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vecs / norms
+
+
+def _topk(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """对每行做部分排序取 top-k，返回 (下标, 分数)，按分数降序"""
+    n = scores.shape[1]
+    k = min(k, n)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(n), scores.shape).copy()
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class GalleryIndex(ABC):
+    """人脸库索引接口"""
+
+    def __init__(self):
+        self._write_lock = threading.RLock()
+        # 偶数：稳定；奇数：正在原地修改
+        self._version = 0
+        self.generation = 0
+
+    @contextmanager
+    def _writing(self):
+        """写操作上下文：串行化写者，结束时发布新版本"""
+        with self._write_lock:
+            try:
+                yield
+            finally:
+                if self._version & 1:
+                    self._version += 1
+                self._publish()
+
+    def _publish(self) -> None:
+        """一次写操作完成后更新人脸库版本号"""
+        self.generation += 1
+
+    def _invalidate_readers(self) -> None:
+        """原地修改已发布数据前调用，使并发读者的本次检索失效并重试"""
+        if not self._version & 1:
+            self._version += 1
+
+    def _read(self, fn: Callable[..., T], *args) -> T:
+        """乐观读：检索期间版本号未变化则结果有效，否则重试"""
+        for _ in range(MAX_OPTIMISTIC_READS):
+            version = self._version
+            if not version & 1:
+                try:
+                    result = fn(*args)
+                except Exception:
+                    # 与写者交错读到了不一致的中间状态，重试
+                    result = None
+                else:
+                    if self._version == version:
+                        return result
+            time.sleep(0)
+        with self._write_lock:
+            return fn(*args)
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def __contains__(self, face_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def add(self, face_ids: List[str], vecs: np.ndarray) -> None:
+        """添加特征向量，face_id 已存在时覆盖（同一批内重复的 face_id 以最后一次为准）"""
+
+    @abstractmethod
+    def remove(self, face_id: str) -> bool:
+        """删除特征向量，不存在时返回 False"""
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, k: int = 1) -> List[SearchResult]:
+        """检索每个查询向量的 top-k (face_id, 余弦相似度)，按相似度降序"""
+
+
+class ExactIndex(GalleryIndex):
+    """
+    精确检索：预归一化向量 + 单次矩阵乘法
+
+    向量存放在按容量倍增的预分配缓冲区中，face_id -> 行号用字典维护：
+    添加为均摊 O(1)（缓冲区满时整体扩容一倍），删除将最后一行移到被删除行（swap-with-last），
+    均无需整库拷贝。
+    """
+
+    def __init__(self, dim: int = 512, capacity: int = 0):
+        super().__init__()
+        self.dim = dim
+        self._vecs = np.empty((capacity, dim), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, face_id: str) -> bool:
+        return face_id in self._rows
+
+    @property
+    def capacity(self) -> int:
+        return len(self._vecs)
+
+    def _reserve(self, size: int) -> None:
+        """确保缓冲区至少能容纳 size 行，不足时按倍增扩容"""
+        if size <= len(self._vecs):
+            return
+        capacity = max(size, len(self._vecs) * 2, 16)
+        vecs = np.empty((capacity, self.dim), dtype=np.float32)
+        vecs[: self._size] = self._vecs[: self._size]
+        self._vecs = vecs
+
+    def add(self, face_ids: List[str], vecs: np.ndarray) -> None:
+        vecs = l2_normalize(vecs)
+        with self._writing():
+            self._add_normalized(face_ids, vecs)
+
+    def _add_normalized(self, face_ids: List[str], vecs: np.ndarray) -> None:
+        # 同一批内重复的 face_id 以最后一次为准
+        latest = {face_id: i for i, face_id in enumerate(face_ids)}
+        new_ids, new_rows = [], []
+        for face_id, i in latest.items():
+            row = self._rows.get(face_id)
+            if row is not None:
+                self._invalidate_readers()
+                self._vecs[row] = vecs[i]
+            else:
+                new_ids.append(face_id)
+                new_rows.append(i)
+        if not new_ids:
+            return
+
+        # 追加：先写向量与 face_id，最后更新行数，读者只会看到已写完的行
+        start = self._size
+        self._reserve(start + len(new_ids))
+        if len(new_rows) == len(vecs):
+            self._vecs[start:start + len(new_ids)] = vecs
+        else:
+            self._vecs[start:start + len(new_ids)] = vecs[new_rows]
+        for offset, face_id in enumerate(new_ids):
+            self._rows[face_id] = start + offset
+        self._ids.extend(new_ids)
+        self._size += len(new_ids)
+
+    def remove(self, face_id: str) -> bool:
+        with self._writing():
+            return self._remove(face_id)
+
+    def _remove(self, face_id: str) -> bool:
+        row = self._rows.pop(face_id, None)
+        if row is None:
+            return False
+        self._invalidate_readers()
+        last = self._size - 1
+        self._size -= 1
+        if row != last:
+            # 将最后一行移动到被删除的位置
+            moved = self._ids[last]
+            self._vecs[row] = self._vecs[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self._ids.pop()
+        return True
+
+    def search(self, queries: np.ndarray, k: int = 1) -> List[SearchResult]:
+        return self._read(self._search_normalized, l2_normalize(queries), k)
+
+    def _search_normalized(self, queries: np.ndarray, k: int) -> List[SearchResult]:
+        # 先读行数再读缓冲区：扩容后的新缓冲区同样包含前 size 行
+        size = self._size
+        if not size:
+            return [[] for _ in range(len(queries))]
+        vecs, ids = self._vecs, self._ids
+        scores = queries @ vecs[:size].T
+        idx, top = _topk(scores, k)
+        return [
+            [(ids[i], float(s)) for i, s in zip(row_idx, row_scores)]
+            for row_idx, row_scores in zip(idx.tolist(), top.tolist())
+        ]
+
+
+class IVFIndex(GalleryIndex):
+    """
+    倒排索引（IVF）近似检索
+
+    用球面 k-means 将人脸库划分为 nlist 个簇，每个簇是一个 ExactIndex；
+    查询时只在与查询最相近的 nprobe 个簇中精确检索。nprobe 越大召回率越高、延迟越大。
+    数据量不足 train_threshold 时不训练，退化为单簇精确检索。
+    """
+
+    def __init__(
+        self,
+        dim: int = 512,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        train_threshold: Optional[int] = None,
+        kmeans_iters: int = 10,
+        seed: int = 0,
+    ):
+        super().__init__()
+        self.dim = dim
+        self.nlist = max(1, nlist)
+        self.nprobe = max(1, nprobe)
+        self.train_threshold = train_threshold if train_threshold is not None else self.nlist * 39
+        self.kmeans_iters = kmeans_iters
+        self._rng = np.random.default_rng(seed)
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[ExactIndex] = [ExactIndex(dim)]
+        self._assign: Dict[str, int] = {}
+        self._trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._assign)
+
+    def __contains__(self, face_id: str) -> bool:
+        return face_id in self._assign
+
+    def _nearest_list(self, vecs: np.ndarray) -> np.ndarray:
+        if self._centroids is None:
+            return np.zeros(len(vecs), dtype=np.int64)
+        return np.argmax(vecs @ self._centroids.T, axis=1)
+
+    def add(self, face_ids: List[str], vecs: np.ndarray) -> None:
+        vecs = l2_normalize(vecs)
+        # 同一批内重复的 face_id 以最后一次为准，否则较早的一行会留在另一个簇中无法删除
+        latest = {face_id: i for i, face_id in enumerate(face_ids)}
+        if len(latest) != len(face_ids):
+            face_ids = list(latest)
+            vecs = vecs[list(latest.values())]
+        with self._writing():
+            for face_id in face_ids:
+                self._remove(face_id)
+            assign = self._nearest_list(vecs)
+            for list_no in np.unique(assign):
+                rows = np.nonzero(assign == list_no)[0]
+                self._lists[list_no]._add_normalized([face_ids[i] for i in rows], vecs[rows])
+                for i in rows:
+                    self._assign[face_ids[i]] = int(list_no)
+
+            # 首次达到训练阈值，或规模较训练时增长 4 倍以上时，重新训练粗量化器
+            size = len(self._assign)
+            if size >= self.train_threshold and (not self.is_trained or size >= self._trained_size * 4):
+                self.train()
+
+    def remove(self, face_id: str) -> bool:
+        with self._writing():
+            return self._remove(face_id)
+
+    def _remove(self, face_id: str) -> bool:
+        list_no = self._assign.pop(face_id, None)
+        if list_no is None:
+            return False
+        self._invalidate_readers()
+        return self._lists[list_no]._remove(face_id)
+
+    def _all_vectors(self) -> Tuple[List[str], np.ndarray]:
+        face_ids: List[str] = []
+        parts = []
+        for lst in self._lists:
+            face_ids.extend(lst._ids)
+            parts.append(lst._vecs[: len(lst)])
+        return face_ids, np.concatenate(parts, axis=0) if parts else np.empty((0, self.dim), np.float32)
+
+    def _kmeans(self, data: np.ndarray, k: int) -> np.ndarray:
+        """球面 k-means，返回 L2 归一化的簇中心"""
+        centroids = data[self._rng.choice(len(data), size=k, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            counts = np.bincount(assign, minlength=k)
+            empty = counts == 0
+            if empty.any():
+                # 空簇用随机样本重新初始化
+                sums[empty] = data[self._rng.choice(len(data), size=int(empty.sum()), replace=False)]
+            centroids = l2_normalize(sums)
+        return centroids
+
+    def train(self) -> None:
+        """用当前人脸库训练粗量化器并重新分配所有向量"""
+        with self._writing():
+            face_ids, vecs = self._all_vectors()
+            if len(face_ids) < self.nlist:
+                return
+            # 新的簇中心与倒排表在旁路构建，构建期间读者继续使用旧结构
+            sample_size = min(len(vecs), self.nlist * 64)
+            sample = vecs[self._rng.choice(len(vecs), size=sample_size, replace=False)]
+            centroids = self._kmeans(sample, self.nlist)
+            lists = [ExactIndex(self.dim) for _ in range(self.nlist)]
+            assign_map: Dict[str, int] = {}
+            assign = np.argmax(vecs @ centroids.T, axis=1)
+            for list_no in np.unique(assign):
+                rows = np.nonzero(assign == list_no)[0]
+                lists[list_no]._add_normalized([face_ids[i] for i in rows], vecs[rows])
+                for i in rows:
+                    assign_map[face_ids[i]] = int(list_no)
+
+            self._invalidate_readers()
+            self._centroids = centroids
+            self._lists = lists
+            self._assign = assign_map
+            self._trained_size = len(face_ids)
+        logger.info(f"IVF 索引训练完成: {len(face_ids)} 个向量, {self.nlist} 个簇")
+
+    def search(self, queries: np.ndarray, k: int = 1, nprobe: Optional[int] = None) -> List[SearchResult]:
+        return self._read(self._search_normalized, l2_normalize(queries), k, nprobe)
+
+    def _search_normalized(self, queries: np.ndarray, k: int, nprobe: Optional[int]) -> List[SearchResult]:
+        centroids, lists = self._centroids, self._lists
+        if centroids is None:
+            return lists[0]._search_normalized(queries, k)
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probe, _ = _topk(queries @ centroids.T, nprobe)
+        candidates: List[SearchResult] = [[] for _ in range(len(queries))]
+        # 按簇分组，同一簇内的多个查询合并为一次矩阵乘法
+        for list_no in np.unique(probe):
+            lst = lists[list_no]
+            if not len(lst):
+                continue
+            qidx = np.nonzero((probe == list_no).any(axis=1))[0]
+            for qi, hits in zip(qidx, lst._search_normalized(queries[qidx], k)):
+                candidates[qi].extend(hits)
+        return [sorted(hits, key=lambda h: h[1], reverse=True)[:k] for hits in candidates]
+
+
+def create_gallery_index(backend: str, dim: int = 512, **kwargs) -> GalleryIndex:
+    """根据配置创建索引后端（exact / ivf）"""
+    backend = (backend or "exact").lower()
+    if backend == "exact":
+        return ExactIndex(dim)
+    if backend == "ivf":
+        return IVFIndex(dim, **kwargs)
+    raise ValueError(f"不支持的人脸库索引类型: {backend}")
@@ -1,12 +1,183 @@
+import base64
+import json
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List, NamedTuple, Tuple
 from app.core.config import settings
+from app.services.database import ConnectionPool
+from app.services.personnel_cache import PersonnelCache
+
+# 人员信息缓存与查询使用的列
+PERSONNEL_COLUMNS = (
+    "face_id, name, id_number, phone, address, gender, category_id, status, photo_path, created_at, updated_at"
+)
+
+# 按 face_id 集合查询的 SQL，{face_ids} 为集合占位（参数列表或临时表子查询）
+PERSONNEL_RECORDS_SQL = f"SELECT {PERSONNEL_COLUMNS} FROM personnel_info WHERE face_id IN ({{face_ids}})"
+PERSONNEL_INFO_SQL = """
+    SELECT p.face_id, p.name, p.id_number, p.phone, p.address, p.gender, p.status,
+           p.photo_path, p.created_at, p.updated_at,
+           c.name AS category_name
+    FROM personnel_info p
+    LEFT JOIN personnel_categories c ON p.category_id = c.id
+    WHERE p.face_id IN ({face_ids})
+"""
+# 全文检索：trigram 分词（按 3 字符切分，支持中文姓名与号码的任意子串匹配），
+# 外部内容表（content=personnel_info）只保存索引，由触发器与人员表保持同步
+SEARCH_COLUMNS = ("name", "id_number", "phone")
+SEARCH_MIN_CHARS = 3
+# 匹配行数不超过该值时按 bm25 相关度排序；更多时计算全部匹配行的相关度代价过高，按录入时间倒序
+SEARCH_RANK_MAX_ROWS = 1000
+# 人员列表总数缓存的条目上限（不同检索条件各占一条）
+COUNT_CACHE_MAX_ENTRIES = 256
+PERSONNEL_FTS_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS personnel_fts USING fts5(
+        name, id_number, phone, content='personnel_info', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS personnel_fts_ai AFTER INSERT ON personnel_info BEGIN
+        INSERT INTO personnel_fts (rowid, name, id_number, phone) VALUES (new.id, new.name, new.id_number, new.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS personnel_fts_ad AFTER DELETE ON personnel_info BEGIN
+        INSERT INTO personnel_fts (personnel_fts, rowid, name, id_number, phone)
+        VALUES ('delete', old.id, old.name, old.id_number, old.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS personnel_fts_au AFTER UPDATE OF name, id_number, phone ON personnel_info BEGIN
+        INSERT INTO personnel_fts (personnel_fts, rowid, name, id_number, phone)
+        VALUES ('delete', old.id, old.name, old.id_number, old.phone);
+        INSERT INTO personnel_fts (rowid, name, id_number, phone) VALUES (new.id, new.name, new.id_number, new.phone);
+    END""",
+)
+
+
+class PersonnelSearch(NamedTuple):
+    """
+    人员检索条件
+
+    match 为 FTS5 MATCH 表达式（None 表示不使用全文索引），where/params 为人员表上的其他条件
+    """
+    match: Optional[str]
+    where: List[str]
+    params: List[Any]
+
+
+def _fts_phrase(term: str, column: Optional[str] = None) -> str:
+    """关键词转为 FTS5 短语（trigram 分词下即子串匹配），可限定列"""
+    phrase = '"' + term.replace('"', '""') + '"'
+    return f"{column} : {phrase}" if column else phrase
+
+
+class ListCursor(NamedTuple):
+    """人员列表游标：上一页/下一页边界行的 (created_at, id) 与翻页方向（next 向更早录入，prev 向更新录入）"""
+    created_at: str
+    id: int
+    direction: str = "next"
+
+
+def encode_list_cursor(created_at: str, personnel_id: int, direction: str = "next") -> str:
+    """编码为不透明的游标字符串（URL 安全 base64）"""
+    payload = json.dumps([created_at, personnel_id, direction], separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_list_cursor(token: str) -> ListCursor:
+    """解析游标字符串，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, personnel_id, direction = json.loads(raw.decode("utf-8"))
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {token}") from e
+    if (
+        not isinstance(created_at, str)
+        or not isinstance(personnel_id, int)
+        or isinstance(personnel_id, bool)
+        or direction not in ("next", "prev")
+    ):
+        raise ValueError(f"无效的分页游标: {token}")
+    return ListCursor(created_at, personnel_id, direction)
+
+
+# IN (?, ...) 参数列表的 face_id 数量上限（SQLite 旧版本最多 999 个参数），超过时改用临时表
+FACE_ID_IN_QUERY_MAX = 500
+
+
+def _select_by_face_ids(cursor, sql: str, face_ids: List[str]) -> list:
+    """
+    按 face_id 集合一次查询
+
+    face_id 不超过 FACE_ID_IN_QUERY_MAX 个时使用 IN (?, ...)；否则写入连接上的临时表，
+    以 IN (SELECT face_id FROM 临时表) 联表查询。临时表中的数据随事务回滚丢弃，只用于只读查询。
+    """
+    if len(face_ids) <= FACE_ID_IN_QUERY_MAX:
+        cursor.execute(sql.format(face_ids=",".join("?" * len(face_ids))), face_ids)
+        return cursor.fetchall()
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_face_ids (face_id TEXT PRIMARY KEY)")
+    try:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO lookup_face_ids (face_id) VALUES (?)", ((face_id,) for face_id in face_ids)
+        )
+        cursor.execute(sql.format(face_ids="SELECT face_id FROM lookup_face_ids"))
+        return cursor.fetchall()
+    finally:
+        cursor.connection.rollback()
+
+
+def _row_to_info(row) -> Dict[str, Any]:
+    """联表查询的数据库行 -> 人员信息（category 为类别名称）"""
+    return {
+        "name": row["name"] if row["name"] else "",
+        "id_number": row["id_number"],
+        "phone": row["phone"],
+        "address": row["address"],
+        "gender": row["gender"],
+        "category": row["category_name"] if row["category_name"] else None,
+        "status": row["status"],
+        "photo_path": row["photo_path"],
+        "created_at": row["created_at"] if row["created_at"] else None,
+        "updated_at": row["updated_at"] if row["updated_at"] else None,
+    }
+
+
+def _row_to_record(row) -> Dict[str, Any]:
+    """数据库行 -> 缓存记录（保留 category_id，类别名称读取时解析）"""
+    return {
+        "name": row["name"] if row["name"] else "",
+        "id_number": row["id_number"],
+        "phone": row["phone"],
+        "address": row["address"],
+        "gender": row["gender"],
+        "category_id": row["category_id"],
+        "status": row["status"],
+        "photo_path": row["photo_path"],
+        "created_at": row["created_at"] if row["created_at"] else None,
+        "updated_at": row["updated_at"] if row["updated_at"] else None,
+    }
 
 
 class PersonnelService:
     def __init__(self):
         self.db_path = settings.db_path
+        # 所有数据库访问（接口、批量导入）都从连接池借用连接，close() 即归还
+        self.pool = ConnectionPool(
+            self.db_path,
+            size=settings.DB_POOL_SIZE,
+            pragmas={
+                "synchronous": settings.DB_SYNCHRONOUS,
+                "cache_size": -settings.DB_CACHE_SIZE_MB * 1024,
+                "mmap_size": settings.DB_MMAP_SIZE_MB * 1024**2,
+                "temp_store": "MEMORY",
+            },
+            timeout=settings.DB_BUSY_TIMEOUT,
+        )
+        # 人员信息缓存：启动时加载（warm_cache），写接口写库成功后同步更新
+        self.cache: Optional[PersonnelCache] = PersonnelCache() if settings.PERSONNEL_CACHE_ENABLED else None
+        self._reload_lock = threading.Lock()
+        # SQLite 不支持 FTS5 或 trigram 分词（3.34 以下）时为 False，检索退回 LIKE
+        self.search_enabled = False
+        # 人员列表总数缓存：(SQL, 参数) -> (总数, 计算时间)，人员写入后清空
+        self._count_cache: Dict[Tuple[str, Tuple[Any, ...]], Tuple[int, float]] = {}
+        self._count_lock = threading.Lock()
 
     def initialize_database(self):
         """初始化数据库，如果不存在或表结构不完整则创建"""
@@ -15,7 +186,7 @@ class PersonnelService:
         
         try:
             Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-            conn = sqlite3.connect(self.db_path)
+            conn = self.pool.connection()
             cursor = conn.cursor()
             
             # 人员类别表（先创建，供 personnel_info 外键参考）
@@ -81,6 +252,24 @@ class PersonnelService:
             
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_face_id ON personnel_info(face_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_name ON personnel_info(name)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_phone ON personnel_info(phone)")
+            # 人员列表按录入时间倒序分页（游标分页的 (created_at, id) 范围条件沿该索引读取）
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_created_at_id ON personnel_info(created_at DESC, id DESC)"
+            )
+            self.search_enabled = self._create_search_index(cursor)
+            
+            # 批量导入日志：记录每个导入任务已完成的行，用于断点续传
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS personnel_import_rows (
+                    job_id TEXT NOT NULL,
+                    row_key TEXT NOT NULL,
+                    personnel_id INTEGER,
+                    face_id TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (job_id, row_key)
+                )
+            """)
             
             conn.commit()
             logger.debug(f"数据库初始化完成: {self.db_path}")
@@ -103,63 +292,233 @@ class PersonnelService:
             logger.error(f"数据库初始化失败: {e}", exc_info=True)
             return False
 
+    @staticmethod
+    def _create_search_index(cursor) -> bool:
+        """创建人员全文检索索引与同步触发器，索引新建时从人员表重建"""
+        import logging
+        logger = logging.getLogger(__name__)
+
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'personnel_fts'")
+        exists = cursor.fetchone() is not None
+        try:
+            for ddl in PERSONNEL_FTS_DDL:
+                cursor.execute(ddl)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite 不支持 FTS5 trigram 全文检索（{sqlite3.sqlite_version}），人员检索使用 LIKE: {e}")
+            return False
+        if not exists:
+            cursor.execute("INSERT INTO personnel_fts (personnel_fts) VALUES ('rebuild')")
+            logger.info("已重建人员全文检索索引")
+        return True
+
+    def build_search(self, q: Optional[str] = None, name: Optional[str] = None) -> PersonnelSearch:
+        """
+        构建人员检索条件
+
+        Args:
+            q: 在姓名、身份证号、电话中检索
+            name: 只在姓名中检索
+
+        不少于 3 个字符的关键词使用全文索引做子串匹配；更短的关键词 trigram 无法匹配，
+        与不支持全文检索时一样使用 LIKE 子串匹配（逐行扫描，匹配范围与全文索引相同）。
+        """
+        phrases: List[str] = []
+        where: List[str] = []
+        params: List[Any] = []
+        for term, columns in ((q, SEARCH_COLUMNS), (name, ("name",))):
+            term = (term or "").strip()
+            if not term:
+                continue
+            if self.search_enabled and len(term) >= SEARCH_MIN_CHARS:
+                phrases.append(_fts_phrase(term, None if len(columns) > 1 else columns[0]))
+            else:
+                where.append("(" + " OR ".join(f"p.{c} LIKE ?" for c in columns) + ")")
+                params += [f"%{term}%"] * len(columns)
+        return PersonnelSearch(" AND ".join(phrases) or None, where, params)
+
+    def count_personnel(self, cursor, count_sql: str, params: List[Any]) -> int:
+        """
+        人员列表总数，按 PERSONNEL_COUNT_CACHE_TTL 缓存
+
+        百万级人员表上 COUNT(*) 需要扫描整个索引，游标分页逐页滚动时不必每页重新计数；
+        本进程的人员写入会清空缓存，其他 worker 进程的修改在缓存过期后反映。
+        """
+        ttl = settings.PERSONNEL_COUNT_CACHE_TTL
+        key = (count_sql, tuple(params))
+        now = time.monotonic()
+        if ttl > 0:
+            cached = self._count_cache.get(key)
+            if cached is not None and now - cached[1] < ttl:
+                return cached[0]
+        cursor.execute(count_sql, params)
+        total = cursor.fetchone()[0]
+        if ttl > 0:
+            with self._count_lock:
+                if len(self._count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+                    self._count_cache.clear()
+                self._count_cache[key] = (total, now)
+        return total
+
+    def invalidate_counts(self) -> None:
+        """人员新增、修改、删除与批量导入写库成功后清空列表总数缓存（只由写路径调用）"""
+        with self._count_lock:
+            self._count_cache.clear()
+
+    def close(self):
+        """服务关闭时关闭连接池中的连接"""
+        self.pool.close()
+
     def _get_connection(self):
+        """从连接池借用连接（sqlite3.Row 行），用完调用 close() 归还"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+            return self.pool.connection()
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"数据库连接失败: {e}", exc_info=True)
             return None
 
+    # ---------- 人员信息缓存 ----------
+
+    def warm_cache(self) -> None:
+        """从数据库加载全部人员记录与类别到缓存"""
+        if self.cache is None:
+            return
+        import logging
+        logger = logging.getLogger(__name__)
+
+        conn = self._get_connection()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {PERSONNEL_COLUMNS} FROM personnel_info")
+            records = [(row["face_id"], _row_to_record(row)) for row in cursor.fetchall()]
+            cursor.execute("SELECT id, name FROM personnel_categories")
+            categories = {row["id"]: row["name"] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"加载人员信息缓存失败: {e}", exc_info=True)
+            return
+        finally:
+            conn.close()
+        self.cache.load(records, categories)
+        logger.info(f"人员信息缓存已加载: {len(records)} 人, {len(categories)} 个类别")
+
+    def refresh_personnel(self, face_ids: Iterable[str]) -> None:
+        """人员记录写库成功后，从数据库重新读取这些 face_id 的记录更新缓存（已删除的记录移出缓存）"""
+        if self.cache is None:
+            return
+        face_ids = list(dict.fromkeys(face_ids))
+        if not face_ids:
+            return
+        conn = self._get_connection()
+        if not conn:
+            for face_id in face_ids:
+                self.cache.discard(face_id)
+            return
+        try:
+            rows = _select_by_face_ids(conn.cursor(), PERSONNEL_RECORDS_SQL, face_ids)
+            found = {row["face_id"]: _row_to_record(row) for row in rows}
+        finally:
+            conn.close()
+        for face_id in face_ids:
+            if face_id in found:
+                self.cache.put(face_id, found[face_id])
+            else:
+                self.cache.discard(face_id)
+
+    def _fill_cache(self, face_ids: List[str]) -> None:
+        """读路径：一次查询缓存中没有的 face_id 并回填缓存（查不到记录的记为不存在）"""
+        conn = self._get_connection()
+        if not conn:
+            return
+        try:
+            rows = _select_by_face_ids(conn.cursor(), PERSONNEL_RECORDS_SQL, face_ids)
+            found = {row["face_id"]: _row_to_record(row) for row in rows}
+        finally:
+            conn.close()
+        self.cache.fill(found, face_ids)
+
+    def evict_personnel(self, face_id: str) -> None:
+        """人员记录删除（或更换人脸）后移出缓存"""
+        if self.cache is not None:
+            self.cache.discard(face_id)
+
+    def refresh_categories(self) -> None:
+        """类别新增或改名后重新加载类别表"""
+        if self.cache is None:
+            return
+        conn = self._get_connection()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name FROM personnel_categories")
+            categories = {row["id"]: row["name"] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+        self.cache.set_categories(categories)
+
+    def _maybe_reload_cache(self) -> None:
+        """按 PERSONNEL_CACHE_RELOAD_INTERVAL 定期整体重新加载（多 worker 时同步其他进程的修改）"""
+        interval = settings.PERSONNEL_CACHE_RELOAD_INTERVAL
+        if interval <= 0 or time.monotonic() - self.cache.loaded_at < interval:
+            return
+        # 只由一个线程重新加载，其余线程继续使用旧数据
+        if self._reload_lock.acquire(blocking=False):
+            try:
+                self.warm_cache()
+            finally:
+                self._reload_lock.release()
+
     def get_personnel_by_face_id(self, face_id: str) -> Optional[Dict[str, Any]]:
         """根据face_id获取人员信息"""
+        return self.get_personnel_by_face_ids([face_id]).get(face_id)
+
+    def get_personnel_by_face_ids(self, face_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取人员信息，返回 face_id -> 人员信息（没有人员记录的 face_id 不在结果中）
+
+        缓存已加载时直接读缓存，缓存中没有的 face_id 一次查询数据库并回填缓存，查不到记录的 face_id
+        也记入缓存（负缓存），之后不再查询数据库；其他 worker 进程的修改随定期重新加载同步。
+        未启用缓存时所有 face_id 一次查询。
+        """
+        face_ids = list(dict.fromkeys(face_ids))
+        if not face_ids:
+            return {}
+        if self.cache is None or not self.cache.loaded:
+            return self._query_personnel(face_ids)
+
+        self._maybe_reload_cache()
+        resolved, missing = {}, []
+        for face_id in face_ids:
+            info = self.cache.get(face_id)
+            if info is not None:
+                resolved[face_id] = info
+            elif face_id not in self.cache:
+                missing.append(face_id)
+        if missing:
+            self._fill_cache(missing)
+            for face_id in missing:
+                info = self.cache.get(face_id, count=False)
+                if info is not None:
+                    resolved[face_id] = info
+        return resolved
+
+    def _query_personnel(self, face_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """从数据库一次查询多个 face_id 的人员信息"""
         conn = None
-        cursor = None
         try:
             conn = self._get_connection()
             if not conn:
-                return None
-
-            cursor = conn.cursor()
-            query = """
-                SELECT p.name, p.id_number, p.phone, p.address, p.gender, p.status,
-                       p.photo_path, p.created_at, p.updated_at,
-                       c.name AS category_name
-                FROM personnel_info p
-                LEFT JOIN personnel_categories c ON p.category_id = c.id
-                WHERE p.face_id = ?
-            """
-            cursor.execute(query, (face_id,))
-            result = cursor.fetchone()
-
-            if result:
-                return {
-                    "name": result["name"] if result["name"] else "",
-                    "id_number": result["id_number"],
-                    "phone": result["phone"],
-                    "address": result["address"],
-                    "gender": result["gender"],
-                    "category": result["category_name"] if result["category_name"] else None,
-                    "status": result["status"],
-                    "photo_path": result["photo_path"],
-                    "created_at": result["created_at"] if result["created_at"] else None,
-                    "updated_at": result["updated_at"] if result["updated_at"] else None,
-                }
-            return None
-
+                return {}
+            rows = _select_by_face_ids(conn.cursor(), PERSONNEL_INFO_SQL, face_ids)
+            return {row["face_id"]: _row_to_info(row) for row in rows}
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"查询人员信息失败: {e}", exc_info=True)
-            return None
+            return {}
         finally:
-            if cursor:
-                cursor.close()
             if conn:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+                conn.close()
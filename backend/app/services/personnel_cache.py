@@ -0,0 +1,108 @@
+"""
+人员信息内存缓存
+
+检测接口每个识别成功的人脸都要按 face_id 查询人员信息，而人员数据的变化频率远低于检测请求。
+缓存在服务启动时一次性加载全部人员记录（face_id -> 记录）与类别表（category_id -> 名称），
+人员与类别的增删改接口以及批量导入在写库成功后同步更新缓存（write-through），
+识别结果因此无需访问数据库即可得到人员信息。
+缓存中没有的 face_id 由读路径查询一次数据库回填，查不到记录的 face_id 记为不存在（负缓存），
+之后同一 face_id 不再访问数据库，直到写接口更新该 face_id 或按 PERSONNEL_CACHE_RELOAD_INTERVAL 整体重新加载
+（多 worker 时其他进程新录入的人员由此同步）。
+
+记录中只保存 category_id，类别名称在读取时按类别表解析，类别改名只需更新类别表。
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+
+class PersonnelCache:
+    """face_id -> 人员记录 的进程内缓存"""
+
+    def __init__(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        # 已确认没有人员记录的 face_id（负缓存）
+        self._missing: Set[str] = set()
+        self._categories: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.loaded_at = 0.0
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, face_id: str) -> bool:
+        """face_id 是否已缓存（包括已确认没有人员记录的 face_id）"""
+        return face_id in self._records or face_id in self._missing
+
+    def load(self, records: Iterable[Tuple[str, Dict[str, Any]]], categories: Dict[int, str]) -> None:
+        """整体替换缓存内容"""
+        records = dict(records)
+        with self._lock:
+            self._records = records
+            self._missing = set()
+            self._categories = dict(categories)
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+
+    def get(self, face_id: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        返回人员信息（category 为类别名称），不在缓存中或已确认没有人员记录时返回 None（用 in 区分二者）；
+        count=False 时不计入命中统计
+        """
+        record = self._records.get(face_id)
+        if count:
+            if record is None and face_id not in self._missing:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if record is None:
+            return None
+        info = dict(record)
+        category_id = info.pop("category_id", None)
+        info["category"] = self._categories.get(category_id) if category_id is not None else None
+        return info
+
+    def put(self, face_id: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records[face_id] = record
+            self._missing.discard(face_id)
+
+    def discard(self, face_id: str) -> None:
+        with self._lock:
+            self._records.pop(face_id, None)
+            self._missing.discard(face_id)
+
+    def fill(self, records: Dict[str, Dict[str, Any]], face_ids: Iterable[str]) -> None:
+        """
+        读路径回填：face_ids 中查到记录的写入缓存，其余记为不存在
+
+        只回填当前仍不在缓存中的 face_id：查询期间写接口已写入的记录较新，不被覆盖。
+        """
+        with self._lock:
+            for face_id in face_ids:
+                if face_id in self._records or face_id in self._missing:
+                    continue
+                if face_id in records:
+                    self._records[face_id] = records[face_id]
+                else:
+                    self._missing.add(face_id)
+
+    def set_categories(self, categories: Dict[int, str]) -> None:
+        with self._lock:
+            self._categories = dict(categories)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "loaded": self.loaded,
+            "records": len(self._records),
+            "missing": len(self._missing),
+            "categories": len(self._categories),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
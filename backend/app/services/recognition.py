@@ -1,24 +1,99 @@
+import copy
 import os
+import queue
+import sys
 import torch
+from contextlib import contextmanager
+from pathlib import Path
 import cv2
 import numpy as np
-from typing import Optional, Tuple
-from PIL import Image
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 from threading import Lock
 from facenet_pytorch import MTCNN, InceptionResnetV1
-from app.core.config import settings
+from app.core.config import RUN_ID_ENV, settings
+from app.services.cache import EmbeddingCache, face_hash
+from app.services.embedding_store import EmbeddingStore
+from app.services.gallery_index import GalleryIndex, create_gallery_index
+
+# 特征提取相关配置，任何一项变更都会使持久化的特征失效
+FACE_IMAGE_SIZE = 160
+FACE_MARGIN = 20
+EMBEDDING_MODEL = "InceptionResnetV1"
+EMBEDDING_PRETRAINED = "vggface2"
+EMBEDDING_DIM = 512
+# 对齐裁剪的缩放方式：人脸从 RGB ndarray 上以 OpenCV INTER_AREA 缩放到 FACE_IMAGE_SIZE
+FACE_ALIGN_RESIZE = "cv2_area"
+
+
+def embedding_fingerprint() -> dict:
+    """特征存储的版本指纹（模型名称 + 预处理参数）"""
+    return {
+        "model": EMBEDDING_MODEL,
+        "pretrained": EMBEDDING_PRETRAINED,
+        "image_size": FACE_IMAGE_SIZE,
+        "margin": FACE_MARGIN,
+        "align_resize": FACE_ALIGN_RESIZE,
+        "post_process": True,
+        "select_largest": True,
+    }
+
+
+class _ModelReplica(NamedTuple):
+    """一份可独立执行前向的模型（对齐用 MTCNN + 特征提取网络）"""
+    mtcnn: MTCNN
+    model: InceptionResnetV1
 
 
 class RecognitionService:
-    def __init__(self):
+    """
+    人脸识别服务
+    
+    并发模型：
+        - 推理：N 个模型副本组成的池，每次前向借用一个副本，最多 N 个前向并行
+        - 检索：人脸库索引支持无锁并发读（见 gallery_index），不占用模型副本
+        - 写入：录入/删除只串行化写者之间（_write_lock），不阻塞并发的检索
+        - 多进程：shared_gallery=True 时人脸库位于共享内存，各 worker 进程共用一份并通过版本号同步
+        - 特征缓存：传入 embedding_cache 时，对齐人脸的感知哈希命中缓存的跳过特征提取前向
+    """
+    
+    def __init__(self, shared_gallery: bool = False, embedding_cache: Optional[EmbeddingCache] = None):
         self.device = torch.device(settings.DEVICE)
         self.threshold = settings.FACE_RECOGNITION_THRESHOLD
         self.mtcnn = None
         self.model = None
-        self.db_names = []
-        self.db_vecs = None
+        self._shared = shared_gallery
+        self._index: GalleryIndex = self._create_index()
+        self._store: Optional[EmbeddingStore] = None
         self._initialized = False
-        self._lock = Lock()
+        self._replicas: "queue.Queue[_ModelReplica]" = queue.Queue()
+        self._write_lock = Lock()
+        self._embedding_cache = embedding_cache
+    
+    def _create_index(self) -> GalleryIndex:
+        if self._shared:
+            # 共享人脸库依赖 POSIX 共享内存与 fcntl 文件锁，只在多 worker 模式下导入
+            if sys.platform == "win32":
+                raise RuntimeError("多 worker 模式（API_WORKERS > 1）的共享人脸库不支持 Windows，请设置 API_WORKERS=1")
+            from app.services.shared_gallery import SharedGalleryIndex
+            return SharedGalleryIndex(settings.SHARED_GALLERY_DIR, dim=EMBEDDING_DIM)
+        return create_gallery_index(
+            settings.GALLERY_INDEX,
+            dim=EMBEDDING_DIM,
+            nlist=settings.GALLERY_IVF_NLIST,
+            nprobe=settings.GALLERY_IVF_NPROBE,
+        )
+    
+    @property
+    def gallery_size(self) -> int:
+        """人脸库中的人脸数量"""
+        return len(self._index)
+    
+    @property
+    def gallery_generation(self) -> int:
+        """人脸库版本号，每次录入/删除后递增（多进程模式下为各 worker 共享的版本号）"""
+        if self._shared:
+            self._index.refresh()
+        return self._index.generation
     
     def initialize(self):
         if self._initialized:
@@ -76,15 +151,19 @@ class RecognitionService:
                 logger.info("使用 CPU 设备")
             
             self.mtcnn = MTCNN(
-                image_size=160,
-                margin=20,
+                image_size=FACE_IMAGE_SIZE,
+                margin=FACE_MARGIN,
                 device=mtcnn_device,  # 使用 mtcnn_device（MUSA 时使用 CPU）
                 post_process=True
             ).eval()
             
-            self.model = InceptionResnetV1(pretrained='vggface2').eval().to(self.device)
+            self.model = InceptionResnetV1(pretrained=EMBEDDING_PRETRAINED).eval().to(self.device)
+            self._create_replicas(max(1, settings.RECOGNITION_MODEL_REPLICAS))
             self._load_face_database()
-            logger.info(f"识别模型已初始化 (MTCNN设备: {mtcnn_device}, 主设备: {device_str})")
+            logger.info(
+                f"识别模型已初始化 (MTCNN设备: {mtcnn_device}, 主设备: {device_str}, "
+                f"模型副本: {settings.RECOGNITION_MODEL_REPLICAS})"
+            )
             self._initialized = True
             
         except Exception as e:
@@ -93,119 +172,301 @@ class RecognitionService:
             logger.error(f"❌ 识别服务初始化失败: {e}", exc_info=True)
             raise
     
-    def _load_face_database(self):
+    def _create_replicas(self, count: int):
+        """
+        创建模型副本池
+        
+        CPU 上推理只读权重，各副本共享同一份模块即可并行；
+        GPU 等加速设备上每个副本独立拷贝一份权重，避免多个前向争用同一份模块。
+        """
+        for i in range(count):
+            if i == 0 or self.device.type == 'cpu':
+                replica = _ModelReplica(self.mtcnn, self.model)
+            else:
+                replica = _ModelReplica(copy.deepcopy(self.mtcnn), copy.deepcopy(self.model))
+            self._replicas.put(replica)
+    
+    @contextmanager
+    def _replica(self) -> Iterator[_ModelReplica]:
+        """借用一个模型副本，池中没有空闲副本时等待"""
+        replica = self._replicas.get()
+        try:
+            yield replica
+        finally:
+            self._replicas.put(replica)
+    
+    def _embed_photo(self, path) -> Optional[np.ndarray]:
+        """从人脸库照片中提取特征向量（MTCNN 选取最大人脸），无人脸时返回 None"""
+        img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+        face = self.mtcnn(img)
+        if face is None:
+            return None
+        with torch.no_grad():
+            vec = self.model(face.unsqueeze(0).to(self.device))
+        return vec[0].cpu().numpy()
+    
+    def _read_face_database(self) -> Tuple[List[str], List[str], Optional[np.ndarray]]:
+        """读取人脸库：优先使用特征存储，否则逐张照片提取特征，返回 (face_id 列表, 照片路径列表, 特征矩阵)"""
         import logging
         logger = logging.getLogger(__name__)
-        names, vecs = [], []
         
         db_dir_str = str(settings.FACES_DIR)
-        if not os.path.exists(db_dir_str):
-            logger.warning(f"人脸库目录不存在: {db_dir_str}")
-            return
+        if settings.EMBEDDING_STORE_ENABLED:
+            store = EmbeddingStore(settings.EMBEDDINGS_DIR, settings.FACES_DIR, embedding_fingerprint())
+            face_ids, paths, matrix = store.sync(self._embed_photo)
+            # 多进程模式下特征存储在关闭时统一从共享人脸库写回，这里不保留
+            if not self._shared:
+                self._store = store
+            return face_ids, paths, matrix
         
+        face_ids, paths, vecs = [], [], []
         for f in os.listdir(db_dir_str):
             if f.lower().endswith(('.jpg', '.png', '.jpeg')):
                 path = os.path.abspath(os.path.join(db_dir_str, f))
                 try:
-                    img = Image.open(path).convert('RGB')
-                    face = self.mtcnn(img)
-                    if face is None:
+                    vec = self._embed_photo(path)
+                    if vec is None:
                         continue
-                    
-                    with torch.no_grad():
-                        vec = self.model(face.unsqueeze(0).to(self.device))
-                        names.append(path)
-                        vecs.append(vec)
+                    face_ids.append(os.path.splitext(f)[0])
+                    paths.append(path)
+                    vecs.append(vec)
                 except Exception as e:
                     logger.debug(f'跳过 {f}: {e}')
+        return face_ids, paths, np.stack(vecs) if vecs else None
+    
+    def _load_face_database(self):
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        db_dir_str = str(settings.FACES_DIR)
+        if not os.path.exists(db_dir_str):
+            logger.warning(f"人脸库目录不存在: {db_dir_str}")
+            return
         
-        if vecs:
-            self.db_names = names
-            self.db_vecs = torch.cat(vecs, dim=0)
-            logger.info(f"已加载 {len(self.db_names)} 个人脸")
+        if self._shared:
+            # 同一次运行中第一个启动的 worker 构建共享人脸库，其余 worker 直接映射
+            rebuilt = self._index.attach(self._run_id(), self._read_face_database)
+            logger.info(f"共享人脸库已{'构建' if rebuilt else '映射'}: {self._index.directory}")
+        else:
+            face_ids, _, matrix = self._read_face_database()
+            if matrix is not None:
+                self._index.add(face_ids, matrix)
+        
+        if len(self._index):
+            logger.info(f"已加载 {len(self._index)} 个人脸 (索引: {type(self._index).__name__})")
         else:
             logger.warning("人脸库为空")
     
-    def recognize(self, face_img: np.ndarray) -> Optional[Tuple[str, float]]:
-        """识别人脸，返回(face_id, confidence)"""
-        if not self._initialized or len(self.db_names) == 0:
-            return None
+    @staticmethod
+    def _run_id() -> str:
+        """
+        本次服务运行的标识，决定共享人脸库由谁重建
+
+        run.py / main.py 启动时生成并写入环境变量，各 worker 继承同一个值，每次启动都不同；
+        直接用 uvicorn 命令行启动时没有该变量，使用 uvicorn 主进程（worker 的父进程）的标识。
+        """
+        run_id = os.environ.get(RUN_ID_ENV)
+        if run_id:
+            return run_id
+        from app.services.shared_gallery import process_token
+        return process_token(os.getppid())
+    
+    def shutdown(self):
+        """服务关闭时将人脸特征写回持久化存储"""
+        if self._shared:
+            if not self._index.attached:
+                return
+            if settings.EMBEDDING_STORE_ENABLED:
+                # 各 worker 依次以共享人脸库为准写回，结果相同，先完成的 worker 写入后其余无需再写
+                store = EmbeddingStore(settings.EMBEDDINGS_DIR, settings.FACES_DIR, embedding_fingerprint())
+                with self._index.locked():
+                    face_ids, files, matrix = self._index.snapshot()
+                    store.reconcile(face_ids, [settings.FACES_DIR / f for f in files], matrix)
+            self._index.close()
+        elif self._store is not None:
+            with self._write_lock:
+                self._store.flush()
+    
+    @staticmethod
+    def _align_face(face: Union[torch.Tensor, np.ndarray], mtcnn: MTCNN) -> Optional[torch.Tensor]:
+        """
+        获取对齐后的人脸张量 [3, 160, 160]
+        
+        检测服务已对齐的人脸张量直接使用；仅在传入 RGB 裁剪图时才重新运行 MTCNN。
+        """
+        if isinstance(face, torch.Tensor):
+            return face
+        return mtcnn(face)
+    
+    def _embed(self, face_tensors: List[torch.Tensor], model: InceptionResnetV1) -> torch.Tensor:
+        """将多张对齐人脸堆叠为一个 batch，一次前向得到特征向量 [N, 512]"""
+        with torch.no_grad():
+            batch = torch.stack(face_tensors).to(self.device)
+            return model(batch)
+    
+    def _embed_batch(self, faces: List[Union[torch.Tensor, np.ndarray]]) -> Tuple[List[int], Optional[np.ndarray]]:
+        """借用一个模型副本完成对齐与前向，返回 (成功提取的输入位置, 特征矩阵)"""
+        with self._replica() as replica:
+            aligned = [self._align_face(face, replica.mtcnn) for face in faces]
+            positions = [i for i, t in enumerate(aligned) if t is not None]
+            if not positions:
+                return [], None
+            vecs = self._embed_aligned([aligned[i] for i in positions], replica.model)
+            if self.device.type == 'cuda':
+                torch.cuda.empty_cache()
+        return positions, vecs
+    
+    def _embed_aligned(self, face_tensors: List[torch.Tensor], model: InceptionResnetV1) -> np.ndarray:
+        """对齐人脸提取特征 [N, 512]，命中特征缓存的人脸不参与前向"""
+        if self._embedding_cache is None:
+            return self._embed(face_tensors, model).cpu().numpy()
+        
+        keys = [face_hash(t) for t in face_tensors]
+        vecs = [self._embedding_cache.get(key) for key in keys]
+        missing = [i for i, vec in enumerate(vecs) if vec is None]
+        if missing:
+            computed = self._embed([face_tensors[i] for i in missing], model).cpu().numpy()
+            for i, vec in zip(missing, computed):
+                # 拷贝为独立数组，缓存条目不持有整个 batch 的特征矩阵
+                vecs[i] = vec.copy()
+                self._embedding_cache.put(keys[i], vecs[i])
+        return np.stack(vecs)
+    
+    def recognize(
+        self, face: Union[torch.Tensor, np.ndarray], top_k: Optional[int] = None
+    ) -> Union[Optional[Tuple[str, float]], List[Tuple[str, float]]]:
+        """
+        识别人脸
+        
+        Args:
+            face: 检测服务输出的对齐人脸张量（face_tensor），或 RGB 人脸裁剪图
+            top_k: 为 None 时返回超过阈值的最佳匹配 (face_id, confidence) 或 None；
+                   否则返回相似度最高的 top_k 个候选 [(face_id, similarity), ...]
+        """
+        return self.recognize_batch([face], top_k=top_k)[0]
+    
+    def recognize_batch(
+        self, faces: List[Union[torch.Tensor, np.ndarray]], top_k: Optional[int] = None
+    ) -> List[Union[Optional[Tuple[str, float]], List[Tuple[str, float]]]]:
+        """
+        批量识别人脸，返回值与 recognize 相同，与输入一一对应
+        """
+        candidates = self.match_batch(faces, k=top_k or 1)
+        if top_k is None:
+            return [self.best_match(c) for c in candidates]
+        return candidates
+    
+    def best_match(self, candidates: List[Tuple[str, float]]) -> Optional[Tuple[str, float]]:
+        """从候选列表中取超过识别阈值的最佳匹配"""
+        if candidates and candidates[0][1] >= self.threshold:
+            return candidates[0]
+        return None
+    
+    def match_batch(
+        self, faces: List[Union[torch.Tensor, np.ndarray]], k: int = 1
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        批量检索人脸的 top-k 候选：所有人脸一次前向，一次与人脸库的相似度矩阵乘法，
+        再做部分排序取 top-k（不按阈值过滤）
+        
+        Returns:
+            与输入一一对应的候选列表 [(face_id, similarity), ...]，按相似度降序；
+            无法提取特征的人脸为空列表
+        """
+        results: List[List[Tuple[str, float]]] = [[] for _ in faces]
+        if not faces or not self._initialized or len(self._index) == 0:
+            return results
         
         try:
-            face_rgb = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-            pil_face = Image.fromarray(face_rgb)
+            positions, vecs = self._embed_batch(faces)
+            if not positions:
+                return results
             
-            with self._lock:
-                face_tensor = self.mtcnn(pil_face)
-                if face_tensor is None:
-                    return None
-                
-                with torch.no_grad():
-                    face_tensor_batch = face_tensor.unsqueeze(0).to(self.device)
-                    vec = self.model(face_tensor_batch)
-                    sims = torch.cosine_similarity(vec, self.db_vecs, dim=1)
-                    best_idx = torch.argmax(sims).item()
-                    best_sim = sims[best_idx].item()
-                    
-                    if best_sim >= self.threshold:
-                        face_id = os.path.splitext(os.path.basename(self.db_names[best_idx]))[0]
-                        result = (face_id, float(best_sim))
-                        del face_tensor_batch, vec, sims
-                        if self.device.type == 'cuda':
-                            torch.cuda.empty_cache()
-                        return result
-                
-                if self.device.type == 'cuda':
-                    torch.cuda.empty_cache()
+            # 检索不占用模型副本；人脸库索引中的向量已预先归一化，一次矩阵乘法得到全部余弦相似度
+            for pos, hits in zip(positions, self._index.search(vecs, k=k)):
+                results[pos] = hits
             
-            return None
+            return results
             
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"人脸识别失败: {e}", exc_info=True)
-            return None
+            return [[] for _ in faces]
+    
+    def embed_faces(self, faces: List[Union[torch.Tensor, np.ndarray]]) -> List[Optional[np.ndarray]]:
+        """
+        批量提取人脸特征（一次前向），返回与输入一一对应的特征向量，无法提取的位置为 None
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(faces)
+        if not faces or not self._initialized:
+            return results
+        positions, vecs = self._embed_batch(faces)
+        for pos, vec in zip(positions, vecs if vecs is not None else []):
+            results[pos] = vec
+        return results
+    
+    def register_faces(self, face_ids: List[str], vecs: np.ndarray, photo_paths: List[Path]) -> None:
+        """将一批已提取的特征一次性加入人脸库（照片需已写入人脸库目录）"""
+        if not face_ids:
+            return
+        vecs = np.asarray(vecs, dtype=np.float32)
+        with self._write_lock:
+            if self._shared:
+                self._index.add(face_ids, vecs, files=[Path(p).name for p in photo_paths])
+            else:
+                self._index.add(face_ids, vecs)
+            if self._store is not None:
+                for face_id, vec, photo_path in zip(face_ids, vecs, photo_paths):
+                    self._store.put(face_id, photo_path, vec)
     
-    def add_face(self, face_img: np.ndarray) -> Optional[str]:
-        """添加人脸到数据库，返回face_id"""
+    def enroll(self, image: np.ndarray, face: Dict[str, Any]) -> Optional[str]:
+        """
+        录入人脸：一次前向提取特征，原子地保存原图，并将特征加入人脸库，返回 face_id
+        
+        Args:
+            image: 原始 RGB 图像（保存为人脸库照片）
+            face: 检测服务输出的人脸（优先使用其中已对齐的 face_tensor，否则对 face_img 重新对齐）
+        """
         if not self._initialized:
             return None
         
+        import logging
+        import uuid
+        logger = logging.getLogger(__name__)
+        
+        face_input = face.get("face_tensor")
+        if face_input is None:
+            face_input = face["face_img"]
+        vec = self.embed_faces([face_input])[0]
+        if vec is None:
+            logger.warning("无法提取人脸特征")
+            return None
+        
+        face_id = str(uuid.uuid4())
+        photo_path = settings.FACES_DIR / f"{face_id}.jpg"
+        tmp_path = photo_path.with_name(photo_path.name + ".tmp")
         try:
-            import logging
-            import uuid
-            logger = logging.getLogger(__name__)
-            
-            face_rgb = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-            pil_face = Image.fromarray(face_rgb)
-            face_tensor = self.mtcnn(pil_face)
-            if face_tensor is None:
-                logger.warning("无法提取人脸特征")
-                return None
-            
-            with torch.no_grad():
-                face_tensor_batch = face_tensor.unsqueeze(0).to(self.device)
-                vec = self.model(face_tensor_batch)
-            
-            face_id = str(uuid.uuid4())
-            photo_path = settings.FACES_DIR / f"{face_id}.jpg"
-            pil_face.save(photo_path, "JPEG")
-            
-            if self.db_vecs is None:
-                self.db_names = []
-                self.db_vecs = vec
-            else:
-                self.db_names.append(str(photo_path))
-                self.db_vecs = torch.cat([self.db_vecs, vec], dim=0)
-            
-            logger.info(f"成功添加人脸: {face_id}")
-            return face_id
-            
+            # 先写临时文件再替换，人脸库目录中不会出现写了一半的照片
+            ok, encoded = cv2.imencode(".jpg", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+            if not ok:
+                raise ValueError("照片编码失败")
+            tmp_path.write_bytes(encoded.tobytes())
+            os.replace(tmp_path, photo_path)
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"添加人脸失败: {e}", exc_info=True)
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            logger.error(f"保存人脸照片失败: {e}", exc_info=True)
             return None
+        
+        self.register_faces([face_id], vec[None, :], [photo_path])
+        logger.info(f"成功录入人脸: {face_id}")
+        return face_id
     
     def remove_face(self, face_id: str) -> bool:
         """从数据库移除人脸"""
@@ -216,21 +477,12 @@ class RecognitionService:
             import logging
             logger = logging.getLogger(__name__)
             
-            photo_path = str(settings.FACES_DIR / f"{face_id}.jpg")
-            try:
-                idx = self.db_names.index(photo_path)
-            except ValueError:
-                logger.warning(f"未找到face_id={face_id}的人脸")
-                return False
-            
-            if len(self.db_names) == 1:
-                self.db_names = []
-                self.db_vecs = None
-            else:
-                indices = list(range(len(self.db_names)))
-                indices.remove(idx)
-                self.db_vecs = self.db_vecs[indices]
-                self.db_names.pop(idx)
+            with self._write_lock:
+                if not self._index.remove(face_id):
+                    logger.warning(f"未找到face_id={face_id}的人脸")
+                    return False
+                if self._store is not None:
+                    self._store.discard(face_id)
             
             logger.info(f"成功移除人脸: {face_id}")
             return True
@@ -240,46 +492,3 @@ class RecognitionService:
             logger = logging.getLogger(__name__)
             logger.error(f"移除人脸失败: {e}", exc_info=True)
             return False
-    
-    def reload_face(self, face_id: str, photo_path: str) -> bool:
-        """重新加载指定的人脸到数据库"""
-        if not self._initialized:
-            return False
-        
-        try:
-            import logging
-            from pathlib import Path
-            logger = logging.getLogger(__name__)
-            
-            photo_path_obj = Path(photo_path) if isinstance(photo_path, str) else photo_path
-            self.remove_face(face_id)
-            
-            if not photo_path_obj.exists():
-                logger.warning(f"图片文件不存在: {photo_path_obj}")
-                return False
-            
-            img = Image.open(photo_path_obj).convert('RGB')
-            face = self.mtcnn(img)
-            if face is None:
-                logger.warning(f"无法从图片中提取人脸: {photo_path_obj}")
-                return False
-            
-            with torch.no_grad():
-                vec = self.model(face.unsqueeze(0).to(self.device))
-            
-            if self.db_vecs is None:
-                self.db_names = []
-                self.db_vecs = vec
-            else:
-                self.db_names.append(str(photo_path_obj))
-                self.db_vecs = torch.cat([self.db_vecs, vec], dim=0)
-            
-            logger.info(f"成功重新加载人脸: {face_id}")
-            return True
-            
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"重新加载人脸失败: {e}", exc_info=True)
-            return False
-
@@ -0,0 +1,314 @@
+"""
+多进程共享的人脸库索引
+
+多 worker 部署时，人脸库特征矩阵只在共享内存（默认 /dev/shm）中保存一份，各 worker 以内存映射方式读取：
+    - vectors.f32   预先 L2 归一化的特征矩阵，按容量倍增，行只追加不移动
+    - journal.log   追加式操作日志（A 追加 / R 删除），各 worker 据此维护 face_id -> 行号与删除标记
+    - generation    8 字节的人脸库版本号，每次写操作后递增
+    - gallery.lock  fcntl 文件锁，串行化跨进程的写操作
+    - owner         创建这组文件的服务运行标识（每次启动生成，同一次运行的 worker 相同）
+
+worker 在检索前比较共享版本号，变化时增量回放日志，任一 worker 的录入/删除因此对所有 worker 可见。
+删除只打标记、不移动行，被删除的行在服务重启重建共享文件时回收。
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.gallery_index import GalleryIndex, SearchResult, _topk, l2_normalize
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+JOURNAL_FILE = "journal.log"
+GENERATION_FILE = "generation"
+LOCK_FILE = "gallery.lock"
+OWNER_FILE = "owner"
+
+MIN_CAPACITY = 1024
+
+# 构建共享人脸库的加载函数，返回 (face_id 列表, 照片路径列表, 特征矩阵)
+Loader = Callable[[], Tuple[List[str], List[str], Optional[np.ndarray]]]
+
+
+def process_token(pid: int) -> str:
+    """进程标识：pid + 进程启动时间（避免 pid 复用时误认）"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        # 进程名字段可能含空格，从最后一个 ')' 之后切分；启动时间为第 22 个字段
+        start_time = stat[stat.rindex(b")") + 2:].split()[19].decode()
+    except (OSError, ValueError, IndexError):
+        start_time = "0"
+    return f"{pid}:{start_time}"
+
+
+class SharedGalleryIndex(GalleryIndex):
+    """
+    基于内存映射文件的多进程共享人脸库（精确检索）
+
+    进程内的并发读写沿用 GalleryIndex 的版本号机制；跨进程的写操作由文件锁串行化，
+    写者先写特征行、再追加日志、最后递增共享版本号，其他进程只会回放到已写完的行。
+    """
+
+    def __init__(self, directory: Path, dim: int = 512):
+        super().__init__()
+        self.directory = Path(directory)
+        self.dim = dim
+        self._vectors_path = self.directory / VECTORS_FILE
+        self._journal_path = self.directory / JOURNAL_FILE
+        self._vecs = np.empty((0, dim), dtype=np.float32)
+        self._nrows = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._files: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._dead = 0
+        self._journal_offset = 0
+        self._seen_generation = -1
+        self._lock_fd: Optional[int] = None
+        self._generation_map: Optional[mmap.mmap] = None
+
+    # ---------- 共享文件 ----------
+
+    def attach(self, owner: str, loader: Loader) -> bool:
+        """
+        打开共享人脸库；文件不存在或属于上一次运行的服务时，由当前进程调用 loader 重建
+
+        Args:
+            owner: 本次服务运行的标识（同一次运行的 worker 相同，每次启动都不同）
+            loader: 构建人脸库的加载函数，只在重建时调用
+
+        Returns:
+            是否由当前进程重建
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = os.open(self.directory / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        self._open_generation()
+        with self._write_lock:
+            # 同一次运行的 worker 依次取得排他锁：第一个负责重建，其余等待重建完成后直接映射
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                owner_path = self.directory / OWNER_FILE
+                current = owner_path.read_text() if owner_path.exists() else None
+                rebuilt = current != owner
+                if rebuilt:
+                    face_ids, paths, matrix = loader()
+                    self._reset(face_ids, [Path(p).name for p in paths], matrix)
+                    owner_path.write_text(owner)
+                self._sync_locked()
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        return rebuilt
+
+    @property
+    def attached(self) -> bool:
+        return self._lock_fd is not None
+
+    def close(self) -> None:
+        """释放文件锁与映射"""
+        if self._generation_map is not None:
+            self._generation_map.close()
+            self._generation_map = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _open_generation(self) -> None:
+        fd = os.open(self.directory / GENERATION_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+            self._generation_map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    def _read_generation(self) -> int:
+        return struct.unpack_from("<Q", self._generation_map, 0)[0]
+
+    def _bump_generation(self) -> None:
+        struct.pack_into("<Q", self._generation_map, 0, self._read_generation() + 1)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """跨进程独占：持有进程内写锁与文件排他锁，并回放到最新状态"""
+        # 同一进程的多个线程共用一个文件描述符，必须先取得进程内的锁再加文件锁
+        with self._write_lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._sync_locked()
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def refresh(self) -> None:
+        """共享版本号变化时回放新增日志；其他线程或进程正在写入时跳过，下次检索再同步"""
+        if self._generation_map is None or self._read_generation() == self._seen_generation:
+            return
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            try:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            try:
+                self._sync_locked()
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        finally:
+            self._write_lock.release()
+
+    def _reset(self, face_ids: List[str], files: List[str], matrix: Optional[np.ndarray]) -> None:
+        """以给定内容重建共享文件（调用方持有文件排他锁）"""
+        count = len(face_ids) if matrix is not None else 0
+        capacity = max(MIN_CAPACITY, 1 << max(count - 1, 0).bit_length())
+        with open(self._vectors_path, "wb") as f:
+            f.truncate(capacity * self.dim * 4)
+        if count:
+            out = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+            out[:count] = l2_normalize(matrix)
+            out.flush()
+            del out
+        with open(self._journal_path, "w", encoding="utf-8") as f:
+            for row, (face_id, file) in enumerate(zip(face_ids[:count], files)):
+                f.write(f"A\t{row}\t{face_id}\t{file}\n")
+        self._bump_generation()
+        logger.info(f"共享人脸库已重建: {count} 个人脸 ({self.directory})")
+
+    def _map_vectors(self) -> None:
+        capacity = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        self._vecs = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _sync_locked(self) -> None:
+        """回放尚未处理的日志（调用方持有进程内写锁与文件锁）"""
+        generation = self._read_generation()
+        with open(self._journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            data = f.read()
+        consumed = data.rfind(b"\n") + 1
+        self._seen_generation = generation
+        if not consumed:
+            self.generation = generation
+            return
+
+        with self._writing():
+            for line in data[:consumed].decode("utf-8").splitlines():
+                op = line.split("\t")
+                if op[0] == "A":
+                    self._apply_add(int(op[1]), op[2], op[3])
+                elif op[0] == "R":
+                    self._apply_remove(op[1])
+            # 行数最后发布，读者只会看到已写完的行
+            self._nrows = len(self._ids)
+        self._journal_offset += consumed
+
+    def _publish(self) -> None:
+        self.generation = self._seen_generation
+
+    def _apply_add(self, row: int, face_id: str, file: str) -> None:
+        if face_id in self._rows:
+            self._apply_remove(face_id)
+        if row >= len(self._vecs):
+            self._map_vectors()
+        if row >= len(self._alive):
+            alive = np.zeros(max(row + 1, len(self._alive) * 2, MIN_CAPACITY), dtype=bool)
+            alive[: len(self._alive)] = self._alive
+            self._alive = alive
+        self._alive[row] = True
+        self._ids.append(face_id)
+        self._files.append(file)
+        self._rows[face_id] = row
+
+    def _apply_remove(self, face_id: str) -> bool:
+        row = self._rows.pop(face_id, None)
+        if row is None:
+            return False
+        self._invalidate_readers()
+        self._alive[row] = False
+        self._ids[row] = None
+        self._files[row] = None
+        self._dead += 1
+        return True
+
+    def _append_journal(self, lines: List[str]) -> None:
+        with open(self._journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+        self._bump_generation()
+
+    # ---------- GalleryIndex 接口 ----------
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._rows)
+
+    def __contains__(self, face_id: str) -> bool:
+        self.refresh()
+        return face_id in self._rows
+
+    def add(self, face_ids: List[str], vecs: np.ndarray, files: Optional[List[str]] = None) -> None:
+        """添加特征向量，face_id 已存在时覆盖；files 为照片文件名（默认 {face_id}.jpg）"""
+        vecs = l2_normalize(vecs)
+        files = files or [f"{face_id}.jpg" for face_id in face_ids]
+        # 同一批内重复的 face_id 以最后一次为准
+        latest = {face_id: i for i, face_id in enumerate(face_ids)}
+        order = list(latest.values())
+        with self.locked():
+            start = len(self._ids)
+            end = start + len(order)
+            if end > len(self._vecs):
+                capacity = max(MIN_CAPACITY, 1 << (end - 1).bit_length())
+                os.truncate(self._vectors_path, capacity * self.dim * 4)
+                self._map_vectors()
+            self._vecs[start:end] = vecs[order]
+
+            lines = [f"R\t{face_ids[i]}\n" for i in order if face_ids[i] in self._rows]
+            lines += [
+                f"A\t{start + offset}\t{face_ids[i]}\t{files[i]}\n" for offset, i in enumerate(order)
+            ]
+            self._append_journal(lines)
+            self._sync_locked()
+
+    def remove(self, face_id: str) -> bool:
+        with self.locked():
+            if face_id not in self._rows:
+                return False
+            self._append_journal([f"R\t{face_id}\n"])
+            self._sync_locked()
+            return True
+
+    def search(self, queries: np.ndarray, k: int = 1) -> List[SearchResult]:
+        self.refresh()
+        return self._read(self._search_normalized, l2_normalize(queries), k)
+
+    def _search_normalized(self, queries: np.ndarray, k: int) -> List[SearchResult]:
+        size = self._nrows
+        if not size:
+            return [[] for _ in range(len(queries))]
+        vecs, alive, ids = self._vecs, self._alive, self._ids
+        scores = queries @ vecs[:size].T
+        if self._dead:
+            scores[:, ~alive[:size]] = -np.inf
+        idx, top = _topk(scores, k)
+        return [
+            [(ids[i], float(s)) for i, s in zip(row_idx, row_scores) if s != -np.inf]
+            for row_idx, row_scores in zip(idx.tolist(), top.tolist())
+        ]
+
+    def snapshot(self) -> Tuple[List[str], List[str], Optional[np.ndarray]]:
+        """当前人脸库内容 (face_id 列表, 照片文件名列表, 特征矩阵)，调用方应持有 locked()"""
+        rows = np.nonzero(self._alive[: self._nrows])[0]
+        if not len(rows):
+            return [], [], None
+        return (
+            [self._ids[r] for r in rows],
+            [self._files[r] for r in rows],
+            np.asarray(self._vecs[rows]),
+        )
@@ -0,0 +1,524 @@
+"""
+视频流处理
+
+对连续的视频帧（本地视频文件、RTSP/HTTP 流）做人脸检测与跟踪：
+    - 自适应抽帧：画面中没有人脸或人脸稳定时逐步加大抽帧间隔（跳过的帧只 grab 不解码），
+      出现新人脸或人脸快速移动时恢复逐帧处理
+    - 跟踪：检测框与已有轨迹按 IoU 关联，轨迹位置由卡尔曼滤波（匀速模型）预测
+    - 识别：每条轨迹只在出现时识别一次，之后每隔 K 帧复核；识别结果变化时产生识别事件
+静止场景下识别调用次数因此比逐帧识别低一个数量级以上。
+"""
+import fnmatch
+import ipaddress
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.core.resources import ServiceResources
+
+logger = logging.getLogger(__name__)
+
+# 检测框与轨迹关联的最小 IoU
+TRACK_IOU_THRESHOLD = 0.3
+# 轨迹连续多少次处理未匹配到检测框后结束
+TRACK_MAX_MISSES = 3
+# 每帧位移（相对人脸宽度）低于该值视为静止
+STATIC_MOTION_RATIO = 0.05
+
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """两组 [x, y, w, h] 框的 IoU 矩阵"""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, 0][:, None], b[:, 0][None]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, 1][:, None], b[:, 1][None]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+class BoxKalmanFilter:
+    """
+    检测框的卡尔曼滤波（匀速模型）
+
+    状态 [cx, cy, w, h, vcx, vcy, vw, vh]，观测 [cx, cy, w, h]，速度以“每帧”为单位，
+    抽帧时按间隔帧数外推。
+    """
+
+    def __init__(self, box: np.ndarray):
+        x, y, w, h = box
+        self.state = np.array([x + w / 2, y + h / 2, w, h, 0, 0, 0, 0], dtype=np.float64)
+        # 初始位置较可信，速度未知
+        self.cov = np.diag([10.0, 10.0, 10.0, 10.0, 1e3, 1e3, 1e3, 1e3])
+        self._measure = np.hstack([np.eye(4), np.zeros((4, 4))])
+
+    def _noise(self, box_size: float):
+        scale = max(box_size, 1.0) / 20.0
+        process = np.diag([1.0, 1.0, 1.0, 1.0, 0.1, 0.1, 0.1, 0.1]) * scale ** 2
+        measurement = np.eye(4) * scale ** 2
+        return process, measurement
+
+    def predict(self, frames: int = 1) -> np.ndarray:
+        """外推 frames 帧，返回预测框 [x, y, w, h]"""
+        transition = np.eye(8)
+        transition[:4, 4:] = np.eye(4) * frames
+        process, _ = self._noise(self.state[2])
+        self.state = transition @ self.state
+        self.state[2:4] = np.maximum(self.state[2:4], 1.0)
+        self.cov = transition @ self.cov @ transition.T + process * frames
+        return self.box
+
+    def update(self, box: np.ndarray) -> None:
+        x, y, w, h = box
+        measured = np.array([x + w / 2, y + h / 2, w, h])
+        _, noise = self._noise(w)
+        residual = measured - self._measure @ self.state
+        innovation = self._measure @ self.cov @ self._measure.T + noise
+        gain = self.cov @ self._measure.T @ np.linalg.inv(innovation)
+        self.state = self.state + gain @ residual
+        self.cov = (np.eye(8) - gain @ self._measure) @ self.cov
+
+    @property
+    def box(self) -> np.ndarray:
+        cx, cy, w, h = self.state[:4]
+        return np.array([cx - w / 2, cy - h / 2, w, h])
+
+    @property
+    def motion(self) -> float:
+        """每帧位移相对人脸宽度的比例"""
+        return float(np.hypot(self.state[4], self.state[5]) / max(self.state[2], 1.0))
+
+
+class FaceTrack:
+    """一条人脸轨迹"""
+
+    def __init__(self, track_id: int, face: Dict[str, Any], frame_index: int):
+        self.track_id = track_id
+        self.kalman = BoxKalmanFilter(self._box(face))
+        self.face = face
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.hits = 1
+        self.misses = 0
+        # 识别结果：(face_id, 相似度) 或 None（未识别或未匹配到已知人员）
+        self.identity: Optional[Tuple[str, float]] = None
+        self.candidates: List[Tuple[str, float]] = []
+        self.verified_frame: Optional[int] = None
+
+    @staticmethod
+    def _box(face: Dict[str, Any]) -> np.ndarray:
+        return np.array([face["x"], face["y"], face["w"], face["h"]], dtype=np.float64)
+
+    def needs_recognition(self, frame_index: int, interval: int) -> bool:
+        """新轨迹或距上次识别已超过 interval 帧"""
+        return self.verified_frame is None or frame_index - self.verified_frame >= interval
+
+
+class FaceTracker:
+    """
+    基于 IoU 关联 + 卡尔曼预测的多目标人脸跟踪
+
+    每次 update 传入当前帧的检测结果与帧号，返回本帧匹配到检测框的轨迹（track.face 为本帧的检测结果）。
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD, max_misses: int = TRACK_MAX_MISSES):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks: List[FaceTrack] = []
+        self._next_id = 1
+        self._last_frame: Optional[int] = None
+        # 最近一次 update 新建的轨迹数
+        self.new_tracks = 0
+
+    def update(self, faces: List[Dict[str, Any]], frame_index: int) -> List[FaceTrack]:
+        elapsed = 1 if self._last_frame is None else max(1, frame_index - self._last_frame)
+        self._last_frame = frame_index
+
+        predicted = np.array([t.kalman.predict(elapsed) for t in self.tracks]).reshape(-1, 4)
+        detected = np.array([FaceTrack._box(f) for f in faces]).reshape(-1, 4)
+        iou = box_iou(predicted, detected)
+
+        # 贪心匹配：按 IoU 从高到低依次配对
+        matched_tracks, matched_faces = set(), set()
+        for flat in np.argsort(-iou, axis=None):
+            t, f = np.unravel_index(flat, iou.shape)
+            if iou[t, f] < self.iou_threshold:
+                break
+            if t in matched_tracks or f in matched_faces:
+                continue
+            matched_tracks.add(t)
+            matched_faces.add(f)
+            track = self.tracks[t]
+            track.kalman.update(detected[f])
+            track.face = faces[f]
+            track.last_frame = frame_index
+            track.hits += 1
+            track.misses = 0
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        self.new_tracks = 0
+        for f, face in enumerate(faces):
+            if f not in matched_faces:
+                self.tracks.append(FaceTrack(self._next_id, face, frame_index))
+                self._next_id += 1
+                self.new_tracks += 1
+
+        return [t for t in self.tracks if t.last_frame == frame_index]
+
+    def release_images(self) -> None:
+        """轨迹只保留本帧检测结果的数值部分，释放人脸裁剪图与对齐张量（二者引用整帧图像）"""
+        for track in self.tracks:
+            if "face_img" in track.face or "face_tensor" in track.face:
+                track.face = {k: v for k, v in track.face.items() if k not in ("face_img", "face_tensor")}
+
+    @property
+    def is_static(self) -> bool:
+        """所有轨迹都已稳定且几乎不动"""
+        return self.new_tracks == 0 and all(
+            t.hits > 1 and t.kalman.motion < STATIC_MOTION_RATIO for t in self.tracks
+        )
+
+
+def host_allowed(host: str, allowed_hosts: Iterable[str]) -> bool:
+    """主机是否在允许列表中：逐项按主机名通配符或 IP 网段匹配"""
+    host = host.lower()
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        address = None
+    for pattern in allowed_hosts:
+        if address is not None and "/" in pattern:
+            try:
+                if address in ipaddress.ip_network(pattern, strict=False):
+                    return True
+            except ValueError:
+                pass
+        elif fnmatch.fnmatchcase(host, pattern):
+            return True
+    return False
+
+
+def resolve_stream_source(source: str) -> str:
+    """
+    校验视频源：网络地址的协议与主机须在 STREAM_ALLOWED_SCHEMES / STREAM_ALLOWED_HOSTS 中，原样使用；
+    本地文件只允许 STREAM_SOURCE_DIR 目录下的文件
+
+    Raises:
+        ValueError: 视频源不合法
+    """
+    if "://" in source:
+        url = urlsplit(source)
+        if url.scheme.lower() not in settings.STREAM_ALLOWED_SCHEMES:
+            raise ValueError(f"不支持的视频源协议: {url.scheme}")
+        if not url.hostname or not host_allowed(url.hostname, settings.STREAM_ALLOWED_HOSTS):
+            raise ValueError(f"视频源主机不在允许列表中: {url.hostname or ''}")
+        return source
+    root = Path(settings.STREAM_SOURCE_DIR).resolve()
+    path = (root / source).resolve()
+    if root != path and root not in path.parents:
+        raise ValueError(f"本地视频文件必须位于 {root} 目录下")
+    if not path.is_file():
+        raise ValueError(f"视频文件不存在: {source}")
+    return str(path)
+
+
+class StreamProcessor:
+    """
+    单路视频流的处理线程
+
+    Args:
+        stream_id: 视频流ID
+        source: 视频源（文件路径或流地址，已校验）
+        detect_faces: 人脸检测函数，输入 RGB 帧
+        match_faces: 批量识别函数，输入人脸列表，返回每个人脸的 top-1 候选列表
+        best_match: 从候选中取超过识别阈值的最佳匹配
+        lookup_personnel: 按 face_id 查询人员信息
+        recognition_interval: 轨迹复核间隔（帧）
+        max_stride: 最大抽帧间隔（帧）
+        configure_thread: 处理线程启动时调用，设置该线程的 torch 线程数与 CPU 亲和性
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        source: str,
+        detect_faces: Callable[[np.ndarray], List[Dict[str, Any]]],
+        match_faces: Callable[[List[Any]], List[List[Tuple[str, float]]]],
+        best_match: Callable[[List[Tuple[str, float]]], Optional[Tuple[str, float]]],
+        lookup_personnel: Callable[[str], Optional[Dict[str, Any]]],
+        recognition_interval: int,
+        max_stride: int,
+        max_events: int = 1000,
+        configure_thread: Optional[Callable[[], None]] = None,
+    ):
+        self.stream_id = stream_id
+        self.source = source
+        self._detect_faces = detect_faces
+        self._match_faces = match_faces
+        self._best_match = best_match
+        self._lookup_personnel = lookup_personnel
+        self.recognition_interval = max(1, recognition_interval)
+        self.max_stride = max(1, max_stride)
+        self._configure_thread = configure_thread
+        self.tracker = FaceTracker()
+
+        self.status = "starting"
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.ended_at: Optional[float] = None
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.faces_detected = 0
+        self.recognitions = 0
+        self.stride = 1
+        # 事件按序号递增，客户端用 since 参数增量获取
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self._event_seq = 0
+        self._events_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"stream_{stream_id[:8]}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stop.set()
+        if self._thread.is_alive() and threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def events(self, since: int = 0) -> List[Dict[str, Any]]:
+        """序号大于 since 的识别事件"""
+        with self._events_lock:
+            return [e for e in self._events if e["seq"] > since]
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return {
+            "stream_id": self.stream_id,
+            "source": self.source,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "faces_detected": self.faces_detected,
+            "recognitions": self.recognitions,
+            "recognitions_per_second": round(self.recognitions / elapsed, 3),
+            "active_tracks": len(self.tracker.tracks),
+            "stride": self.stride,
+            "last_event_seq": self._event_seq,
+        }
+
+    def _run(self) -> None:
+        if self._configure_thread:
+            self._configure_thread()
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            self.status, self.error = "error", f"无法打开视频源: {self.source}"
+            self.ended_at = time.time()
+            logger.warning(f"视频流 {self.stream_id}: {self.error}")
+            return
+        self.status = "running"
+        logger.info(f"视频流 {self.stream_id} 开始处理: {self.source}")
+        try:
+            frame_index = -1
+            skipped = 0
+            while not self._stop.is_set():
+                # 抽帧间隔内的帧只 grab 不解码
+                if not capture.grab():
+                    break
+                frame_index += 1
+                self.frames_read += 1
+                if skipped + 1 < self.stride:
+                    skipped += 1
+                    continue
+                skipped = 0
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+                self._process_frame(frame, frame_index)
+            self.status = "stopped" if self._stop.is_set() else "finished"
+        except Exception as e:
+            self.status, self.error = "error", str(e)
+            logger.error(f"视频流 {self.stream_id} 处理失败: {e}", exc_info=True)
+        finally:
+            capture.release()
+            self.ended_at = time.time()
+            logger.info(
+                f"视频流 {self.stream_id} 结束 ({self.status}): 读取 {self.frames_read} 帧, "
+                f"处理 {self.frames_processed} 帧, 识别 {self.recognitions} 次"
+            )
+
+    def _process_frame(self, frame: np.ndarray, frame_index: int) -> None:
+        faces = self._detect_faces(frame)
+        self.frames_processed += 1
+        self.faces_detected += len(faces)
+        tracks = self.tracker.update(faces, frame_index)
+
+        pending = [t for t in tracks if t.needs_recognition(frame_index, self.recognition_interval)]
+        if pending:
+            inputs = [
+                t.face["face_tensor"] if t.face.get("face_tensor") is not None else t.face["face_img"]
+                for t in pending
+            ]
+            self.recognitions += len(pending)
+            for track, candidates in zip(pending, self._match_faces(inputs)):
+                self._verify(track, candidates, frame_index)
+
+        # 画面中没有人脸或人脸都已稳定时加大抽帧间隔，否则恢复逐帧处理
+        if not tracks or self.tracker.is_static:
+            self.stride = min(self.stride * 2, self.max_stride)
+        else:
+            self.stride = 1
+
+        self.tracker.release_images()
+
+    def _verify(self, track: FaceTrack, candidates: List[Tuple[str, float]], frame_index: int) -> None:
+        """记录轨迹的识别结果，首次识别或身份变化时产生事件"""
+        first = track.verified_frame is None
+        track.verified_frame = frame_index
+        track.candidates = candidates
+        identity = self._best_match(candidates)
+        previous = track.identity[0] if track.identity else None
+        current = identity[0] if identity else None
+        track.identity = identity
+        if not first and previous == current:
+            return
+
+        person = None
+        if current:
+            try:
+                person = self._lookup_personnel(current)
+            except Exception as e:
+                logger.error(f"查询人员信息失败: {e}", exc_info=True)
+        with self._events_lock:
+            self._event_seq += 1
+            self._events.append({
+                "seq": self._event_seq,
+                "stream_id": self.stream_id,
+                "track_id": track.track_id,
+                "frame_index": frame_index,
+                "timestamp": time.time(),
+                "event": "recognized" if first else "identity_changed",
+                "face_box": {k: track.face[k] for k in ("x", "y", "w", "h", "confidence")},
+                "face_id": current,
+                "recognition_confidence": identity[1] if identity else None,
+                "person_info": person,
+            })
+
+
+class StreamManager:
+    """
+    视频流处理线程的管理（启动、停止、查询），已结束的视频流保留 retention 秒后移除
+
+    视频流状态只保存在本进程内，只能在单 worker 模式下使用（多 worker 时后续请求可能落到其他进程）。
+    处理线程按 resources（检测服务的线程预算）设置 torch 线程数与 CPU 亲和性。
+    """
+
+    def __init__(
+        self,
+        detection,
+        recognition,
+        personnel,
+        max_streams: Optional[int] = None,
+        retention: Optional[float] = None,
+        resources: Optional[ServiceResources] = None,
+    ):
+        self.detection = detection
+        self.recognition = recognition
+        self.personnel = personnel
+        self.resources = resources
+        self.max_streams = settings.STREAM_MAX_ACTIVE if max_streams is None else max_streams
+        self.retention = settings.STREAM_RETENTION_SECONDS if retention is None else retention
+        self._streams: Dict[str, StreamProcessor] = {}
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        source: str,
+        recognition_interval: Optional[int] = None,
+        max_stride: Optional[int] = None,
+    ) -> StreamProcessor:
+        """
+        启动一路视频流
+
+        Raises:
+            ValueError: 视频源不合法
+            RuntimeError: 运行中的视频流数量已达上限
+        """
+        resolved = resolve_stream_source(source)
+        with self._lock:
+            self._prune()
+            # 已结束的视频流保留状态供查询，但不计入上限
+            if sum(1 for p in self._streams.values() if p.running) >= self.max_streams:
+                raise RuntimeError(f"运行中的视频流数量已达上限（{self.max_streams}）")
+            processor = StreamProcessor(
+                stream_id=str(uuid.uuid4()),
+                source=resolved,
+                detect_faces=self.detection.detect_faces,
+                match_faces=lambda faces: self.recognition.match_batch(faces, 1),
+                best_match=self.recognition.best_match,
+                lookup_personnel=self.personnel.get_personnel_by_face_id,
+                recognition_interval=recognition_interval or settings.STREAM_RECOGNITION_INTERVAL,
+                max_stride=max_stride or settings.STREAM_MAX_FRAME_STRIDE,
+                configure_thread=self.resources.configure_thread if self.resources else None,
+            )
+            self._streams[processor.stream_id] = processor
+        processor.start()
+        return processor
+
+    def get(self, stream_id: str) -> Optional[StreamProcessor]:
+        with self._lock:
+            self._prune()
+            return self._streams.get(stream_id)
+
+    def list(self) -> List[StreamProcessor]:
+        with self._lock:
+            self._prune()
+            return list(self._streams.values())
+
+    def _prune(self) -> None:
+        """移除结束时间超过保留时长的视频流（调用方持有 _lock）"""
+        deadline = time.time() - self.retention
+        expired = [
+            stream_id
+            for stream_id, p in self._streams.items()
+            if p.ended_at is not None and p.ended_at <= deadline and not p.running
+        ]
+        for stream_id in expired:
+            del self._streams[stream_id]
+
+    def remove(self, stream_id: str) -> bool:
+        """停止并移除一路视频流"""
+        with self._lock:
+            processor = self._streams.pop(stream_id, None)
+        if processor is None:
+            return False
+        processor.stop()
+        return True
+
+    def shutdown(self) -> None:
+        for stream_id in list(self._streams):
+            self.remove(stream_id)
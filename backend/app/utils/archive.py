@@ -0,0 +1,106 @@
+"""
+批量导入的照片读取与解码工具
+
+只依赖 OpenCV/NumPy，供批量导入的解码进程与主进程使用。
+"""
+import os
+import zipfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+
+class _MemberTooLarge(ValueError):
+    """照片（解压后）大小超过上限"""
+
+
+class PhotoSource:
+    """
+    照片目录或 ZIP 包的读取器
+
+    ZIP 包只打开、解析一次目录，由使用方在任务结束时关闭（支持 with 语句）。
+    读取时先按 ZIP 目录中记录的解压后大小拒绝超限成员，再以流式读取最多 limit + 1 字节，
+    防止目录中大小造假的压缩炸弹被整体解压进内存。
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(source) if zipfile.is_zipfile(source) else None
+        self._root = None if self._zip else Path(source).resolve()
+
+    def read(self, member: str, limit: int) -> bytes:
+        """读取文件字节，超过 limit 字节时抛出 ValueError"""
+        if self._zip is not None:
+            if self._zip.getinfo(member).file_size > limit:
+                raise _MemberTooLarge(member)
+            with self._zip.open(member) as f:
+                data = f.read(limit + 1)
+        else:
+            path = (self._root / member).resolve()
+            # 清单中的路径必须位于导入目录内
+            if self._root not in path.parents:
+                raise ValueError(f"非法的照片路径: {member}")
+            if path.stat().st_size > limit:
+                raise _MemberTooLarge(member)
+            with path.open("rb") as f:
+                data = f.read(limit + 1)
+        if len(data) > limit:
+            raise _MemberTooLarge(member)
+        return data
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def __enter__(self) -> "PhotoSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def decode_photo(source: PhotoSource, member: str) -> Tuple[Optional[np.ndarray], Optional[bytes], Optional[str]]:
+    """
+    读取并解码照片，同时编码为人脸库使用的 JPEG
+
+    Args:
+        source: 照片目录或 ZIP 包的读取器
+        member: 照片相对路径
+
+    Returns:
+        (RGB 图像, JPEG 字节, 错误信息)，成功时错误信息为 None
+    """
+    try:
+        data = source.read(member, settings.MAX_UPLOAD_SIZE)
+    except _MemberTooLarge:
+        return None, None, f"照片大小超过限制（最大{settings.MAX_UPLOAD_SIZE}字节）"
+    except Exception as e:
+        return None, None, f"读取照片失败: {e}"
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None or image.shape[0] < 20 or image.shape[1] < 20:
+        return None, None, "无法解码图像文件或图像尺寸过小"
+    ok, encoded = cv2.imencode(".jpg", image)
+    if not ok:
+        return None, None, "照片编码失败"
+    # 检测服务使用 RGB 图像，编码后原地转换
+    cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    return image, encoded.tobytes(), None
+
+
+def write_photo(path: Path, data: bytes) -> None:
+    """原子地写入照片文件（先写临时文件再替换）"""
+    tmp_file = path.with_name(path.name + ".tmp")
+    try:
+        tmp_file.write_bytes(data)
+        os.replace(tmp_file, path)
+    except Exception:
+        try:
+            tmp_file.unlink()
+        except OSError:
+            pass
+        raise
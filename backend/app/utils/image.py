@@ -1,16 +1,35 @@
+import logging
 import cv2
 import numpy as np
 from typing import Optional
 
+logger = logging.getLogger(__name__)
 
-def decode_image_from_bytes(image_bytes: bytes) -> Optional[np.ndarray]:
-    """从字节数据解码图像"""
+
+def decode_image_rgb(image_bytes: bytes) -> Optional[np.ndarray]:
+    """
+    从字节数据按原分辨率解码为 RGB 图像
+    
+    解码结果原地转换为 RGB，整个请求只有这一份图像缓冲区，后续检测、裁剪均以视图方式使用。
+    检测时由 DetectionService 另行缩小出检测图，人脸裁剪与对齐始终在这份原分辨率图像上进行。
+    WebSocket 检测帧同样按原分辨率解码：检测图虽然只需长边 max_side，但识别用的 160×160 对齐人脸
+    取自解码图像，IMREAD_REDUCED_COLOR_* 缩小解码会让中小尺寸人脸先降采样再放大，降低识别置信度；
+    而常见的 720p/1080p 帧缩小解码每帧只省约 5~10ms。
+    
+    Args:
+        image_bytes: 图像文件内容（bytes 或 memoryview）
+    
+    Returns:
+        RGB 图像，解码失败时为 None
+    """
     try:
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
         return image
     except Exception as e:
-        print(f"图像解码失败: {e}")
+        logger.error(f"图像解码失败: {e}", exc_info=True)
         return None
 
 
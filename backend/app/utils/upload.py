@@ -0,0 +1,69 @@
+"""
+上传文件读取
+
+按块读取上传文件到有界缓冲区：先校验扩展名与文件头（magic bytes），再逐块读取，
+超过大小上限立即中止，不会把超限文件整体读入内存。返回 memoryview 直接交给解码器。
+"""
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# 支持的图片格式文件头：JPEG / PNG / BMP
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"BM")
+
+
+class UploadError(ValueError):
+    """上传文件不符合要求（格式、内容或大小）"""
+
+
+def size_limit_message(max_size: int) -> str:
+    return f"文件大小超过限制（最大{max_size}字节）"
+
+
+def check_image_extension(filename: Optional[str]) -> None:
+    """校验文件扩展名"""
+    ext = Path(filename or "").suffix.lower()
+    if ext not in settings.ALLOWED_IMAGE_EXTENSIONS:
+        raise UploadError("不支持的文件格式，请上传jpg、png或bmp格式的图片")
+
+
+async def read_image_upload(file: UploadFile, max_size: Optional[int] = None) -> memoryview:
+    """
+    按块读取上传的图片
+
+    Args:
+        file: 上传文件
+        max_size: 大小上限（字节），默认 MAX_UPLOAD_SIZE
+
+    Returns:
+        文件内容（memoryview，可直接交给 decode_image_rgb）
+
+    Raises:
+        UploadError: 扩展名或文件头不是支持的图片格式，或大小超过上限
+    """
+    max_size = settings.MAX_UPLOAD_SIZE if max_size is None else max_size
+    check_image_extension(file.filename)
+    # 表单解析时已知文件大小的，直接拒绝
+    if file.size is not None and file.size > max_size:
+        raise UploadError(size_limit_message(max_size))
+
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    if not head.startswith(IMAGE_SIGNATURES):
+        raise UploadError("文件内容不是有效的图片，请上传jpg、png或bmp格式的图片")
+
+    buffer = bytearray(head)
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > max_size:
+            raise UploadError(size_limit_message(max_size))
+        buffer += chunk
+    if len(buffer) > max_size:
+        raise UploadError(size_limit_message(max_size))
+    return memoryview(buffer)
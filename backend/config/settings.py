@@ -3,6 +3,7 @@
 使用.env文件进行配置管理
 """
 
+import hashlib
 import os
 from pathlib import Path
 from typing import Dict, Any
@@ -22,6 +23,12 @@ if ENV_FILE.exists():
 if ENV_LOCAL_FILE.exists():
     load_dotenv(ENV_LOCAL_FILE, override=True)
 
+# 本次服务运行的标识（run.py / main.py 启动时生成，worker 进程继承），用于判断共享人脸库是否属于本次运行
+RUN_ID_ENV = "FACESNAP_RUN_ID"
+# 本次运行实际启动的 worker 进程数（run.py 按 API_WORKERS 与 reload 模式设置，worker 进程继承）；
+# main.py 直接启动或未经 run.py 启动时未设置，按单进程处理
+WORKERS_ENV = "FACESNAP_WORKERS"
+
 
 class Settings:
     """应用配置类"""
@@ -32,13 +39,52 @@ class Settings:
     DATABASE_DIR: Path = DATA_DIR / "database"  # SQLite 数据库文件目录
     FACES_DIR: Path = DATA_DIR / "faces"  # 人脸图片存储目录
     MODELS_DIR: Path = DATA_DIR / "models"  # 模型文件存储目录
+    EMBEDDINGS_DIR: Path = DATA_DIR / "embeddings"  # 人脸特征持久化存储目录
 
     # 数据库配置（SQLite）
     DB_PATH: Path = DATABASE_DIR / "personnel.db"  # SQLite 数据库文件路径
 
+    # 数据库连接池：连接复用，WAL 模式下写不阻塞读
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "8"))  # 保留的空闲连接数
+    DB_SYNCHRONOUS: str = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # WAL 模式下 NORMAL 足以保证数据库不损坏
+    DB_CACHE_SIZE_MB: int = int(os.getenv("DB_CACHE_SIZE_MB", "16"))  # 每个连接的页缓存
+    DB_MMAP_SIZE_MB: int = int(os.getenv("DB_MMAP_SIZE_MB", "256"))  # 内存映射读取的大小，0 表示不使用
+    DB_BUSY_TIMEOUT: float = float(os.getenv("DB_BUSY_TIMEOUT", "5"))  # 等待写锁的超时（秒）
+    # 人员信息缓存：启动时加载全部人员记录，检测接口按 face_id 解析人员信息不访问数据库
+    PERSONNEL_CACHE_ENABLED: bool = os.getenv("PERSONNEL_CACHE_ENABLED", "true").lower() == "true"
+    # 定期整体重新加载的间隔（秒），多 worker 时用于同步其他进程的修改（包括清除已确认没有人员记录的 face_id），0 表示不重新加载
+    PERSONNEL_CACHE_RELOAD_INTERVAL: float = float(os.getenv("PERSONNEL_CACHE_RELOAD_INTERVAL", "0"))
+    # 人员列表游标分页返回总数时的缓存时间（秒），本进程写入人员后立即失效，0 表示每次重新计数
+    PERSONNEL_COUNT_CACHE_TTL: float = float(os.getenv("PERSONNEL_COUNT_CACHE_TTL", "30"))
+
     # 模型配置
     FACE_DETECTION_THRESHOLD: float = float(os.getenv("FACE_DETECTION_THRESHOLD", "0.9"))
     FACE_RECOGNITION_THRESHOLD: float = float(os.getenv("FACE_RECOGNITION_THRESHOLD", "0.7"))
+    # 缩小检测：长边超过该值的图像先缩小到此尺寸再运行 MTCNN，检测框映射回原图后在原图上裁剪对齐（0 表示不缩小）
+    DETECTION_MAX_SIDE: int = int(os.getenv("DETECTION_MAX_SIDE", "1280"))
+    # 最小检测人脸尺寸（原图像素）
+    DETECTION_MIN_FACE_SIZE: int = int(os.getenv("DETECTION_MIN_FACE_SIZE", "20"))
+    # 人脸特征持久化：启动时复用已保存的特征，仅对新增/变更的照片重新提取
+    EMBEDDING_STORE_ENABLED: bool = os.getenv("EMBEDDING_STORE_ENABLED", "true").lower() == "true"
+    # 识别批处理：并发请求中的人脸按最大批大小或最大等待时间（毫秒）合并为一次前向
+    RECOGNITION_BATCHING_ENABLED: bool = os.getenv("RECOGNITION_BATCHING_ENABLED", "true").lower() == "true"
+    RECOGNITION_BATCH_MAX_SIZE: int = int(os.getenv("RECOGNITION_BATCH_MAX_SIZE", "32"))
+    RECOGNITION_BATCH_MAX_WAIT_MS: float = float(os.getenv("RECOGNITION_BATCH_MAX_WAIT_MS", "5"))
+    # 识别模型副本数：最多允许多少个前向同时进行（批处理调度器也按此数量并行处理批次）
+    RECOGNITION_MODEL_REPLICAS: int = int(os.getenv("RECOGNITION_MODEL_REPLICAS", "2"))
+    # 检测结果缓存：相同内容的重复上传直接返回缓存的检测框与候选（人脸库版本变化后失效）
+    DETECT_CACHE_ENABLED: bool = os.getenv("DETECT_CACHE_ENABLED", "true").lower() == "true"
+    DETECT_CACHE_MAX_MB: int = int(os.getenv("DETECT_CACHE_MAX_MB", "16"))
+    DETECT_CACHE_TTL: float = float(os.getenv("DETECT_CACHE_TTL", "300"))  # 秒，0 表示不过期
+    # 特征缓存：对齐人脸的感知哈希相同时复用特征向量，跳过特征提取（近似图片也会命中，默认关闭）
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "false").lower() == "true"
+    EMBEDDING_CACHE_MAX_MB: int = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "32"))
+    EMBEDDING_CACHE_TTL: float = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))  # 秒，0 表示不过期
+    # 人脸库索引：exact（精确检索）或 ivf（倒排近似检索，适合 10 万以上人脸）
+    GALLERY_INDEX: str = os.getenv("GALLERY_INDEX", "exact")
+    # IVF 簇数量与查询时探测的簇数量（nprobe 越大召回率越高、延迟越大）
+    GALLERY_IVF_NLIST: int = int(os.getenv("GALLERY_IVF_NLIST", "1024"))
+    GALLERY_IVF_NPROBE: int = int(os.getenv("GALLERY_IVF_NPROBE", "16"))
     # 设备配置：优先使用环境变量，否则自动检测可用设备
     _DEVICE_RAW: str = os.getenv("DEVICE", "auto")
 
@@ -106,12 +152,67 @@ class Settings:
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
     API_RELOAD: bool = os.getenv("API_RELOAD", "false").lower() == "true"
+    # 服务进程数：大于 1 时由 run.py 启动多个 worker 进程，每个进程各自持有一份模型，人脸库通过共享内存共用
+    API_WORKERS: int = int(os.getenv("API_WORKERS", "1"))
+
+    @property
+    def PROCESS_WORKERS(self) -> int:
+        """本次运行实际启动的 worker 进程数（由 run.py 设置，其他方式启动时为 1）"""
+        return max(1, int(os.environ.get(WORKERS_ENV, "1")))
+
+    # 每个 worker 的 torch 计算线程数，0 表示按 CPU 核数 / worker 数自动分配
+    TORCH_THREADS_PER_WORKER: int = int(os.getenv("TORCH_THREADS_PER_WORKER", "0"))
+    # 多进程共享人脸库的文件目录（默认位于 /dev/shm，即 POSIX 共享内存）
+    SHARED_GALLERY_DIR: Path = Path(
+        os.getenv(
+            "SHARED_GALLERY_DIR",
+            str(
+                (Path("/dev/shm") if Path("/dev/shm").is_dir() else DATA_DIR / "embeddings")
+                / f"facesnap-gallery-{hashlib.sha1(str(DATA_DIR).encode()).hexdigest()[:8]}"
+            ),
+        )
+    )
+
+    # 执行资源配置（CPU 核在检测与识别之间的划分，详见 app/core/resources.py）
+    # 限定本服务可用的 CPU 核，如 "0-31"，为空表示使用进程可用的全部核
+    CPU_AFFINITY: str = os.getenv("CPU_AFFINITY", "")
+    # 是否将检测/识别线程绑定到各自分得的核上（单 worker 时生效）
+    CPU_PINNING: bool = os.getenv("CPU_PINNING", "false").lower() == "true"
+    # 检测服务分得的核比例，其余归识别服务
+    DETECTION_CPU_SHARE: float = float(os.getenv("DETECTION_CPU_SHARE", "0.5"))
+    # 检测线程池的并发数（也是检测模型副本数，各并发同时检测），0 表示自动（分得的核数，最多 8）
+    DETECTION_WORKERS: int = int(os.getenv("DETECTION_WORKERS", "0"))
+    # torch inter-op 线程数（并发由各服务线程池控制，默认 1）
+    TORCH_INTEROP_THREADS: int = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
 
     # 文件上传配置
     MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", "10485760"))  # 10MB，默认10MB
     ALLOWED_IMAGE_EXTENSIONS: set = {
         ext.strip() for ext in os.getenv("ALLOWED_IMAGE_EXTENSIONS", ".jpg,.jpeg,.png,.bmp").split(",")
     }
+    # 批量检测接口单次请求的最大图片数
+    DETECT_BATCH_MAX_IMAGES: int = int(os.getenv("DETECT_BATCH_MAX_IMAGES", "64"))
+
+    # 批量导入配置
+    MAX_BULK_UPLOAD_SIZE: int = int(os.getenv("MAX_BULK_UPLOAD_SIZE", str(2 * 1024**3)))  # ZIP 包大小上限，默认2GB
+    BULK_IMPORT_BATCH_SIZE: int = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "256"))  # 每批（一次前向 + 一个事务）行数
+    BULK_IMPORT_WORKERS: int = int(os.getenv("BULK_IMPORT_WORKERS", str(min(os.cpu_count() or 4, 8))))  # 解码与人脸检测进程数（每个进程在 CPU 上运行一份 MTCNN）
+
+    # 视频流处理配置（视频流状态保存在进程内，只在单 worker 模式下启用）
+    STREAM_SOURCE_DIR: Path = Path(os.getenv("STREAM_SOURCE_DIR", str(DATA_DIR / "videos")))  # 本地视频文件目录
+    STREAM_MAX_ACTIVE: int = int(os.getenv("STREAM_MAX_ACTIVE", "4"))  # 同时运行的视频流上限
+    STREAM_RECOGNITION_INTERVAL: int = int(os.getenv("STREAM_RECOGNITION_INTERVAL", "30"))  # 轨迹复核间隔（帧）
+    STREAM_MAX_FRAME_STRIDE: int = int(os.getenv("STREAM_MAX_FRAME_STRIDE", "8"))  # 静止画面的最大抽帧间隔（帧）
+    # 允许的网络视频源协议与主机（主机支持 * 通配符与 IP 网段，如 cam-*.example.com、10.0.0.0/24），
+    # 主机列表为空时只允许 STREAM_SOURCE_DIR 下的本地文件
+    STREAM_ALLOWED_SCHEMES: set = {
+        scheme.strip().lower() for scheme in os.getenv("STREAM_ALLOWED_SCHEMES", "rtsp,rtmp,http,https").split(",")
+    }
+    STREAM_ALLOWED_HOSTS: set = {
+        host.strip().lower() for host in os.getenv("STREAM_ALLOWED_HOSTS", "").split(",") if host.strip()
+    }
+    STREAM_RETENTION_SECONDS: float = float(os.getenv("STREAM_RETENTION_SECONDS", "600"))  # 已结束的视频流保留状态供查询的时长（秒）
+    WS_DETECTION_MAX_SIDE: int = int(os.getenv("WS_DETECTION_MAX_SIDE", "640"))  # WebSocket 检测默认检测分辨率（客户端可协商）
 
     # 日志配置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -123,6 +224,7 @@ class Settings:
         self.DATABASE_DIR.mkdir(parents=True, exist_ok=True)
         self.FACES_DIR.mkdir(parents=True, exist_ok=True)
         self.MODELS_DIR.mkdir(parents=True, exist_ok=True)
+        self.EMBEDDINGS_DIR.mkdir(parents=True, exist_ok=True)
 
     @property
     def db_path(self) -> str:
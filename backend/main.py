@@ -17,14 +17,22 @@ if sys.platform == 'win32':
 warnings.filterwarnings('ignore', category=UserWarning, module='torchvision.io.image')
 
 # 导入 settings 时会自动设置 TORCH_HOME
-from app.core.config import settings
+from app.core.config import RUN_ID_ENV, WORKERS_ENV, settings
 from app.core.models import HealthResponse
+from app.core.middleware import UploadLimitMiddleware
+from app.core.resources import ExecutionResources
 from app.services.detection import DetectionService
 from app.services.recognition import RecognitionService
 from app.services.personnel import PersonnelService
+from app.services.batching import RecognitionBatcher
+from app.services.cache import EmbeddingCache, LRUCache
+from app.services.enrollment import BulkEnrollmentService
+from app.services.stream import StreamManager
 from app.api.v1.endpoints.detect import router as detect_router, init_services as init_detect_services
 from app.api.v1.endpoints.personnel import router as personnel_router, init_services as init_personnel_services
 from app.api.v1.endpoints.categories import router as categories_router, init_services as init_categories_services
+from app.api.v1.endpoints.metrics import router as metrics_router, init_services as init_metrics_services
+from app.api.v1.endpoints.streams import router as streams_router, init_services as init_streams_services
 
 logging.basicConfig(
     level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO),
@@ -35,11 +43,13 @@ logger = logging.getLogger(__name__)
 detection_service: DetectionService = None
 recognition_service: RecognitionService = None
 personnel_service: PersonnelService = None
+recognition_batcher: RecognitionBatcher = None
+stream_manager: StreamManager = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global detection_service, recognition_service, personnel_service
+    global detection_service, recognition_service, personnel_service, recognition_batcher, stream_manager
     
     logger.info("🚀 启动人脸检测服务...")
     
@@ -81,19 +91,70 @@ async def lifespan(app: FastAPI):
     elif device_str == "cpu":
         logger.info("   💻 使用 CPU 设备")
     
+    # 执行资源：按 worker 数与检测/识别比例划分 CPU 核，设置各服务的线程预算
+    execution_resources = ExecutionResources.plan()
+    execution_resources.apply_process()
+    execution_resources.log_summary()
+    
+    # 多 worker 模式：每个进程各自持有模型，人脸库位于共享内存
+    # 以实际启动的进程数为准（run.py 设置），main.py 直接启动时始终为单进程
+    multi_worker = settings.PROCESS_WORKERS > 1
+    
     try:
-        detection_service = DetectionService()
+        # 检测模型副本数与检测线程池并发数一致，每个并发各用一个副本
+        detection_service = DetectionService(replicas=execution_resources.detection.workers)
         detection_service.initialize()
         
-        recognition_service = RecognitionService()
+        # 结果缓存：重复提交的相同图片复用检测与识别结果，对齐后相同的人脸复用特征
+        detect_cache = (
+            LRUCache(settings.DETECT_CACHE_MAX_MB * 1024**2, settings.DETECT_CACHE_TTL)
+            if settings.DETECT_CACHE_ENABLED else None
+        )
+        embedding_cache = (
+            EmbeddingCache(settings.EMBEDDING_CACHE_MAX_MB * 1024**2, settings.EMBEDDING_CACHE_TTL)
+            if settings.EMBEDDING_CACHE_ENABLED else None
+        )
+        
+        recognition_service = RecognitionService(shared_gallery=multi_worker, embedding_cache=embedding_cache)
         recognition_service.initialize()
         
         personnel_service = PersonnelService()
         personnel_service.initialize_database()
+        personnel_service.warm_cache()
+        if multi_worker and personnel_service.cache is not None and settings.PERSONNEL_CACHE_RELOAD_INTERVAL <= 0:
+            logger.warning("   ⚠️  多 worker 模式未设置 PERSONNEL_CACHE_RELOAD_INTERVAL，其他进程对人员的修改不会同步到本进程的缓存")
+        
+        if settings.RECOGNITION_BATCHING_ENABLED:
+            recognition_batcher = RecognitionBatcher(
+                recognition_service,
+                max_batch_size=settings.RECOGNITION_BATCH_MAX_SIZE,
+                max_wait_ms=settings.RECOGNITION_BATCH_MAX_WAIT_MS,
+                workers=execution_resources.recognition.workers,
+                initializer=execution_resources.recognition.configure_thread,
+            )
+            recognition_batcher.start()
         
-        init_detect_services(detection_service, recognition_service, personnel_service)
-        init_personnel_services(personnel_service, recognition_service, detection_service)
+        init_detect_services(
+            detection_service, recognition_service, personnel_service, recognition_batcher, execution_resources,
+            detect_cache,
+        )
+        enrollment_service = BulkEnrollmentService(personnel_service, recognition_service, detection_service)
+        init_personnel_services(personnel_service, recognition_service, detection_service, enrollment_service)
         init_categories_services(personnel_service)
+        init_metrics_services(
+            execution_resources, recognition_service, recognition_batcher, detect_cache, embedding_cache,
+            personnel_service,
+        )
+        # 视频流状态只保存在本进程内，多 worker 时查询/停止请求可能落到其他进程，因此只在单 worker 模式下启用
+        if multi_worker:
+            logger.warning("   ⚠️  多 worker 模式不启用视频流处理（/streams 接口返回 503）")
+            init_streams_services(None, "视频流处理只在单 worker 模式（API_WORKERS=1）下可用")
+        else:
+            stream_manager = StreamManager(
+                detection_service, recognition_service, personnel_service,
+                resources=execution_resources.detection,
+            )
+            init_streams_services(stream_manager)
         
         logger.info("✅ 服务启动完成")
         
@@ -104,6 +165,14 @@ async def lifespan(app: FastAPI):
     yield
     
     logger.info("服务正在关闭...")
+    if stream_manager:
+        stream_manager.shutdown()
+    if recognition_batcher:
+        recognition_batcher.stop()
+    if recognition_service:
+        recognition_service.shutdown()
+    if personnel_service:
+        personnel_service.close()
 
 
 app = FastAPI(
@@ -113,6 +182,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 上传请求体按路径限制大小，超限在读取请求体时即中止
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits=[
+        ("POST", r"^/api/v1/personnel/import$", settings.MAX_BULK_UPLOAD_SIZE),
+        ("POST", r"^/api/v1/detect/batch$", settings.MAX_UPLOAD_SIZE * settings.DETECT_BATCH_MAX_IMAGES),
+        ("POST", r"^/api/v1/(detect|personnel)$", settings.MAX_UPLOAD_SIZE),
+        ("PUT", r"^/api/v1/personnel/\d+$", settings.MAX_UPLOAD_SIZE),
+    ],
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -136,6 +216,16 @@ app.include_router(
     prefix="/api/v1",
     tags=["人员类别"]
 )
+app.include_router(
+    metrics_router,
+    prefix="/api/v1",
+    tags=["运行指标"]
+)
+app.include_router(
+    streams_router,
+    prefix="/api/v1",
+    tags=["视频流"]
+)
 
 app.mount("/api/v1/faces", StaticFiles(directory=str(settings.FACES_DIR)), name="faces")
 
@@ -161,7 +251,12 @@ def root():
 
 
 if __name__ == "__main__":
+    import uuid
     import uvicorn
+    # 每次启动生成新的运行标识（共享人脸库据此判断是否需要重建）
+    os.environ[RUN_ID_ENV] = uuid.uuid4().hex
+    # 直接启动 app 对象只有一个进程，不使用共享人脸库
+    os.environ[WORKERS_ENV] = "1"
     log_config = {
         "version": 1,
         "disable_existing_loggers": False,
@@ -1,10 +1,18 @@
 """
 使用 settings 配置启动 uvicorn 服务器
 """
+import os
+import uuid
+
 import uvicorn
-from app.core.config import settings
+from app.core.config import RUN_ID_ENV, WORKERS_ENV, settings
 
 if __name__ == "__main__":
+    # 每次启动生成新的运行标识，worker 进程继承；共享人脸库据此判断是否需要重建
+    os.environ[RUN_ID_ENV] = uuid.uuid4().hex
+    # reload 模式下 uvicorn 忽略 workers，只运行一个进程
+    workers = 1 if settings.API_RELOAD else max(1, settings.API_WORKERS)
+    os.environ[WORKERS_ENV] = str(workers)
     # 配置 Uvicorn 日志，减少冗余输出
     log_config = {
         "version": 1,
@@ -37,6 +45,8 @@ if __name__ == "__main__":
         host=settings.API_HOST,
         port=settings.API_PORT,
         reload=settings.API_RELOAD,
+        # 多 worker：每个进程各自加载模型，人脸库位于共享内存（reload 模式下不生效）
+        workers=workers,
         log_config=log_config
     )
 
@@ -0,0 +1,84 @@
+"""
+缩小检测基准测试
+在一组图像上比较不同 DETECTION_MAX_SIDE 下的检测延迟，并以原分辨率检测结果为基准统计召回率
+
+用法：
+    python scripts/benchmark_detection_scale.py --images /path/to/photos --max-sides 1920 1280 960
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 添加 backend 目录到路径（脚本在 backend/scripts/ 下）
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.services.detection import DetectionService
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """两组 [x, y, w, h] 检测框的 IoU 矩阵"""
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, 0][:, None], b[:, 0][None]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, 1][:, None], b[:, 1][None]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def run(service: DetectionService, images, max_side: int):
+    """返回 (每张延迟毫秒列表, 每张检测框数组列表)"""
+    service.max_side = max_side
+    latencies, results = [], []
+    for image in images:
+        start = time.perf_counter()
+        faces = service.detect_faces(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(np.array([[f["x"], f["y"], f["w"], f["h"]] for f in faces], dtype=np.float32).reshape(-1, 4))
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缩小检测基准测试")
+    parser.add_argument("--images", required=True, help="测试图像目录")
+    parser.add_argument("--max-sides", type=int, nargs="+", default=[1920, 1280, 960], help="检测图长边上限")
+    parser.add_argument("--iou", type=float, default=0.5, help="判定为同一人脸的 IoU 阈值")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    images = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in (cv2.imread(str(p)) for p in paths) if img is not None]
+    if not images:
+        raise SystemExit(f"目录中没有可读取的图像: {args.images}")
+    sides = [max(img.shape[:2]) for img in images]
+    print(f"图像: {len(images)} 张, 长边 {min(sides)}-{max(sides)} 像素")
+
+    service = DetectionService()
+    service.initialize()
+    service.detect_faces(images[0])  # 预热
+
+    base_latencies, baseline = run(service, images, 0)
+    total = sum(len(b) for b in baseline)
+    print(f"{'max_side':>8} {'平均(ms)':>10} {'P95(ms)':>10} {'加速':>6} {'召回':>8} {'人脸数':>6}")
+    print(f"{'原图':>8} {np.mean(base_latencies):>10.1f} {np.percentile(base_latencies, 95):>10.1f} "
+          f"{1.0:>6.2f} {1.0:>8.4f} {total:>6}")
+
+    for max_side in args.max_sides:
+        latencies, results = run(service, images, max_side)
+        matched = 0
+        for ref, got in zip(baseline, results):
+            if len(ref) and len(got):
+                matched += int((box_iou(ref, got).max(axis=1) >= args.iou).sum())
+        recall = matched / total if total else 1.0
+        print(f"{max_side:>8} {np.mean(latencies):>10.1f} {np.percentile(latencies, 95):>10.1f} "
+              f"{np.mean(base_latencies) / np.mean(latencies):>6.2f} {recall:>8.4f} {sum(len(r) for r in results):>6}")
+
+
+if __name__ == "__main__":
+    main()
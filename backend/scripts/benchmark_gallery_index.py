@@ -0,0 +1,89 @@
+"""
+人脸库索引基准测试
+在合成的 512 维人脸特征上比较 ExactIndex 与 IVFIndex 的查询延迟与召回率
+
+用法：
+    python scripts/benchmark_gallery_index.py --sizes 10000 100000 1000000 --nprobe 4 16 64
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加 backend 目录到路径（脚本在 backend/scripts/ 下）
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.services.gallery_index import ExactIndex, IVFIndex, l2_normalize
+
+
+def make_embeddings(n: int, dim: int, rng: np.random.Generator, identities: int = 4096) -> np.ndarray:
+    """生成带簇结构的合成特征（模拟真实人脸特征在超球面上的分布）"""
+    centers = l2_normalize(rng.standard_normal((identities, dim), dtype=np.float32))
+    out = np.empty((n, dim), dtype=np.float32)
+    chunk = 100_000
+    for start in range(0, n, chunk):
+        end = min(n, start + chunk)
+        labels = rng.integers(0, identities, size=end - start)
+        out[start:end] = centers[labels] + 0.6 * rng.standard_normal((end - start, dim), dtype=np.float32) / np.sqrt(dim)
+    return l2_normalize(out)
+
+
+def time_queries(index, queries: np.ndarray, batch: int, **kwargs) -> float:
+    """返回每个查询的平均延迟（毫秒）"""
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        index.search(queries[i:i + batch], k=1, **kwargs)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def recall_at_1(exact_results, approx_results) -> float:
+    hits = sum(
+        1 for e, a in zip(exact_results, approx_results) if e and a and e[0][0] == a[0][0]
+    )
+    return hits / max(1, len(exact_results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人脸库索引基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1, help="每次查询的人脸数")
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'规模':>10} {'索引':>14} {'构建(s)':>10} {'延迟(ms/查询)':>14} {'recall@1':>10}")
+    for n in args.sizes:
+        data = make_embeddings(n, args.dim, rng)
+        ids = [str(i) for i in range(n)]
+        # 查询为库内样本加少量噪声
+        picks = rng.choice(n, size=args.queries, replace=False)
+        queries = l2_normalize(data[picks] + 0.02 * rng.standard_normal((args.queries, args.dim), dtype=np.float32))
+
+        start = time.perf_counter()
+        exact = ExactIndex(args.dim)
+        exact.add(ids, data)
+        build = time.perf_counter() - start
+        latency = time_queries(exact, queries, args.batch)
+        exact_results = exact.search(queries, k=1)
+        print(f"{n:>10} {'exact':>14} {build:>10.2f} {latency:>14.3f} {1.0:>10.3f}")
+        del exact
+
+        start = time.perf_counter()
+        ivf = IVFIndex(args.dim, nlist=args.nlist, train_threshold=0)
+        ivf.add(ids, data)
+        build = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            latency = time_queries(ivf, queries, args.batch, nprobe=nprobe)
+            recall = recall_at_1(exact_results, ivf.search(queries, k=1, nprobe=nprobe))
+            print(f"{n:>10} {f'ivf/nprobe={nprobe}':>14} {build:>10.2f} {latency:>14.3f} {recall:>10.3f}")
+        del ivf, data
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+人员信息查询基准测试
+
+在临时数据库中生成人员数据，比较按 face_id 查询人员信息的单次延迟：
+    - legacy：每次查询新建 sqlite3 连接（默认 rollback journal 模式），查询后关闭
+    - pooled：PersonnelService 连接池（WAL 模式 + pragma + 语句缓存）
+每种方式先单线程顺序查询，再在一个写线程持续录入的同时由多个读线程并发查询，
+统计 p50 / p99 延迟；rollback journal 模式下写事务会阻塞读，WAL 模式下不会。
+
+用法：
+    python scripts/benchmark_personnel_db.py [--rows 20000] [--lookups 5000] [--readers 4] [--duration 3]
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# 添加 backend 目录到路径（脚本在 backend/scripts/ 下）
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core.config import settings
+
+
+def create_service(db_path: Path):
+    """在指定数据库文件上创建 PersonnelService（建表迁移与服务一致）"""
+    from app.services.personnel import PersonnelService
+
+    settings.DB_PATH = db_path
+    service = PersonnelService()
+    if not service.initialize_database():
+        raise SystemExit(f"数据库初始化失败: {db_path}")
+    return service
+
+
+def populate(service, rows: int):
+    face_ids = [str(uuid.uuid4()) for _ in range(rows)]
+    conn = service._get_connection()
+    conn.execute("INSERT INTO personnel_categories (name, sort_order) VALUES ('员工', 0)")
+    conn.executemany(
+        "INSERT INTO personnel_info (face_id, name, phone, category_id, photo_path) VALUES (?, ?, ?, 1, ?)",
+        [(face_id, f"人员{i}", f"138{i:08d}", f"/api/v1/faces/{face_id}.jpg") for i, face_id in enumerate(face_ids)],
+    )
+    conn.commit()
+    conn.close()
+    return face_ids
+
+
+def legacy_lookup(db_path: str, face_id: str):
+    """旧实现：每次查询新建连接"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT p.name, p.id_number, p.phone, p.address, p.gender, p.status,
+                   p.photo_path, p.created_at, p.updated_at,
+                   c.name AS category_name
+            FROM personnel_info p
+            LEFT JOIN personnel_categories c ON p.category_id = c.id
+            WHERE p.face_id = ?
+            """,
+            (face_id,),
+        )
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (
+        statistics.median(samples) * 1e6,
+        samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+    )
+
+
+def sequential(lookup, face_ids, lookups: int):
+    samples = []
+    for face_id in random.choices(face_ids, k=lookups):
+        start = time.perf_counter()
+        lookup(face_id)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def concurrent(lookup, writer_conn_factory, face_ids, readers: int, duration: float):
+    """一个写线程以小事务持续插入，readers 个读线程并发查询"""
+    stop = threading.Event()
+    samples, lock = [], threading.Lock()
+
+    def read():
+        local = []
+        while not stop.is_set():
+            face_id = random.choice(face_ids)
+            start = time.perf_counter()
+            lookup(face_id)
+            local.append(time.perf_counter() - start)
+        with lock:
+            samples.extend(local)
+
+    def write():
+        conn = writer_conn_factory()
+        while not stop.is_set():
+            conn.executemany(
+                "INSERT INTO personnel_info (face_id, name) VALUES (?, ?)",
+                [(str(uuid.uuid4()), "新录入") for _ in range(50)],
+            )
+            time.sleep(0.002)  # 事务内模拟录入耗时（写锁持有期间）
+            conn.commit()
+        conn.close()
+
+    threads = [threading.Thread(target=read) for _ in range(readers)] + [threading.Thread(target=write)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return percentiles(samples) + (len(samples) / duration,)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人员信息查询基准测试")
+    parser.add_argument("--rows", type=int, default=20000, help="人员数量")
+    parser.add_argument("--lookups", type=int, default=5000, help="顺序查询次数")
+    parser.add_argument("--readers", type=int, default=4, help="并发查询线程数")
+    parser.add_argument("--duration", type=float, default=3.0, help="并发测试时长（秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # legacy 数据库建表与写入后切回默认的 rollback journal 模式（journal_mode 持久化在数据库文件中）
+        legacy_path = Path(tmp) / "legacy.db"
+        legacy_service = create_service(legacy_path)
+        legacy_ids = populate(legacy_service, args.rows)
+        legacy_service.close()
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        legacy_path = str(legacy_path)
+
+        pooled = create_service(Path(tmp) / "pooled.db")
+        pooled_ids = populate(pooled, args.rows)
+
+        print(f"人员数量: {args.rows}, 顺序查询: {args.lookups} 次, 并发: {args.readers} 读 + 1 写, {args.duration}s\n")
+        print(f"{'方式':>8} {'顺序 p50(us)':>14} {'顺序 p99(us)':>14} {'并发 p50(us)':>14} {'并发 p99(us)':>14} {'并发 查询/s':>12}")
+
+        def legacy(face_id):
+            return legacy_lookup(legacy_path, face_id)
+
+        def legacy_writer():
+            return sqlite3.connect(legacy_path, timeout=30)
+
+        rows = []
+        seq = sequential(legacy, legacy_ids, args.lookups)
+        conc = concurrent(legacy, legacy_writer, legacy_ids, args.readers, args.duration)
+        rows.append(("legacy",) + seq + conc)
+
+        seq = sequential(pooled.get_personnel_by_face_id, pooled_ids, args.lookups)
+        conc = concurrent(pooled.get_personnel_by_face_id, pooled._get_connection, pooled_ids, args.readers, args.duration)
+        rows.append(("pooled",) + seq + conc)
+
+        for name, s50, s99, c50, c99, qps in rows:
+            print(f"{name:>8} {s50:>14.1f} {s99:>14.1f} {c50:>14.1f} {c99:>14.1f} {qps:>12.0f}")
+        print(f"\n顺序查询 p50 降低 {rows[0][1] / rows[1][1]:.1f} 倍，并发查询 p99 降低 {rows[0][4] / rows[1][4]:.1f} 倍")
+        print(f"连接池: {pooled.pool.stats()}")
+        pooled.close()
+
+
+if __name__ == "__main__":
+    main()
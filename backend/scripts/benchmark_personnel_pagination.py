@@ -0,0 +1,93 @@
+"""
+人员列表分页基准测试
+
+在临时数据库中生成大量人员数据，比较人员列表接口（GET /personnel）翻到不同深度时单页的延迟：
+    - page：页码分页，LIMIT/OFFSET 需要先读过前面所有行，且每页都重新 COUNT(*)
+    - cursor：游标分页，从上一页边界行的 (created_at, id) 沿索引读取一页，总数按需返回（短时间缓存）
+游标分页的起点直接取目标页前一行构造，与逐页翻到该页时得到的游标相同。
+
+用法：
+    python scripts/benchmark_personnel_pagination.py [--rows 1000000] [--page-size 20] [--repeat 20]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加 backend 目录到路径（脚本在 backend/scripts/ 下）
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core.config import settings
+from benchmark_personnel_search import populate
+
+
+def measure(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人员列表分页基准测试")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="人员数量")
+    parser.add_argument("--page-size", type=int, default=20, help="每页数量")
+    parser.add_argument("--repeat", type=int, default=20, help="每个深度的查询次数（取中位数）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.DB_PATH = Path(tmp) / "pagination.db"
+        from app.services.personnel import PersonnelService, encode_list_cursor
+        from app.api.v1.endpoints import personnel as endpoint
+
+        service = PersonnelService()
+        service.initialize_database()
+        start = time.perf_counter()
+        populate(service, args.rows)
+        print(f"生成 {args.rows} 条人员数据: {time.perf_counter() - start:.1f}s\n")
+        endpoint.init_services(service, None)
+
+        max_page = args.rows // args.page_size
+        pages = sorted({p for p in (1, 10, 100, 1000, 10000, max_page) if p <= max_page})
+        conn = service._get_connection()
+        loop = asyncio.new_event_loop()
+
+        def run(page=1, cursor=None, with_total=False):
+            return loop.run_until_complete(
+                endpoint.get_personnel_list(
+                    page=page, page_size=args.page_size, name=None, q=None, cursor=cursor, with_total=with_total
+                )
+            )
+
+        print(f"{'页码':>8} {'page(ms)':>10} {'cursor(ms)':>12} {'cursor+总数(ms)':>16}")
+        for page in pages:
+            token = ""
+            if page > 1:
+                row = conn.execute(
+                    "SELECT created_at, id FROM personnel_info ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?",
+                    ((page - 1) * args.page_size - 1,),
+                ).fetchone()
+                token = encode_list_cursor(row["created_at"], row["id"])
+            # 两种分页返回的数据应一致
+            expected = [item["id"] for item in run(page=page)["items"]]
+            actual = [item["id"] for item in run(cursor=token)["items"]]
+            if expected != actual:
+                raise SystemExit(f"第 {page} 页游标分页结果与页码分页不一致")
+
+            page_ms = measure(lambda: run(page=page), args.repeat)
+            cursor_ms = measure(lambda: run(cursor=token), args.repeat)
+            total_ms = measure(lambda: run(cursor=token, with_total=True), args.repeat)
+            print(f"{page:>8} {page_ms:>10.2f} {cursor_ms:>12.2f} {total_ms:>16.2f}")
+        loop.close()
+        conn.close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
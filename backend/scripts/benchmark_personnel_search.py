@@ -0,0 +1,134 @@
+"""
+人员检索基准测试
+
+在临时数据库中生成大量人员数据（中文姓名、身份证号、电话），比较人员列表接口检索的单次延迟：
+    - like：旧实现，name LIKE '%关键词%' 全表扫描 + COUNT(*) 再扫描一次
+    - fts：当前接口（GET /personnel 的 q / name 参数），FTS5 trigram 全文索引，短关键词（少于 3 个字符）退回 LIKE
+
+用法：
+    python scripts/benchmark_personnel_search.py [--rows 1000000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加 backend 目录到路径（脚本在 backend/scripts/ 下）
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core.config import settings
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈"
+GIVEN = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华建国文辉玉兰志强海燕红梅春雨晨曦嘉怡子涵浩然宇轩"
+
+LEGACY_COUNT_SQL = "SELECT COUNT(*) FROM personnel_info WHERE name LIKE ?"
+LEGACY_PAGE_SQL = """
+    SELECT p.id, p.face_id, p.name, p.id_number, p.phone, p.address, p.gender,
+           p.status, p.photo_path, p.created_at, p.updated_at,
+           c.name AS category
+    FROM personnel_info p
+    LEFT JOIN personnel_categories c ON p.category_id = c.id
+    WHERE p.name LIKE ?
+    ORDER BY p.created_at DESC
+    LIMIT 10 OFFSET 0
+"""
+
+
+def populate(service, rows: int, seed: int = 0) -> list:
+    """写入人员数据，返回部分样本行用于构造检索关键词"""
+    rng = random.Random(seed)
+    samples = []
+    conn = service._get_connection()
+    batch = []
+    for i in range(rows):
+        name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))
+        id_number = f"{rng.randint(110000, 659000)}{rng.randint(1950, 2010)}{rng.randint(101, 1231):04d}{i % 10000:04d}"
+        phone = f"1{rng.choice('3578')}{rng.randint(0, 999999999):09d}"
+        batch.append((f"bench-{i}", name, id_number, phone))
+        if i % 1000 == 0:
+            samples.append((name, id_number, phone))
+        if len(batch) == 10000:
+            conn.executemany("INSERT INTO personnel_info (face_id, name, id_number, phone) VALUES (?, ?, ?, ?)", batch)
+            conn.commit()
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO personnel_info (face_id, name, id_number, phone) VALUES (?, ?, ?, ?)", batch)
+        conn.commit()
+    conn.close()
+    return samples
+
+
+def measure(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人员检索基准测试")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="人员数量")
+    parser.add_argument("--repeat", type=int, default=20, help="每个关键词的查询次数（取中位数）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.DB_PATH = Path(tmp) / "search.db"
+        from app.services.personnel import PersonnelService
+        from app.api.v1.endpoints import personnel as endpoint
+
+        service = PersonnelService()
+        service.initialize_database()
+        if not service.search_enabled:
+            raise SystemExit("当前 SQLite 不支持 FTS5 trigram 分词（需要 3.34 及以上版本）")
+        start = time.perf_counter()
+        samples = populate(service, args.rows)
+        print(f"生成 {args.rows} 条人员数据（含全文索引维护）: {time.perf_counter() - start:.1f}s\n")
+        endpoint.init_services(service, None)
+
+        name, id_number, phone = samples[len(samples) // 2]
+        cases = [
+            ("姓名全名", {"name": name}),
+            ("姓名单字", {"name": name[0]}),
+            ("综合-姓名", {"q": name}),
+            ("综合-身份证号片段", {"q": id_number[6:14]}),
+            ("综合-手机号后4位", {"q": phone[-4:]}),
+            ("综合-单字", {"q": name[0]}),
+            ("综合-手机号前3位", {"q": phone[:3]}),
+        ]
+
+        conn = service._get_connection()
+        loop = asyncio.new_event_loop()
+        print(f"{'检索':<16} {'关键词':<14} {'结果数':>8} {'like(ms)':>10} {'fts(ms)':>10}")
+        for label, kwargs in cases:
+            term = next(iter(kwargs.values()))
+
+            def legacy():
+                conn.execute(LEGACY_COUNT_SQL, (f"%{term}%",)).fetchone()
+                conn.execute(LEGACY_PAGE_SQL, (f"%{term}%",)).fetchall()
+
+            def current():
+                return loop.run_until_complete(
+                    endpoint.get_personnel_list(
+                        page=1, page_size=10, name=kwargs.get("name"), q=kwargs.get("q"), cursor=None, with_total=False
+                    )
+                )
+
+            # LIKE 只检索姓名列，身份证号/电话的对比仅供参考
+            legacy_ms = measure(legacy, max(1, args.repeat // 4))
+            total = current()["total"]
+            fts_ms = measure(current, args.repeat)
+            print(f"{label:<16} {term:<14} {total:>8} {legacy_ms:>10.1f} {fts_ms:>10.2f}")
+        loop.close()
+        conn.close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+检测/识别 CPU 核划分基准测试
+
+在给定核数下，按不同的 DETECTION_CPU_SHARE 划分核，让检测与识别（InceptionResnetV1 批量前向）
+按服务端相同的线程预算同时满载运行，统计两者吞吐，并以
+    流水线吞吐 = min(检测 张/s, 识别 人脸/s / 每张人脸数)
+选出最优划分。检测走服务端相同的 DetectionService.detect_faces（模型副本池、缩小检测、裁剪对齐），
+副本数与检测并发数一致；识别网络不加载预训练权重，计算量与正式权重相同，不影响耗时。
+
+用法：
+    python scripts/benchmark_thread_split.py [--cores 16] [--image photo.jpg] [--faces-per-image 2]
+                                             [--shares 0.25,0.375,0.5,0.625,0.75] [--duration 5] [--pin]
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加 backend 目录到路径（脚本在 backend/scripts/ 下）
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import cv2
+import numpy as np
+import torch
+from facenet_pytorch import InceptionResnetV1
+
+from app.core.resources import ExecutionResources, ServiceResources, available_cpus, format_cpu_list
+from app.services.detection import DetectionService
+from app.services.recognition import FACE_IMAGE_SIZE
+
+
+def load_image(path):
+    if path:
+        image = cv2.imread(path)
+        if image is None:
+            raise SystemExit(f"无法读取图像: {path}")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    # 无测试图时使用平滑的合成图像（MTCNN 金字塔各层计算量与真实照片相同）
+    y, x = np.mgrid[0:720, 0:1280]
+    image = np.stack([(x * 0.2) % 255, (y * 0.3) % 255, ((x + y) * 0.1) % 255], axis=-1)
+    return image.astype(np.uint8)
+
+
+def create_detector(replicas: int) -> DetectionService:
+    """按检测并发数创建与服务端相同的检测服务（CPU）"""
+    service = DetectionService(replicas=replicas)
+    service.device = torch.device("cpu")
+    service.initialize()
+    return service
+
+
+def run_service(resources: ServiceResources, work, duration: float):
+    """
+    按服务的线程预算启动 workers 个线程满载执行 work
+
+    Returns:
+        (线程列表, 起跑屏障, 各线程完成的工作量)；主线程到达屏障后各线程同时开始
+    """
+    counts = [0] * resources.workers
+    deadline = time.perf_counter() + duration
+    start = threading.Barrier(resources.workers + 1)
+
+    def loop(i):
+        resources.configure_thread()
+        start.wait()
+        while time.perf_counter() < deadline:
+            counts[i] += work()
+
+    threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(resources.workers)]
+    for t in threads:
+        t.start()
+    return threads, start, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检测/识别 CPU 核划分基准测试")
+    parser.add_argument("--cores", type=int, default=len(available_cpus()), help="参与测试的核数")
+    parser.add_argument("--image", help="测试图像（默认使用合成图像）")
+    parser.add_argument("--faces-per-image", type=float, default=2.0, help="每张图像平均人脸数")
+    parser.add_argument("--batch", type=int, default=8, help="识别每次前向的人脸数")
+    parser.add_argument("--shares", default="0.25,0.375,0.5,0.625,0.75", help="检测分得的核比例")
+    parser.add_argument("--replicas", type=int, default=None, help="识别并发数（默认 RECOGNITION_MODEL_REPLICAS）")
+    parser.add_argument("--detection-workers", type=int, default=None, help="检测并发数（默认按核数自动）")
+    parser.add_argument("--duration", type=float, default=5.0, help="每种划分的测试时长（秒）")
+    parser.add_argument("--pin", action="store_true", help="将线程绑定到各自分得的核")
+    args = parser.parse_args()
+
+    cpus = available_cpus()[: args.cores]
+    shares = [float(s) for s in args.shares.split(",")]
+    print(f"CPU 核: {len(cpus)} ({format_cpu_list(cpus)}), 每张人脸数: {args.faces_per_image}, 识别批大小: {args.batch}")
+
+    image = load_image(args.image)
+    model = InceptionResnetV1().eval()
+    faces = torch.randn(args.batch, 3, FACE_IMAGE_SIZE, FACE_IMAGE_SIZE)
+
+    def embed():
+        with torch.no_grad():
+            model(faces)
+        return args.batch
+
+    # 预热
+    embed()
+
+    print(f"{'检测比例':>8} {'检测核/并发x线程':>16} {'识别核/并发x线程':>16} {'检测 张/s':>10} {'识别 脸/s':>10} {'流水线 张/s':>11}")
+    results = []
+    for share in shares:
+        plan = ExecutionResources.plan(
+            cpus=cpus,
+            detection_share=share,
+            detection_workers=args.detection_workers,
+            recognition_workers=args.replicas,
+            process_workers=1,
+            pinned=args.pin,
+        )
+        det, rec = plan.detection, plan.recognition
+        detector = create_detector(det.workers)
+
+        def detect():
+            detector.detect_faces(image)
+            return 1
+
+        detect()  # 预热
+        det_threads, det_start, det_counts = run_service(det, detect, args.duration)
+        rec_threads, rec_start, rec_counts = run_service(rec, embed, args.duration)
+        det_start.wait()
+        rec_start.wait()
+        for t in det_threads + rec_threads:
+            t.join()
+
+        det_rate = sum(det_counts) / args.duration
+        rec_rate = sum(rec_counts) / args.duration
+        pipeline = min(det_rate, rec_rate / args.faces_per_image)
+        results.append((pipeline, share))
+        print(
+            f"{share:>8.3f} {f'{len(det.cpus)}/{det.workers}x{det.threads_per_worker}':>16} "
+            f"{f'{len(rec.cpus)}/{rec.workers}x{rec.threads_per_worker}':>16} "
+            f"{det_rate:>10.1f} {rec_rate:>10.1f} {pipeline:>11.1f}"
+        )
+
+    best, share = max(results)
+    print(f"\n最优划分: DETECTION_CPU_SHARE={share} (流水线吞吐 {best:.1f} 张/s)")
+
+
+if __name__ == "__main__":
+    main()
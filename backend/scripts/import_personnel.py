@@ -0,0 +1,80 @@
+"""
+批量导入人员脚本
+从照片目录或 ZIP 包 + CSV 清单批量导入人员，输出逐行导入报告
+
+用法：
+    python scripts/import_personnel.py --source photos.zip [--manifest manifest.csv] [--job-id roster-2024]
+                                       [--batch-size 256] [--workers 8] [--report report.json]
+
+CSV 清单列：photo（相对目录/ZIP 的照片路径，必填）, name（必填）, id_number, phone, address, gender,
+category（类别名称，不存在时自动创建）或 category_id。
+中断后使用相同的 --job-id（或相同的清单）重新运行即可断点续传。
+导入完成后需重启服务，使运行中的服务加载新增的人脸特征。
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# 添加 backend 目录到路径（脚本在 backend/scripts/ 下）
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core.config import settings
+from app.services.detection import DetectionService
+from app.services.recognition import RecognitionService
+from app.services.personnel import PersonnelService
+from app.services.enrollment import BulkEnrollmentService
+
+
+def main():
+    import logging
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    logger = logging.getLogger(__name__)
+
+    parser = argparse.ArgumentParser(description="批量导入人员")
+    parser.add_argument("--source", required=True, help="照片目录或 ZIP 包路径")
+    parser.add_argument("--manifest", help="CSV 清单路径，默认读取 source 中的 manifest.csv")
+    parser.add_argument("--job-id", help="导入任务ID（断点续传标识），默认取清单内容哈希")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_IMPORT_BATCH_SIZE, help="每批处理行数")
+    parser.add_argument("--workers", type=int, default=settings.BULK_IMPORT_WORKERS, help="解码与人脸检测进程数")
+    parser.add_argument("--report", help="导入报告输出路径（JSON），默认输出到标准输出")
+    args = parser.parse_args()
+
+    personnel = PersonnelService()
+    if not personnel.initialize_database():
+        return False
+    detection = DetectionService()
+    detection.initialize()
+    recognition = RecognitionService()
+    recognition.initialize()
+
+    enrollment = BulkEnrollmentService(personnel, recognition, detection)
+    try:
+        manifest_text = enrollment.read_manifest(args.source, args.manifest)
+        report = enrollment.import_personnel(
+            args.source, manifest_text, job_id=args.job_id, batch_size=args.batch_size, workers=args.workers
+        )
+    finally:
+        recognition.shutdown()
+
+    logger.info(
+        f"导入完成: job_id={report['job_id']}, 新增 {report['created']} 条, "
+        f"跳过 {report['skipped']} 条, 失败 {report['failed']} 条"
+    )
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        Path(args.report).write_text(output, encoding="utf-8")
+        logger.info(f"导入报告已写入: {args.report}")
+    else:
+        print(output)
+    return report["failed"] == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
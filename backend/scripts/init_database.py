@@ -74,6 +74,18 @@ def create_database():
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_face_id ON personnel_info(face_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_name ON personnel_info(name)")
         
+        # 批量导入日志：记录每个导入任务已完成的行，用于断点续传
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS personnel_import_rows (
+                job_id TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                personnel_id INTEGER,
+                face_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (job_id, row_key)
+            )
+        """)
+        
         conn.commit()
         conn.close()
         
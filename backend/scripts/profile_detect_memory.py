@@ -0,0 +1,126 @@
+"""
+检测请求内存剖析
+对同一张上传图片，比较旧的多拷贝流程与当前单缓冲区流程（解码 -> 检测 -> 对齐）每个请求的内存开销：
+    - tracemalloc：每个请求的 Python/NumPy 分配峰值与分配总量
+    - RSS：进程常驻内存峰值（VmHWM）的增长
+每种流程在独立的子进程中运行，互不影响。
+
+用法：
+    python scripts/profile_detect_memory.py --image photo.jpg [--requests 20]
+"""
+import argparse
+import multiprocessing
+import sys
+import tracemalloc
+from pathlib import Path
+
+# 添加 backend 目录到路径（脚本在 backend/scripts/ 下）
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def read_status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def reset_peak_rss() -> None:
+    """重置 VmHWM（Linux 4.0+），不支持时忽略"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def legacy_request(service, contents: bytes):
+    """旧流程：BGR 原尺寸解码 -> RGB 拷贝 -> PIL 拷贝 -> 检测 -> 裁剪拷贝 -> PIL 对齐"""
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    frame_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    pil_frame = Image.fromarray(frame_rgb)
+    with service._lock:
+        boxes, probs = service.mtcnn.detect(pil_frame)
+    faces = []
+    if boxes is not None:
+        kept = [b for b, p in zip(boxes, probs) if p > service.threshold]
+        for box in kept:
+            x, y, w, h = box.astype(int)
+            faces.append(image[max(0, y):y + h, max(0, x):x + w].copy())
+        if kept:
+            service.mtcnn.extract(pil_frame, np.stack(kept), None)
+    return faces
+
+
+def current_request(service, contents: bytes):
+    """当前流程：原分辨率解码为一份 RGB 缓冲区 -> 缩小图检测 -> 原图视图裁剪与对齐"""
+    from app.utils.image import decode_image_rgb
+
+    image = decode_image_rgb(memoryview(contents))
+    return service.detect_faces(image)
+
+
+def profile(mode: str, image_path: str, requests: int, queue) -> None:
+    from app.services.detection import DetectionService
+
+    contents = Path(image_path).read_bytes()
+    service = DetectionService()
+    service.initialize()
+    run = legacy_request if mode == "legacy" else current_request
+
+    faces = len(run(service, contents))  # 预热（模型首次前向的内存不计入）
+    rss_before = read_status_kb("VmRSS")
+    reset_peak_rss()
+
+    tracemalloc.start()
+    peaks, totals = [], []
+    for _ in range(requests):
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        run(service, contents)
+        _, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().compare_to(snapshot_before, "filename")
+        peaks.append(peak)
+        totals.append(sum(s.size_diff for s in stats if s.size_diff > 0))
+    tracemalloc.stop()
+
+    queue.put({
+        "mode": mode,
+        "faces": faces,
+        "peak_mb": max(peaks) / 2**20,
+        "retained_mb": max(totals) / 2**20,
+        "rss_growth_mb": (read_status_kb("VmHWM") - rss_before) / 1024,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检测请求内存剖析")
+    parser.add_argument("--image", required=True, help="测试图像（建议使用大尺寸 JPEG）")
+    parser.add_argument("--requests", type=int, default=20, help="每种流程的请求数")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    results = []
+    for mode in ("legacy", "current"):
+        proc = ctx.Process(target=profile, args=(mode, args.image, args.requests, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+
+    print(f"{'流程':>8} {'人脸数':>6} {'分配峰值(MB)':>14} {'请求后残留(MB)':>16} {'RSS 峰值增长(MB)':>18}")
+    for r in results:
+        print(f"{r['mode']:>8} {r['faces']:>6} {r['peak_mb']:>14.1f} {r['retained_mb']:>16.1f} {r['rss_growth_mb']:>18.1f}")
+    legacy, current = results
+    if current["peak_mb"]:
+        print(f"\n每请求分配峰值降低 {legacy['peak_mb'] / current['peak_mb']:.1f} 倍")
+
+
+if __name__ == "__main__":
+    main()
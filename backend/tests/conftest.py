@@ -0,0 +1,36 @@
+import pytest
+
+from app.core.config import settings
+
+
+@pytest.fixture
+def personnel_service(monkeypatch, tmp_path):
+    """使用临时数据库的人员服务（已初始化表结构并加载缓存）"""
+    from app.services.personnel import PersonnelService
+
+    monkeypatch.setattr(settings, "DB_PATH", tmp_path / "personnel.db")
+    service = PersonnelService()
+    service.initialize_database()
+    service.warm_cache()
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def insert_personnel(personnel_service):
+    """直接写库插入一条人员记录（不经过接口，不更新缓存），返回人员 ID"""
+
+    def insert(face_id, name, **fields):
+        columns = ["face_id", "name", *fields]
+        conn = personnel_service._get_connection()
+        try:
+            cursor = conn.execute(
+                f"INSERT INTO personnel_info ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                (face_id, name, *fields.values()),
+            )
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    return insert
@@ -0,0 +1,70 @@
+"""批量导入的照片读取（ZIP 包与目录）"""
+import os
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.enrollment import BulkEnrollmentService
+from app.utils.archive import PhotoSource, decode_photo
+
+LIMIT = 64 * 1024
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", LIMIT)
+    ok, photo = cv2.imencode(".jpg", np.full((40, 40, 3), 128, np.uint8))
+    path = tmp_path / "photos.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("manifest.csv", "photo,name\na.jpg,张三\n")
+        zf.writestr("a.jpg", photo.tobytes())
+        # 压缩后只有几 KB、解压后远超上限的成员
+        zf.writestr("bomb.jpg", bytes(64 * LIMIT))
+    return path
+
+
+def open_fds():
+    return {os.readlink(f"/proc/self/fd/{fd}") for fd in os.listdir("/proc/self/fd") if os.path.exists(f"/proc/self/fd/{fd}")}
+
+
+def test_decode_photo_from_zip(archive):
+    with PhotoSource(str(archive)) as photos:
+        image, data, error = decode_photo(photos, "a.jpg")
+    assert error is None and image.shape == (40, 40, 3) and data.startswith(b"\xff\xd8")
+
+
+def test_oversized_member_is_rejected_before_decompressing(archive, monkeypatch):
+    with PhotoSource(str(archive)) as photos:
+        def fail_open(*args, **kwargs):
+            raise AssertionError("超限成员不应被解压")
+
+        monkeypatch.setattr(photos._zip, "open", fail_open)
+        assert decode_photo(photos, "bomb.jpg")[2] == f"照片大小超过限制（最大{LIMIT}字节）"
+        with pytest.raises(ValueError):
+            photos.read("bomb.jpg", LIMIT)
+
+
+def test_missing_member_is_reported(archive):
+    with PhotoSource(str(archive)) as photos:
+        assert decode_photo(photos, "missing.jpg")[2].startswith("读取照片失败")
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="需要 /proc 文件系统")
+def test_read_manifest_closes_archive(archive):
+    service = BulkEnrollmentService(None, None, None)
+    assert service.read_manifest(str(archive)) == "photo,name\na.jpg,张三\n"
+    assert str(archive) not in open_fds()
+
+
+def test_directory_source_rejects_paths_outside_root(tmp_path):
+    (tmp_path / "photos").mkdir()
+    (tmp_path / "secret.jpg").write_bytes(b"x")
+    (tmp_path / "photos" / "big.jpg").write_bytes(bytes(LIMIT + 1))
+    with PhotoSource(str(tmp_path / "photos")) as photos:
+        with pytest.raises(ValueError, match="非法的照片路径"):
+            photos.read("../secret.jpg", LIMIT)
+        with pytest.raises(ValueError):
+            photos.read("big.jpg", LIMIT)
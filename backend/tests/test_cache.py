@@ -0,0 +1,148 @@
+"""检测结果 LRU 缓存与对齐人脸 dHash 特征缓存"""
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from app.services import cache as cache_module
+from app.services.cache import FACE_HASH_SIZE, EmbeddingCache, LRUCache, content_key, face_hash
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=30)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    cache.put("c", 3, 10)
+    assert cache.get("a") == 1
+    cache.put("d", 4, 10)
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == [1, 3, 4]
+    assert cache.bytes == 30
+    assert cache.evictions == 1
+
+
+def test_lru_replacing_key_updates_bytes():
+    cache = LRUCache(max_bytes=100)
+    cache.put("a", 1, 40)
+    cache.put("a", 2, 10)
+    assert cache.get("a") == 2
+    assert cache.bytes == 10
+    assert len(cache) == 1
+
+
+def test_lru_skips_oversized_entry():
+    cache = LRUCache(max_bytes=10)
+    cache.put("a", 1, 5)
+    cache.put("big", 2, 11)
+    assert cache.get("big") is None
+    assert cache.get("a") == 1
+
+
+def test_lru_ttl_expiry(clock):
+    cache = LRUCache(max_bytes=100, ttl=5)
+    cache.put("a", 1, 10)
+    clock[0] += 4
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert cache.invalidations == 1
+    assert cache.bytes == 0
+
+
+def test_lru_generation_invalidation():
+    cache = LRUCache(max_bytes=100)
+    cache.put("a", 1, 10, generation=3)
+    assert cache.get("a", generation=3) == 1
+    # 不校验版本号时照常命中
+    assert cache.get("a") == 1
+    assert cache.get("a", generation=4) is None
+    assert cache.get("a", generation=3) is None
+    assert cache.invalidations == 1
+
+
+def test_lru_stats_and_clear():
+    cache = LRUCache(max_bytes=100, ttl=30)
+    cache.put("a", 1, 10)
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["entries"] == 1 and stats["bytes"] == 10
+    cache.clear()
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+def test_content_key_accepts_memoryview():
+    data = b"\xff\xd8\xff" + bytes(range(200))
+    assert content_key(memoryview(data)) == content_key(data)
+    assert content_key(data) != content_key(data + b"\x00")
+    assert len(content_key(data)) == 32
+
+
+def synthetic_face(seed, size=160):
+    """平滑的随机图案，模拟对齐人脸 [3, 160, 160]，取值在 [-1, 1]"""
+    small = np.random.default_rng(seed).uniform(-1, 1, (8, 8, 3)).astype(np.float32)
+    return cv2.resize(small, (size, size), interpolation=cv2.INTER_CUBIC).clip(-1, 1)
+
+
+def to_tensor(face):
+    return torch.from_numpy(np.ascontiguousarray(face.transpose(2, 0, 1)))
+
+
+def test_face_hash_size_and_determinism():
+    face = to_tensor(synthetic_face(0))
+    key = face_hash(face)
+    assert len(key) == FACE_HASH_SIZE * FACE_HASH_SIZE // 8
+    assert face_hash(face.clone()) == key
+
+
+def hamming(a, b):
+    return int(np.unpackbits(np.frombuffer(a, np.uint8) ^ np.frombuffer(b, np.uint8)).sum())
+
+
+def test_face_hash_stable_under_reencoding():
+    face = synthetic_face(1)
+    # 模拟重新编码：量化到 8 位、JPEG 压缩后再解码
+    pixels = ((face + 1) * 127.5).astype(np.uint8)
+    ok, jpeg = cv2.imencode(".jpg", pixels, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    assert ok
+    reencoded = cv2.imdecode(jpeg, cv2.IMREAD_UNCHANGED).astype(np.float32) / 127.5 - 1
+    # 整体亮度、对比度变化不改变相邻像素的明暗关系
+    brighter = face * 0.8 + 0.1
+    key = face_hash(to_tensor(face))
+    assert hamming(key, face_hash(to_tensor(reencoded))) <= 8
+    assert face_hash(to_tensor(brighter)) == key
+
+
+def test_face_hash_distinguishes_faces():
+    keys = {face_hash(to_tensor(synthetic_face(seed))) for seed in range(20)}
+    assert len(keys) == 20
+
+
+def test_embedding_cache_round_trip():
+    cache = EmbeddingCache(max_bytes=4096)
+    key = face_hash(to_tensor(synthetic_face(2)))
+    vec = np.random.default_rng(0).standard_normal(512).astype(np.float32)
+    assert cache.get(key) is None
+    cache.put(key, vec)
+    assert np.array_equal(cache.get(key), vec)
+    stats = cache.stats()
+    assert stats["bytes"] == vec.nbytes + len(key)
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_embedding_cache_respects_capacity():
+    vec = np.zeros(512, dtype=np.float32)
+    cache = EmbeddingCache(max_bytes=2 * (vec.nbytes + 32))
+    for i in range(3):
+        cache.put(bytes([i]) * 32, vec)
+    assert cache.get(bytes([0]) * 32) is None
+    assert cache.get(bytes([2]) * 32) is not None
@@ -0,0 +1,75 @@
+"""WebSocket 检测会话的人员信息缓存与错误处理"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.v1.endpoints import detect
+from app.services.stream import FaceTrack
+
+
+def make_track(track_id, face_id):
+    track = FaceTrack(track_id, {"x": 0, "y": 0, "w": 10, "h": 10}, 0)
+    track.identity = (face_id, 0.9)
+    track.candidates = [(face_id, 0.9)]
+    return track
+
+
+def test_evicts_least_recently_seen_and_keeps_active_tracks(monkeypatch):
+    monkeypatch.setattr(detect, "WS_PERSON_CACHE_SIZE", 3)
+    session = detect._DetectSession(websocket=None)
+
+    session.tracker.tracks = [make_track(1, "a")]
+    session.remember_personnel({"a": "A"})
+    session.tracker.tracks = [make_track(1, "a"), make_track(2, "b")]
+    session.remember_personnel({"b": "B"})
+    session.tracker.tracks = [make_track(1, "a"), make_track(3, "c")]
+    session.remember_personnel({"c": "C"})
+    session.tracker.tracks = [make_track(1, "a"), make_track(4, "d")]
+    session.remember_personnel({"d": "D"})
+
+    # b 最久未出现被淘汰，a 一直在轨迹中保留
+    assert list(session.person_infos) == ["c", "a", "d"]
+
+
+def test_active_entries_may_exceed_limit(monkeypatch):
+    monkeypatch.setattr(detect, "WS_PERSON_CACHE_SIZE", 2)
+    session = detect._DetectSession(websocket=None)
+    session.tracker.tracks = [make_track(i, face_id) for i, face_id in enumerate("abc")]
+    session.remember_personnel({"a": "A", "b": "B", "c": "C"})
+    assert set(session.person_infos) == {"a", "b", "c"}
+
+    session.tracker.tracks = [make_track(0, "a")]
+    session.remember_personnel({})
+    assert list(session.person_infos) == ["c", "a"]
+
+
+class FailingDetection:
+    def detect_faces(self, image, max_side=None):
+        raise RuntimeError("模型推理失败")
+
+
+def test_detection_error_is_reported_and_closes_connection(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(detect, "detection_service", FailingDetection())
+    monkeypatch.setattr(detect, "recognition_service", object())
+    monkeypatch.setattr(detect, "personnel_service", object())
+    monkeypatch.setattr(detect, "_executor", executor)
+    monkeypatch.setattr(detect, "decode_image_rgb", lambda data: np.zeros((64, 64, 3), dtype=np.uint8))
+    app = FastAPI()
+    app.include_router(detect.router)
+
+    try:
+        with TestClient(app).websocket_connect("/ws/detect") as websocket:
+            assert websocket.receive_json()["type"] == "config"
+            websocket.send_bytes(b"frame")
+            error = websocket.receive_json()
+            assert error["type"] == "error" and error["frame"] == 1 and "模型推理失败" in error["detail"]
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+            assert exc_info.value.code == 1011
+    finally:
+        executor.shutdown()
@@ -0,0 +1,68 @@
+"""检测服务的模型副本池"""
+import threading
+
+import numpy as np
+import torch
+
+from app.services import detection as detection_module
+from app.services.detection import DetectionService
+
+
+class FakeMTCNN:
+    pnet = rnet = onet = None
+    thresholds = [0.6, 0.7, 0.7]
+    device = torch.device("cpu")
+
+
+def make_service(replicas):
+    service = DetectionService(replicas=replicas)
+    service.mtcnn = FakeMTCNN()
+    service._create_replicas(service.replicas, torch.device("cpu"))
+    return service
+
+
+def test_detections_run_concurrently_up_to_replicas(monkeypatch):
+    service = make_service(2)
+    # 两个检测必须同时进入 detect_face 才能通过屏障
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_detect_face(frames, *args):
+        barrier.wait()
+        return [np.zeros((0, 5))] * len(frames), None
+
+    monkeypatch.setattr(detection_module, "detect_face", fake_detect_face)
+    frames = np.zeros((1, 32, 32, 3), dtype=np.uint8)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(service._run_detector(frames, 12, 0.7))) for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 2 and not barrier.broken
+    assert service._replicas.qsize() == 2
+
+
+def test_single_replica_serializes(monkeypatch):
+    service = make_service(1)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_detect_face(frames, *args):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        threading.Event().wait(0.02)
+        with lock:
+            active[0] -= 1
+        return [np.zeros((0, 5))] * len(frames), None
+
+    monkeypatch.setattr(detection_module, "detect_face", fake_detect_face)
+    frames = np.zeros((1, 32, 32, 3), dtype=np.uint8)
+    threads = [threading.Thread(target=service._run_detector, args=(frames, 12, 0.7)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 1
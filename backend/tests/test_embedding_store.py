@@ -0,0 +1,204 @@
+"""人脸特征持久化存储"""
+import os
+
+import numpy as np
+import pytest
+
+from app.services import embedding_store
+from app.services.embedding_store import EmbeddingStore
+
+FINGERPRINT = {"model": "test", "image_size": 160}
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    faces_dir = tmp_path / "faces"
+    store_dir = tmp_path / "embeddings"
+    faces_dir.mkdir()
+    return store_dir, faces_dir
+
+
+def write_photo(faces_dir, face_id, content=b""):
+    path = faces_dir / f"{face_id}.jpg"
+    path.write_bytes(content or face_id.encode())
+    return path
+
+
+def vector_for(face_id, dim=8):
+    rng = np.random.default_rng(sum(face_id.encode()))
+    return rng.standard_normal(dim).astype(np.float32)
+
+
+class Embedder:
+    """记录调用过的照片，no_face 中的照片返回 None"""
+
+    def __init__(self, no_face=()):
+        self.calls = []
+        self.no_face = set(no_face)
+
+    def __call__(self, path):
+        self.calls.append(path.stem)
+        if path.stem in self.no_face:
+            return None
+        return vector_for(path.stem)
+
+
+def as_dict(snapshot):
+    face_ids, _, matrix = snapshot
+    return {face_id: np.array(matrix[row]) for row, face_id in enumerate(face_ids)}
+
+
+def test_round_trip_reuses_stored_vectors(dirs):
+    store_dir, faces_dir = dirs
+    for face_id in ("a", "b", "c"):
+        write_photo(faces_dir, face_id)
+
+    embedder = Embedder()
+    first = as_dict(EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(embedder))
+    assert sorted(embedder.calls) == ["a", "b", "c"]
+
+    embedder = Embedder()
+    second = as_dict(EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(embedder))
+    assert embedder.calls == []
+    assert second.keys() == first.keys()
+    for face_id, vec in first.items():
+        np.testing.assert_array_equal(second[face_id], vec)
+        np.testing.assert_array_equal(vec, vector_for(face_id))
+
+
+def test_changed_and_removed_photos(dirs):
+    store_dir, faces_dir = dirs
+    for face_id in ("a", "b"):
+        write_photo(faces_dir, face_id)
+    EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(Embedder())
+
+    write_photo(faces_dir, "a", b"new content of a")
+    (faces_dir / "b.jpg").unlink()
+    embedder = Embedder()
+    face_ids, _, _ = EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(embedder)
+    assert embedder.calls == ["a"]
+    assert face_ids == ["a"]
+
+
+def test_fingerprint_change_rebuilds(dirs):
+    store_dir, faces_dir = dirs
+    write_photo(faces_dir, "a")
+    EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(Embedder())
+
+    embedder = Embedder()
+    EmbeddingStore(store_dir, faces_dir, {**FINGERPRINT, "image_size": 112}).sync(embedder)
+    assert embedder.calls == ["a"]
+
+
+def test_no_face_photos_are_not_redetected(dirs):
+    store_dir, faces_dir = dirs
+    write_photo(faces_dir, "a")
+    write_photo(faces_dir, "blank")
+
+    face_ids, _, _ = EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(Embedder(no_face={"blank"}))
+    assert face_ids == ["a"]
+
+    embedder = Embedder(no_face={"blank"})
+    face_ids, _, _ = EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(embedder)
+    assert embedder.calls == []
+    assert face_ids == ["a"]
+
+    # 照片更换后重新检测
+    write_photo(faces_dir, "blank", b"now with a face")
+    embedder = Embedder()
+    face_ids, _, _ = EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(embedder)
+    assert embedder.calls == ["blank"]
+    assert sorted(face_ids) == ["a", "blank"]
+
+
+def test_embed_errors_are_retried(dirs):
+    store_dir, faces_dir = dirs
+    write_photo(faces_dir, "a")
+
+    def failing(path):
+        raise RuntimeError("device busy")
+
+    assert EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(failing)[0] == []
+    embedder = Embedder()
+    EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(embedder)
+    assert embedder.calls == ["a"]
+
+
+def test_crash_before_index_commit_keeps_previous_mapping(dirs, monkeypatch):
+    store_dir, faces_dir = dirs
+    for face_id in ("a", "b"):
+        write_photo(faces_dir, face_id)
+    EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(Embedder())
+
+    # 行数不变、内容与顺序改变：移除 a，新增 c
+    store = EmbeddingStore(store_dir, faces_dir, FINGERPRINT)
+    store.sync(Embedder())
+    store.discard("a")
+    store.put("c", write_photo(faces_dir, "c"), vector_for("c"))
+
+    replace = os.replace
+
+    def crash(src, dst):
+        if os.path.basename(dst) == embedding_store.INDEX_FILE:
+            raise OSError("simulated crash")
+        replace(src, dst)
+
+    # 新矩阵文件已写出，索引替换前崩溃
+    monkeypatch.setattr(embedding_store.os, "replace", crash)
+    store.flush()
+    monkeypatch.undo()
+
+    reloaded = EmbeddingStore(store_dir, faces_dir, FINGERPRINT)
+    reloaded._load()
+    vectors = as_dict(reloaded.snapshot())
+    assert sorted(vectors) == ["a", "b"]
+    for face_id, vec in vectors.items():
+        np.testing.assert_array_equal(vec, vector_for(face_id))
+
+
+def test_orphan_matrix_is_ignored_and_cleaned_up(dirs):
+    store_dir, faces_dir = dirs
+    for face_id in ("a", "b"):
+        write_photo(faces_dir, face_id)
+    EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(Embedder())
+
+    # 写入中途崩溃留下的矩阵文件：行数相同但内容不同
+    orphan = store_dir / "embeddings-orphan.npy"
+    np.save(orphan, np.stack([vector_for("b"), vector_for("a")]))
+
+    store = EmbeddingStore(store_dir, faces_dir, FINGERPRINT)
+    vectors = as_dict(store.sync(Embedder()))
+    for face_id, vec in vectors.items():
+        np.testing.assert_array_equal(vec, vector_for(face_id))
+
+    write_photo(faces_dir, "c")
+    store.sync(Embedder())
+    matrices = sorted(p.name for p in store_dir.glob("embeddings*.npy"))
+    assert len(matrices) == 1 and matrices[0] != orphan.name
+
+
+def test_reconcile_keeps_no_face_entries(dirs):
+    store_dir, faces_dir = dirs
+    write_photo(faces_dir, "a")
+    write_photo(faces_dir, "blank")
+    EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(Embedder(no_face={"blank"}))
+
+    write_photo(faces_dir, "d")
+    EmbeddingStore(store_dir, faces_dir, FINGERPRINT).reconcile(
+        ["a", "d"], [faces_dir / "a.jpg", faces_dir / "d.jpg"], np.stack([vector_for("a"), vector_for("d")])
+    )
+
+    embedder = Embedder()
+    face_ids, _, _ = EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(embedder)
+    assert embedder.calls == []
+    assert sorted(face_ids) == ["a", "d"]
+
+
+def test_only_no_face_photos(dirs):
+    store_dir, faces_dir = dirs
+    write_photo(faces_dir, "blank")
+    assert EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(Embedder(no_face={"blank"})) == ([], [], None)
+
+    embedder = Embedder()
+    assert EmbeddingStore(store_dir, faces_dir, FINGERPRINT).sync(embedder) == ([], [], None)
+    assert embedder.calls == []
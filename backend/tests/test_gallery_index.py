@@ -0,0 +1,128 @@
+"""人脸库检索索引"""
+import numpy as np
+import pytest
+
+from app.services.gallery_index import ExactIndex, GalleryIndex, IVFIndex, create_gallery_index, l2_normalize
+
+DIM = 16
+
+
+def random_vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def make_index(kind):
+    if kind == "exact":
+        return ExactIndex(DIM)
+    if kind == "ivf":
+        # 训练阈值调低，使测试数据量下也会训练粗量化器
+        return IVFIndex(DIM, nlist=4, nprobe=4, train_threshold=40)
+    return IVFIndex(DIM, nlist=4, nprobe=4, train_threshold=10**6)
+
+
+@pytest.fixture(params=["exact", "ivf", "ivf-untrained"])
+def index(request):
+    return make_index(request.param)
+
+
+def test_gallery_index_is_abstract():
+    with pytest.raises(TypeError):
+        GalleryIndex()
+
+
+def test_create_gallery_index():
+    assert isinstance(create_gallery_index("exact", dim=DIM), ExactIndex)
+    assert isinstance(create_gallery_index("IVF", dim=DIM, nlist=2), IVFIndex)
+    with pytest.raises(ValueError):
+        create_gallery_index("hnsw")
+
+
+def test_search_returns_exact_match_first(index):
+    vecs = random_vectors(100)
+    face_ids = [f"f{i}" for i in range(100)]
+    index.add(face_ids, vecs)
+    assert len(index) == 100
+
+    results = index.search(vecs[[3, 42, 99]], k=3)
+    assert [hits[0][0] for hits in results] == ["f3", "f42", "f99"]
+    for hits in results:
+        assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+        scores = [score for _, score in hits]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_search_scores_are_cosine_similarity(index):
+    vecs = random_vectors(50)
+    index.add([f"f{i}" for i in range(50)], vecs)
+    query = random_vectors(1, seed=7)
+    expected = (l2_normalize(vecs) @ l2_normalize(query)[0]).max()
+    # nprobe == nlist 时 IVF 检索全部簇，结果与精确检索一致
+    assert index.search(query, k=1)[0][0][1] == pytest.approx(float(expected), abs=1e-5)
+
+
+def test_add_overwrites_existing_face_id(index):
+    vecs = random_vectors(60)
+    index.add([f"f{i}" for i in range(60)], vecs)
+    index.add(["f0"], vecs[1:2])
+    assert len(index) == 60
+    assert index.search(vecs[0:1], k=1)[0][0][0] != "f0"
+    assert {face_id for face_id, _ in index.search(vecs[1:2], k=2)[0]} == {"f0", "f1"}
+
+
+def test_remove(index):
+    vecs = random_vectors(60)
+    index.add([f"f{i}" for i in range(60)], vecs)
+    assert index.remove("f10")
+    assert not index.remove("f10")
+    assert "f10" not in index and len(index) == 59
+    assert all(face_id != "f10" for face_id, _ in index.search(vecs[10:11], k=59)[0])
+    # 被删除行移动后，其余向量仍能检索到
+    assert index.search(vecs[59:60], k=1)[0][0][0] == "f59"
+
+
+def test_duplicate_face_ids_in_one_batch(index):
+    vecs = random_vectors(60)
+    face_ids = [f"f{i}" for i in range(59)] + ["f0"]
+    index.add(face_ids, vecs)
+    assert len(index) == 59
+    # 以最后一次为准
+    assert index.search(vecs[59:60], k=1)[0][0][0] == "f0"
+
+    assert index.remove("f0")
+    assert all(face_id != "f0" for face_id, _ in index.search(vecs, k=60)[0])
+    total = sum(len(hits) for hits in index.search(vecs[:1], k=100))
+    assert total == 58
+
+
+def test_empty_index():
+    index = ExactIndex(DIM)
+    assert index.search(random_vectors(2), k=3) == [[], []]
+
+
+def test_ivf_trains_and_keeps_recall():
+    index = IVFIndex(DIM, nlist=4, nprobe=1, train_threshold=40)
+    vecs = random_vectors(200)
+    index.add([f"f{i}" for i in range(200)], vecs)
+    assert index.is_trained
+    # 查询自身向量时，所在簇一定是最近的簇
+    assert [hits[0][0] for hits in index.search(vecs[:20], k=1)] == [f"f{i}" for i in range(20)]
+
+
+def test_ivf_duplicate_face_id_across_clusters():
+    index = IVFIndex(DIM, nlist=4, nprobe=4, train_threshold=40)
+    vecs = random_vectors(100)
+    index.add([f"f{i}" for i in range(100)], vecs)
+    assert index.is_trained
+
+    # 两个落在不同簇的向量使用同一个 face_id
+    candidates = l2_normalize(random_vectors(50, seed=1))
+    lists = index._nearest_list(candidates)
+    first = 0
+    second = int(np.nonzero(lists != lists[first])[0][0])
+    index.add(["dup", "dup"], candidates[[first, second]])
+    assert len(index) == 101
+    assert sum(len(lst) for lst in index._lists) == 101
+
+    assert index.remove("dup")
+    assert sum(len(lst) for lst in index._lists) == 100
+    assert all(face_id != "dup" for hits in index.search(candidates[[first, second]], k=100) for face_id, _ in hits)
@@ -0,0 +1,37 @@
+"""上传图像解码"""
+import logging
+
+import cv2
+import numpy as np
+
+from app.utils.image import decode_image_rgb
+
+
+def encode(image, ext):
+    ok, buffer = cv2.imencode(ext, image)
+    assert ok
+    return buffer.tobytes()
+
+
+def test_decode_jpeg_keeps_full_resolution():
+    # 大图也按原分辨率解码，裁剪对齐不受检测分辨率影响
+    bgr = np.zeros((3000, 4000, 3), dtype=np.uint8)
+    image = decode_image_rgb(encode(bgr, ".jpg"))
+    assert image.shape == (3000, 4000, 3)
+
+
+def test_decode_converts_to_rgb():
+    bgr = np.zeros((32, 32, 3), dtype=np.uint8)
+    bgr[..., 0] = 255
+    image = decode_image_rgb(memoryview(encode(bgr, ".png")))
+    assert image[0, 0].tolist() == [0, 0, 255]
+
+
+def test_decode_invalid_bytes_returns_none():
+    assert decode_image_rgb(b"not an image") is None
+
+
+def test_decode_error_is_logged(caplog):
+    with caplog.at_level(logging.ERROR, logger="app.utils.image"):
+        assert decode_image_rgb(b"") is None
+    assert any(record.exc_info for record in caplog.records)
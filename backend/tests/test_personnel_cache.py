@@ -0,0 +1,71 @@
+"""人员信息缓存（含负缓存）"""
+from app.core.config import settings
+from app.services import personnel as personnel_module
+from app.services.personnel_cache import PersonnelCache
+
+
+def count_queries(monkeypatch):
+    calls = []
+    original = personnel_module._select_by_face_ids
+
+    def counting(cursor, sql, face_ids):
+        calls.append(list(face_ids))
+        return original(cursor, sql, face_ids)
+
+    monkeypatch.setattr(personnel_module, "_select_by_face_ids", counting)
+    return calls
+
+
+def test_cache_fill_does_not_overwrite_newer_writes():
+    cache = PersonnelCache()
+    cache.load([], {})
+    cache.put("a", {"name": "新记录", "category_id": None})
+    cache.fill({"a": {"name": "旧记录", "category_id": None}}, ["a", "b"])
+    assert cache.get("a")["name"] == "新记录"
+    assert "b" in cache and cache.get("b") is None
+    # 写接口写入后覆盖负缓存
+    cache.put("b", {"name": "乙", "category_id": None})
+    assert cache.get("b")["name"] == "乙"
+    cache.discard("b")
+    assert "b" not in cache
+
+
+def test_misses_are_cached_negatively(personnel_service, monkeypatch):
+    calls = count_queries(monkeypatch)
+    assert personnel_service.get_personnel_by_face_ids(["unknown"]) == {}
+    assert personnel_service.get_personnel_by_face_ids(["unknown"]) == {}
+    assert calls == [["unknown"]]
+    stats = personnel_service.cache.stats()
+    assert stats["missing"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_misses_found_in_database_are_cached(personnel_service, insert_personnel, monkeypatch):
+    # 其他进程写入、本进程缓存中没有的记录
+    insert_personnel("f1", "张三")
+    calls = count_queries(monkeypatch)
+    assert personnel_service.get_personnel_by_face_ids(["f1", "f2"])["f1"]["name"] == "张三"
+    result = personnel_service.get_personnel_by_face_ids(["f1", "f2"])
+    assert list(result) == ["f1"]
+    assert calls == [["f1", "f2"]]
+
+
+def test_write_through_replaces_negative_entry(personnel_service, insert_personnel):
+    assert personnel_service.get_personnel_by_face_id("f1") is None
+    insert_personnel("f1", "张三")
+    # 写接口写库成功后同步更新缓存
+    personnel_service.refresh_personnel(["f1"])
+    assert personnel_service.get_personnel_by_face_id("f1")["name"] == "张三"
+    personnel_service.evict_personnel("f1")
+    assert "f1" not in personnel_service.cache
+
+
+def test_reload_clears_negative_entries(personnel_service, insert_personnel, monkeypatch):
+    assert personnel_service.get_personnel_by_face_id("f1") is None
+    insert_personnel("f1", "张三")
+    assert personnel_service.get_personnel_by_face_id("f1") is None
+
+    monkeypatch.setattr(settings, "PERSONNEL_CACHE_RELOAD_INTERVAL", 1)
+    personnel_service.cache.loaded_at -= 10
+    assert personnel_service.get_personnel_by_face_id("f1")["name"] == "张三"
+    assert personnel_service.cache.stats()["missing"] == 0
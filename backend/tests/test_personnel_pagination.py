@@ -0,0 +1,97 @@
+"""人员列表游标分页"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.endpoints import personnel as endpoint
+from app.services.personnel import decode_list_cursor, encode_list_cursor
+
+PAGE_SIZE = 4
+
+
+def list_personnel(**kwargs):
+    params = dict(page=1, page_size=PAGE_SIZE, name=None, q=None, status=None, cursor=None, with_total=False)
+    params.update(kwargs)
+    return asyncio.run(endpoint.get_personnel_list(**params))
+
+
+def ids(result):
+    return [item["face_id"] for item in result["items"]]
+
+
+@pytest.fixture
+def people(personnel_service, insert_personnel):
+    """15 人，其中多人录入时间相同（批量导入），按 (created_at, id) 倒序的期望顺序"""
+    created = []
+    for i in range(15):
+        # 每 4 人共用同一录入时间
+        insert_personnel(f"f{i:02d}", f"人员{i:02d}", created_at=f"2024-01-01 00:00:{i // 4:02d}")
+        created.append(f"f{i:02d}")
+    endpoint.init_services(personnel_service, None)
+    return list(reversed(created))
+
+
+def test_cursor_round_trip():
+    token = encode_list_cursor("2024-01-01 00:00:00", 42, "prev")
+    assert decode_list_cursor(token) == ("2024-01-01 00:00:00", 42, "prev")
+    with pytest.raises(ValueError):
+        decode_list_cursor("not-a-cursor")
+
+
+def test_forward_pages_match_offset_pages(people):
+    pages = []
+    result = list_personnel(cursor="")
+    assert result["prev_cursor"] is None
+    while True:
+        pages.append(ids(result))
+        if result["next_cursor"] is None:
+            break
+        result = list_personnel(cursor=result["next_cursor"])
+
+    assert [face_id for page in pages for face_id in page] == people
+    assert pages == [ids(list_personnel(page=n)) for n in range(1, len(pages) + 1)]
+
+
+def test_backward_pages_retrace_forward_pages(people):
+    forward = [list_personnel(cursor="")]
+    while forward[-1]["next_cursor"]:
+        forward.append(list_personnel(cursor=forward[-1]["next_cursor"]))
+
+    backward = [forward[-1]]
+    while backward[-1]["prev_cursor"]:
+        backward.append(list_personnel(cursor=backward[-1]["prev_cursor"]))
+
+    assert [ids(page) for page in reversed(backward)] == [ids(page) for page in forward]
+    # 回到第一页后不再有上一页，且可以重新向后翻
+    assert backward[-1]["prev_cursor"] is None
+    assert ids(list_personnel(cursor=backward[-1]["next_cursor"])) == ids(forward[1])
+
+
+def test_cursor_pages_with_search(people):
+    result = list_personnel(q="人员0", cursor="")
+    collected = ids(result)
+    while result["next_cursor"]:
+        result = list_personnel(q="人员0", cursor=result["next_cursor"])
+        collected += ids(result)
+    assert collected == [face_id for face_id in people if face_id.startswith("f0")]
+
+
+def test_invalid_cursor_is_rejected(people):
+    with pytest.raises(HTTPException) as exc_info:
+        list_personnel(cursor="bogus")
+    assert exc_info.value.status_code == 400
+
+
+def test_total_is_cached_until_a_write(people, personnel_service, insert_personnel):
+    assert list_personnel(cursor="", with_total=True)["total"] == 15
+    assert list_personnel(cursor="")["total"] is None
+
+    insert_personnel("new", "新人员")
+    # 检测接口的人员信息查询（读路径）不清空总数缓存
+    personnel_service.get_personnel_by_face_ids(["new", "unknown"])
+    assert list_personnel(cursor="", with_total=True)["total"] == 15
+
+    # 写接口写库成功后清空
+    personnel_service.invalidate_counts()
+    assert list_personnel(cursor="", with_total=True)["total"] == 16
@@ -0,0 +1,92 @@
+"""人员列表检索（FTS5 trigram 全文索引与短关键词）"""
+import asyncio
+
+import pytest
+
+from app.api.v1.endpoints import personnel as endpoint
+
+PEOPLE = [
+    ("f1", "王小明", "110101199001011234", "13800001111"),
+    ("f2", "小明", "110101199202022345", "13900002222"),
+    ("f3", "李明华", "310101198503033456", "13712345678"),
+    ("f4", "张伟", "440101197704044567", "15000003333"),
+]
+
+
+def search(q=None, name=None, **kwargs):
+    params = dict(page=1, page_size=100, name=name, q=q, status=None, cursor=None, with_total=False)
+    params.update(kwargs)
+    result = asyncio.run(endpoint.get_personnel_list(**params))
+    return sorted(item["face_id"] for item in result["items"])
+
+
+@pytest.fixture(params=[True, False], ids=["fts", "like"])
+def people(request, personnel_service, insert_personnel):
+    for face_id, name, id_number, phone in PEOPLE:
+        insert_personnel(face_id, name, id_number=id_number, phone=phone)
+    if not request.param:
+        personnel_service.search_enabled = False
+    elif not personnel_service.search_enabled:
+        pytest.skip("当前 SQLite 不支持 FTS5 trigram 分词")
+    endpoint.init_services(personnel_service, None)
+    return personnel_service
+
+
+@pytest.mark.parametrize(
+    "q, expected",
+    [
+        ("王小明", ["f1"]),
+        ("小明", ["f1", "f2"]),
+        ("明", ["f1", "f2", "f3"]),
+        ("3101", ["f3"]),
+        ("12345678", ["f3"]),
+        ("1111", ["f1"]),
+        # 短关键词同样检索身份证号与电话
+        ("33", ["f3", "f4"]),
+        ("15", ["f4"]),
+        ("不存在", []),
+    ],
+)
+def test_q_matches_substrings_in_all_columns(people, q, expected):
+    assert search(q=q) == expected
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("李明华", ["f3"]),
+        ("小明", ["f1", "f2"]),
+        ("明", ["f1", "f2", "f3"]),
+        ("1380", []),
+        ("13", []),
+    ],
+)
+def test_name_matches_only_names(people, name, expected):
+    assert search(name=name) == expected
+
+
+def test_q_and_name_combine(people):
+    assert search(q="明", name="王小明") == ["f1"]
+    assert search(q="13800001111", name="明") == ["f1"]
+
+
+def test_short_terms_page_newest_first(people):
+    result = asyncio.run(
+        endpoint.get_personnel_list(page=1, page_size=2, name=None, q="明", status=None, cursor=None, with_total=False)
+    )
+    assert result["total"] == 3
+    assert [item["face_id"] for item in result["items"]] == ["f3", "f2"]
+
+
+def test_index_follows_updates_and_deletes(people):
+    conn = people._get_connection()
+    try:
+        conn.execute("UPDATE personnel_info SET name = '王大明' WHERE face_id = 'f1'")
+        conn.execute("DELETE FROM personnel_info WHERE face_id = 'f2'")
+        conn.commit()
+    finally:
+        conn.close()
+    assert search(q="王大明") == ["f1"]
+    assert search(q="王小明") == []
+    assert search(q="小明") == []
+    assert search(q="13900002222") == []
@@ -0,0 +1,18 @@
+"""执行资源规划与实际启动的进程数"""
+from app.core.config import WORKERS_ENV, settings
+from app.core.resources import ExecutionResources
+
+
+def test_process_workers_follow_launcher_not_api_workers(monkeypatch):
+    monkeypatch.setattr(settings, "API_WORKERS", 4)
+    monkeypatch.delenv(WORKERS_ENV, raising=False)
+    # 未经 run.py 启动（如 main.py 直接运行）时为单进程，独占全部核
+    assert settings.PROCESS_WORKERS == 1
+    single = ExecutionResources.plan(cpus=list(range(8)), pinned=False)
+
+    monkeypatch.setenv(WORKERS_ENV, "4")
+    assert settings.PROCESS_WORKERS == 4
+    shared = ExecutionResources.plan(cpus=list(range(8)), pinned=False)
+
+    assert (single.process_workers, len(single.cpus)) == (1, 8)
+    assert (shared.process_workers, len(shared.cpus)) == (4, 2)
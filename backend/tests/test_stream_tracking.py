@@ -0,0 +1,156 @@
+"""视频流的人脸跟踪、自适应抽帧与轨迹复核"""
+import numpy as np
+import pytest
+
+from app.services.stream import BoxKalmanFilter, FaceTracker, StreamProcessor, box_iou
+
+FRAME = np.zeros((8, 8, 3), dtype=np.uint8)
+
+
+def face(x, y, w=100, h=100):
+    return {"x": x, "y": y, "w": w, "h": h, "confidence": 0.99, "face_img": FRAME}
+
+
+class FakeScene:
+    """按帧号给出检测结果的假检测/识别服务，记录识别调用"""
+
+    def __init__(self, faces_at, identity_at=lambda frame_index: "p1"):
+        self.faces_at = faces_at
+        self.identity_at = identity_at
+        self.frame_index = 0
+        self.match_calls = []
+
+    def detect_faces(self, frame):
+        return self.faces_at(self.frame_index)
+
+    def match_faces(self, faces):
+        self.match_calls.append((self.frame_index, len(faces)))
+        return [[(self.identity_at(self.frame_index), 0.9)] for _ in faces]
+
+
+def make_processor(scene, recognition_interval=30, max_stride=8):
+    return StreamProcessor(
+        "s1", "clip.mp4", scene.detect_faces, scene.match_faces,
+        best_match=lambda candidates: candidates[0] if candidates else None,
+        lookup_personnel=lambda face_id: {"name": face_id},
+        recognition_interval=recognition_interval,
+        max_stride=max_stride,
+    )
+
+
+def play(processor, scene, frames):
+    """按 StreamProcessor._run 的抽帧方式处理 frames 帧"""
+    skipped = 0
+    for frame_index in range(frames):
+        processor.frames_read += 1
+        if skipped + 1 < processor.stride:
+            skipped += 1
+            continue
+        skipped = 0
+        scene.frame_index = frame_index
+        processor._process_frame(FRAME, frame_index)
+
+
+def test_tracker_keeps_ids_by_iou_and_drops_lost_tracks():
+    tracker = FaceTracker(max_misses=2)
+    first = tracker.update([face(0, 0), face(300, 0)], 0)
+    ids = [t.track_id for t in first]
+    assert ids == [1, 2] and tracker.new_tracks == 2
+
+    # 轻微移动仍关联到原轨迹，远处的新检测框建立新轨迹
+    matched = tracker.update([face(305, 2), face(4, 3), face(600, 300)], 1)
+    assert {t.track_id: (t.face["x"], t.face["y"]) for t in matched} == {1: (4, 3), 2: (305, 2), 3: (600, 300)}
+    assert tracker.new_tracks == 1
+
+    # 连续 max_misses + 1 次未匹配后结束
+    for frame_index in range(2, 5):
+        tracker.update([face(4, 3)], frame_index)
+    assert [t.track_id for t in tracker.tracks] == [1]
+
+
+def test_kalman_extrapolates_constant_velocity():
+    kalman = BoxKalmanFilter(np.array([0.0, 50.0, 50.0, 50.0]))
+    for frame_index in range(1, 15):
+        kalman.predict()
+        kalman.update(np.array([20.0 * frame_index, 50.0, 50.0, 50.0]))
+    predicted = kalman.predict(4)
+    assert predicted[0] == pytest.approx(20.0 * 18, abs=5.0)
+    assert predicted[1] == pytest.approx(50.0, abs=2.0)
+    assert kalman.motion == pytest.approx(20.0 / 50.0, abs=0.05)
+
+
+def test_tracker_follows_fast_face_across_skipped_frames():
+    tracker = FaceTracker()
+    for frame_index in range(10):
+        tracker.update([face(20 * frame_index, 0, 50, 50)], frame_index)
+    # 跳过 4 帧后人脸移动了 100 像素，与上一次的检测框不重叠，由预测位置关联
+    last = np.array([[180.0, 0.0, 50.0, 50.0]])
+    assert box_iou(last, np.array([[280.0, 0.0, 50.0, 50.0]]))[0, 0] == 0
+    matched = tracker.update([face(280, 0, 50, 50)], 14)
+    assert [t.track_id for t in matched] == [1] and tracker.new_tracks == 0
+
+
+def test_needs_recognition_every_interval():
+    tracker = FaceTracker()
+    track = tracker.update([face(0, 0)], 0)[0]
+    assert track.needs_recognition(0, 30)
+    track.verified_frame = 0
+    assert not track.needs_recognition(29, 30)
+    assert track.needs_recognition(30, 30)
+
+
+def test_static_scene_recognizes_once_and_reverifies_every_interval():
+    scene = FakeScene(lambda frame_index: [face(100, 100)])
+    processor = make_processor(scene, recognition_interval=30, max_stride=8)
+    play(processor, scene, 300)
+
+    # 人脸稳定后抽帧间隔增至上限，识别只在出现时与每 30 帧复核时调用
+    assert processor.stride == 8
+    assert processor.frames_processed < 300 / 4
+    assert processor.recognitions == len(scene.match_calls) <= 300 // 30 + 1
+    verified = [frame_index for frame_index, _ in scene.match_calls]
+    assert verified[0] == 0
+    assert all(later - earlier >= 30 for earlier, later in zip(verified, verified[1:]))
+    # 身份不变，只有首次识别的事件
+    events = processor.events()
+    assert [(e["event"], e["track_id"], e["face_id"]) for e in events] == [("recognized", 1, "p1")]
+    assert events[0]["person_info"] == {"name": "p1"}
+
+
+def test_moving_scene_processes_every_frame_but_still_recognizes_once_per_interval():
+    scene = FakeScene(lambda frame_index: [face(10 * frame_index, 100)])
+    processor = make_processor(scene, recognition_interval=30, max_stride=8)
+    play(processor, scene, 120)
+
+    # 人脸持续移动时逐帧处理，轨迹不断，识别次数仍由复核间隔决定
+    assert processor.stride == 1
+    assert processor.frames_processed == 120
+    assert [frame_index for frame_index, _ in scene.match_calls] == [0, 30, 60, 90]
+    assert [e["track_id"] for e in processor.events()] == [1]
+
+
+def test_new_face_resets_stride():
+    scene = FakeScene(lambda frame_index: [face(100, 100)] + ([face(400, 100)] if frame_index >= 100 else []))
+    processor = make_processor(scene, recognition_interval=1000, max_stride=8)
+    play(processor, scene, 100)
+    assert processor.stride == 8
+
+    scene.frame_index = 100
+    processor._process_frame(FRAME, 100)
+    assert processor.stride == 1
+    # 只有新轨迹被识别
+    assert scene.match_calls[-1] == (100, 1)
+    assert [e["track_id"] for e in processor.events()] == [1, 2]
+
+
+def test_identity_change_is_reported_at_reverification():
+    scene = FakeScene(lambda frame_index: [face(100, 100)], identity_at=lambda f: "p1" if f < 45 else "p2")
+    processor = make_processor(scene, recognition_interval=30, max_stride=1)
+    play(processor, scene, 70)
+
+    events = processor.events()
+    assert [(e["event"], e["face_id"], e["frame_index"]) for e in events] == [
+        ("recognized", "p1", 0),
+        ("identity_changed", "p2", 60),
+    ]
+    assert processor.events(since=events[0]["seq"]) == events[1:]
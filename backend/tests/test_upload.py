@@ -0,0 +1,93 @@
+"""上传文件的大小与文件头校验"""
+import asyncio
+import io
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.core.middleware import UploadLimitMiddleware
+from app.utils.upload import UPLOAD_CHUNK_SIZE, UploadError, read_image_upload
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 60
+LIMIT = 1024
+
+
+def read(data, filename="photo.jpg", max_size=LIMIT, size=None):
+    file = UploadFile(io.BytesIO(data), filename=filename, size=size)
+    return asyncio.run(read_image_upload(file, max_size))
+
+
+@pytest.mark.parametrize("data", [JPEG, PNG, b"BM" + b"\x00" * 60])
+def test_accepts_supported_signatures(data):
+    assert bytes(read(data)) == data
+
+
+@pytest.mark.parametrize("data", [b"GIF89a" + b"\x00" * 60, b"<html></html>", b""])
+def test_rejects_unknown_signature(data):
+    with pytest.raises(UploadError, match="不是有效的图片"):
+        read(data)
+
+
+def test_rejects_unsupported_extension():
+    with pytest.raises(UploadError, match="不支持的文件格式"):
+        read(JPEG, filename="photo.gif")
+
+
+def test_rejects_declared_size_before_reading():
+    file = UploadFile(io.BytesIO(JPEG), filename="photo.jpg", size=LIMIT + 1)
+    with pytest.raises(UploadError, match="文件大小超过限制"):
+        asyncio.run(read_image_upload(file, LIMIT))
+    # 未读取任何内容
+    assert file.file.tell() == 0
+
+
+def test_rejects_oversized_body_while_streaming():
+    max_size = UPLOAD_CHUNK_SIZE + 100
+    data = JPEG + b"\x00" * (max_size + 1 - len(JPEG))
+    with pytest.raises(UploadError, match="文件大小超过限制"):
+        read(data, max_size=max_size)
+    assert bytes(read(data[:max_size], max_size=max_size)) == data[:max_size]
+
+
+def test_rejects_oversized_single_chunk():
+    with pytest.raises(UploadError, match="文件大小超过限制"):
+        read(JPEG + b"\x00" * LIMIT)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    app.add_middleware(UploadLimitMiddleware, limits=[("POST", r"^/upload$", LIMIT)], overhead=256)
+    return TestClient(app)
+
+
+def test_middleware_passes_small_upload(client):
+    response = client.post("/upload", files={"file": ("photo.jpg", JPEG, "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json() == {"size": len(JPEG)}
+
+
+def test_middleware_rejects_content_length(client):
+    response = client.post("/upload", files={"file": ("photo.jpg", JPEG + b"\x00" * 4 * LIMIT, "image/jpeg")})
+    assert response.status_code == 400
+    assert "文件大小超过限制" in response.json()["detail"]
+
+
+def test_middleware_rejects_chunked_body(client):
+    # 不带 Content-Length 的分块请求体，在接收过程中累计超限
+    def body():
+        yield b'--x\r\nContent-Disposition: form-data; name="file"; filename="photo.jpg"\r\n\r\n'
+        for _ in range(8):
+            yield b"\x00" * LIMIT
+        yield b"\r\n--x--\r\n"
+
+    response = client.post("/upload", content=body(), headers={"Content-Type": "multipart/form-data; boundary=x"})
+    assert response.status_code == 400
+    assert "文件大小超过限制" in response.json()["detail"]